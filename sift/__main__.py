@@ -31,6 +31,7 @@ import sift.ui.open_cache_dialog_ui as open_cache_dialog_ui
 from sift.control.layer_info import SingleLayerInfoPane
 from sift.control.layer_tree import LayerStackTreeViewModel
 from sift.control.rgb_behaviors import UserModifiesRGBLayers
+from sift.control.cursor_probe import CursorProbe
 from sift.control.doc_ws_as_timeline_scene import SiftDocumentAsFramesInTracks
 from sift.model.document import Document
 from sift.model.layer import DocRGBLayer
@@ -54,7 +55,7 @@ from functools import partial
 
 # this is generated with pyuic4 pov_main.ui >pov_main_ui.py
 from sift.ui.pov_main_ui import Ui_MainWindow
-from sift.common import INFO, KIND, TOOL, COMPOSITE_TYPE, get_font_size
+from sift.common import INFO, KIND, TOOL, COMPOSITE_TYPE, ANIMATION_PACING, get_font_size
 
 import os
 import sys
@@ -299,8 +300,8 @@ class Main(QtGui.QMainWindow):
         uuids = list(uuids)
         if not uuids:
             return
-        for uuid in uuids:
-            self.document.activate_product_uuid_as_new_layer(uuid)
+        for _ in self.document.activate_product_uuids_as_new_layers(uuids):
+            pass
         uuid = uuids[-1]
         self.behaviorLayersList.select([uuid])
         # set the animation based on the last added (topmost) layer
@@ -373,7 +374,11 @@ class Main(QtGui.QMainWindow):
         self.ui.animPlayPause.setDown(animating)
         self.ui.animationSlider.repaint()
         if animating:
-            self.ui.animationLabel.setText(self.document.time_label_for_uuid(uuid))
+            label = self.document.time_label_for_uuid(uuid)
+            achieved_fps = frame_info[4] if len(frame_info) > 4 else None
+            if achieved_fps is not None:
+                label = "{} ({:.1f} fps)".format(label, achieved_fps)
+            self.ui.animationLabel.setText(label)
         else:
             self.update_frame_time_to_top_visible()
 
@@ -381,6 +386,14 @@ class Main(QtGui.QMainWindow):
         # FUTURE: don't address layer set directly
         self.ui.animationLabel.setText(self.document.time_label_for_uuid(self.scene_manager.layer_set.top_layer_uuid()))
 
+    def auto_contrast_top_layer(self, *args, **kwargs):
+        """stretch the top layer's color limits for the part of it in view"""
+        uuid = self.document.current_visible_layer_uuid
+        if uuid is None:
+            return
+        rows, cols = self.scene_manager.visible_content_slices(uuid)
+        self.document.auto_contrast_layers([uuid], regions={uuid: (rows, cols)})
+
     def remove_layer(self, *args, **kwargs):
         uuids = self.behaviorLayersList.current_selected_uuids()
         rgb_uuids_handled = set()
@@ -541,8 +554,44 @@ class Main(QtGui.QMainWindow):
             if xy_pos is None:
                 xy_pos = _xy_pos
 
-        if xy_pos is not None and state:
-            lon, lat = xy_pos
+        if animating:
+            self._cursor_probe.cancel()
+            self._show_point_probe_text(xy_pos if state else None, "<animating>")
+        elif state and uuid is not None and xy_pos is not None:
+            # the value arrives through _cursor_probe.didProbeValue; never read data on the GUI thread
+            self._cursor_probe.probe(uuid, xy_pos)
+            if uuid != self._probe_text_uuid:
+                self._show_point_probe_text(xy_pos, "...")
+        else:
+            self._cursor_probe.cancel()
+            self._show_point_probe_text(xy_pos if state else None, "N/A")
+
+    def _point_probe_value_ready(self, uuid, xy_pos, data_point, refined):
+        if data_point is None:
+            self._show_point_probe_text(xy_pos, "N/A")
+            return
+        info = self.document[uuid]
+        unit_info = info[INFO.UNIT_CONVERSION]
+        data_point = unit_info[1](data_point)
+        data_str = unit_info[2](data_point, numeric=False)
+        if info.get(INFO.CENTRAL_WAVELENGTH):
+            wl = info[INFO.CENTRAL_WAVELENGTH]
+            if wl < 4.1:
+                wl_str = "{:0.02f} µm".format(wl)
+            else:
+                wl_str = "{:0.01f} µm".format(wl)
+            layer_str = "{}, {}".format(info[INFO.SHORT_NAME],
+                                        wl_str)
+        else:
+            layer_str = info[INFO.SHORT_NAME]
+        if not refined:
+            # overview value, the native one is on its way
+            data_str = "~" + data_str
+        self._show_point_probe_text(xy_pos, data_str, layer_str, uuid=uuid)
+
+    def _show_point_probe_text(self, xy_pos, data_str, layer_str="N/A", uuid=None):
+        if xy_pos is not None:
+            lon, lat = xy_pos[:2]
             lon = lon % 360 if lon > 0 else lon % -360 + 360
             lon = lon - 360 if lon > 180 else lon
             lon_str = "{:>6.02f} {}".format(abs(lon), "W" if lon < 0 else "E")
@@ -550,37 +599,7 @@ class Main(QtGui.QMainWindow):
             probe_loc = "{}, {}".format(lon_str, lat_str)
         else:
             probe_loc = "{:>6s}  , {:>6s}  ".format("N/A", "N/A")
-
-        if animating:
-            data_str = "<animating>"
-        elif state and uuid is not None:
-            try:
-                data_point = self.workspace.get_content_point(uuid, xy_pos)
-            except ValueError:
-                LOG.debug("Could not get data value", exc_info=True)
-                data_point = None
-
-            if data_point is None:
-                data_str = "N/A"
-                layer_str = "N/A"
-            else:
-                info = self.document[uuid]
-                unit_info = info[INFO.UNIT_CONVERSION]
-                data_point = unit_info[1](data_point)
-                data_str = unit_info[2](data_point, numeric=False)
-                if info.get(INFO.CENTRAL_WAVELENGTH):
-                    wl = info[INFO.CENTRAL_WAVELENGTH]
-                    if wl < 4.1:
-                        wl_str = "{:0.02f} µm".format(wl)
-                    else:
-                        wl_str = "{:0.01f} µm".format(wl)
-                    layer_str = "{}, {}".format(info[INFO.SHORT_NAME],
-                                                wl_str)
-                else:
-                    layer_str = info[INFO.SHORT_NAME]
-        else:
-            data_str = "N/A"
-            layer_str = "N/A"
+        self._probe_text_uuid = uuid
         self.ui.cursorProbeLayer.setText(layer_str)
         self.ui.cursorProbeText.setText("{} ({})".format(data_str, probe_loc))
 
@@ -749,6 +768,7 @@ class Main(QtGui.QMainWindow):
         self.document.didReorderLayers.connect(self.update_frame_time_to_top_visible)
         self.document.didRemoveLayers.connect(self.update_frame_time_to_top_visible)
         self.document.didAddBasicLayer.connect(self.update_frame_time_to_top_visible)
+        self.document.didAddBasicLayers.connect(self.update_frame_time_to_top_visible)
         self.document.didAddCompositeLayer.connect(self.update_frame_time_to_top_visible)
         self.document.didChangeProjection.connect(self.scene_manager.set_projection)
 
@@ -758,6 +778,10 @@ class Main(QtGui.QMainWindow):
         self.change_tool(True)
 
         self.setup_menu()
+        self._probe_text_uuid = None  # layer whose value the cursor probe text currently shows
+        self._cursor_probe = CursorProbe(self.workspace, self.queue, resident_value=self.scene_manager.overview_point,
+                                         parent=self)
+        self._cursor_probe.didProbeValue.connect(self._point_probe_value_ready)
         self.graphManager = ProbeGraphManager(self.ui.probeTabWidget, self.workspace, self.document, self.queue)
         self.graphManager.didChangeTab.connect(self.scene_manager.show_only_polygons)
         self.graphManager.didClonePolygon.connect(self.scene_manager.copy_polygon)
@@ -769,6 +793,7 @@ class Main(QtGui.QMainWindow):
         self.scene_manager.newPointProbe.connect(self.graphManager.update_point_probe)
         zap = lambda *args: self.graphManager.update_point_probe(DEFAULT_POINT_PROBE)
         self.document.didAddBasicLayer.connect(zap)
+        self.document.didAddBasicLayers.connect(zap)
         self.document.didAddCompositeLayer.connect(zap)
         # FIXME: These were added as a simple fix to update the probe value on layer changes, but this should really
         #        have its own manager-like object
@@ -776,6 +801,7 @@ class Main(QtGui.QMainWindow):
             return self.update_point_probe_text(DEFAULT_POINT_PROBE)
         self.document.didChangeLayerVisibility.connect(_blackhole)
         self.document.didAddBasicLayer.connect(_blackhole)
+        self.document.didAddBasicLayers.connect(_blackhole)
         self.document.didAddCompositeLayer.connect(_blackhole)
         self.document.didRemoveLayers.connect(_blackhole)
         self.document.didReorderLayers.connect(_blackhole)
@@ -963,6 +989,22 @@ class Main(QtGui.QMainWindow):
         animate.setShortcut('A')
         animate.triggered.connect(partial(self.toggle_animation, action=animate))
 
+        flipbook = QtGui.QAction("Flipbook Animation", self)
+        flipbook.setCheckable(True)
+        flipbook.setChecked(self.scene_manager.flipbook)
+        flipbook.toggled.connect(lambda checked: setattr(self.scene_manager, 'flipbook', checked))
+
+        pacing_group = QtGui.QActionGroup(self)
+        pacing_actions = []
+        for mode, title in ((ANIMATION_PACING.FIXED, "Show Every Frame on Time"),
+                            (ANIMATION_PACING.HOLD, "Wait for Each Frame"),
+                            (ANIMATION_PACING.DROP, "Keep Time, Skip Late Frames")):
+            pacing = QtGui.QAction(title, pacing_group)
+            pacing.setCheckable(True)
+            pacing.setChecked(self.scene_manager.layer_set.pacing == mode)
+            pacing.triggered.connect(lambda checked, mode=mode: setattr(self.scene_manager.layer_set, 'pacing', mode))
+            pacing_actions.append(pacing)
+
         change_order = QtGui.QAction("Set Animation &Order", self)
         change_order.setShortcut('O')
         change_order.triggered.connect(self.change_animation_to_current_selection_siblings)
@@ -971,6 +1013,9 @@ class Main(QtGui.QMainWindow):
         flip_colormap.setShortcut("/")
         flip_colormap.triggered.connect(lambda: self.document.flip_climits_for_layers([self.document.current_visible_layer_uuid]))
 
+        auto_contrast = QtGui.QAction("Auto Contrast (Top Layer)", self)
+        auto_contrast.triggered.connect(self.auto_contrast_top_layer)
+
         cycle_borders = QtGui.QAction("Cycle &Borders", self)
         cycle_borders.setShortcut('B')
         cycle_borders.triggered.connect(self.scene_manager.cycle_borders_color)
@@ -1014,6 +1059,10 @@ class Main(QtGui.QMainWindow):
 
         view_menu = menubar.addMenu('&View')
         view_menu.addAction(animate)
+        view_menu.addAction(flipbook)
+        pacing_menu = view_menu.addMenu('Animation Pacing')
+        for pacing in pacing_actions:
+            pacing_menu.addAction(pacing)
         view_menu.addAction(prev_time)
         view_menu.addAction(focus_current)
         view_menu.addAction(next_time)
@@ -1022,6 +1071,7 @@ class Main(QtGui.QMainWindow):
         view_menu.addAction(change_order)
         view_menu.addAction(toggle_vis)
         view_menu.addAction(flip_colormap)
+        view_menu.addAction(auto_contrast)
         view_menu.addAction(cycle_borders)
         view_menu.addAction(cycle_grid)
 
@@ -29,6 +29,9 @@ __author__ = 'rayg'
 __docformat__ = 'reStructuredText'
 
 import os, sys
+import math
+import threading
+from functools import lru_cache
 from datetime import datetime, timedelta
 import logging, unittest, argparse
 from numba import jit, float64, int64, uint64, boolean, types as nb_types
@@ -67,6 +70,7 @@ DEFAULT_TILE_WIDTH = 512
 DEFAULT_TEXTURE_HEIGHT=2
 DEFAULT_TEXTURE_WIDTH=16
 DEFAULT_ANIMATION_DELAY=100.0  # milliseconds
+DEFAULT_ANIMATION_PREFETCH=4  # frames ahead of the current one to retile while animating
 # The values below are taken from the test geotiffs that are projected to the `DEFAULT_PROJECTION` below.
 # These units are in meters in mercator projection space
 DEFAULT_X_PIXEL_SIZE = 4891.969810251281160
@@ -75,9 +79,35 @@ DEFAULT_ORIGIN_X = -20037508.342789247632027
 DEFAULT_ORIGIN_Y = 15496570.739723727107048
 
 DEFAULT_PROJECTION = "+proj=merc +datum=WGS84 +ellps=WGS84 +over"
-DEFAULT_PROJ_OBJ = p = Proj(DEFAULT_PROJECTION)
-C_EQ = p(180, 0)[0] - p(-180, 0)[0]
-C_POL = p(0, 89.9)[1] - p(0, -89.9)[1]
+PROJ_CACHE_SIZE = 64  # Proj objects kept by cached_proj, per thread
+
+
+@lru_cache(maxsize=PROJ_CACHE_SIZE)
+def _cached_proj(proj4_str, thread_ident):
+    return Proj(proj4_str)
+
+
+def cached_proj(proj4_str):
+    """
+    Proj objects are expensive to construct; share them by proj4 string
+    each thread gets its own instances since pyproj objects are not guaranteed thread safe
+    :param proj4_str: projection definition
+    :return: pyproj.Proj
+    """
+    return _cached_proj(proj4_str, threading.get_ident())
+
+
+def _wgs84_mercator_y(lat):
+    # northing of a latitude in DEFAULT_PROJECTION, without constructing a Proj at import time
+    a, f = 6378137.0, 1 / 298.257223563
+    e = math.sqrt(2 * f - f * f)
+    phi = math.radians(lat)
+    esin = e * math.sin(phi)
+    return a * math.log(math.tan(math.pi / 4 + phi / 2) * ((1 - esin) / (1 + esin)) ** (e / 2))
+
+
+C_EQ = 2 * math.pi * 6378137.0  # DEFAULT_PROJECTION x extent from -180 to 180
+C_POL = 2 * _wgs84_mercator_y(89.9)  # DEFAULT_PROJECTION y extent from -89.9 to 89.9
 MAX_EXCURSION_Y = C_POL/2.0
 MAX_EXCURSION_X = C_EQ/2.0
 # how many 'tessellation' tiles in one texture tile? 2 = 2 rows x 2 cols
@@ -160,6 +190,14 @@ class TOOL(Enum):
     REGION_PROBE = "region_probe"
 
 
+class ANIMATION_PACING(Enum):
+    """How the animation loop treats frames whose tiles are not yet resident.
+    """
+    FIXED = 0  # advance on every timer tick regardless of readiness
+    HOLD = 1  # stay on the current frame until the next one is ready
+    DROP = 2  # keep wall-clock pacing, skipping frames that are not ready when due
+
+
 class KIND(Enum):
     """kind of entities we're working with
     """
@@ -230,6 +268,8 @@ class INFO(Enum):
     DATASET_NAME = 'dataset_name'  # logical name of the file (possibly human assigned)
     KIND = 'kind'  # KIND enumeration on what kind of layer this makes
     UUID = 'uuid'  # UUID assigned on import, which follows the layer around the system
+    ALGEBRAIC_KEY = 'algebraic_key'  # hash of normalized expression and operand content versions of a calculated product
+    STATS_PATH = 'stats_path'  # Content only: per-tile statistics sidecar relative to workspace, see workspace/statistics.py
 
     # track determiner is family::category; presentation is determined by family
     # family::category::serial is a unique identifier equivalent to conventional make-model-serialnumber
@@ -588,7 +628,7 @@ class TileCalculator(object):
         self.image_tiles_avail = (self.image_shape[0] / self.tile_shape[0], self.image_shape[1] / self.tile_shape[1])
         self.wrap_lon = wrap_lon
 
-        self.proj = Proj(projection)
+        self.proj = cached_proj(projection)
         self.image_extents_box = e = box(
             b=np.float64(self.ul_origin[0] - self.image_shape[0] * self.pixel_rez.dy),
             t=np.float64(self.ul_origin[0]),
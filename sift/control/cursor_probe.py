@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Behavior object reading data values under the cursor without blocking the GUI."""
+
+import logging
+import time
+from PyQt4.QtCore import QObject, QTimer, pyqtSignal
+from sift.queue import TASK_DOING, TASK_PROGRESS
+
+LOG = logging.getLogger(__name__)
+
+PROBE_INTERVAL_MS = 33  # at most one probe per display frame or so
+
+
+class CursorProbe(QObject):
+    """Coalescing, rate-limited point probe.
+
+    Mouse moves only record the latest position. At most once per interval
+    that position is probed:
+
+        1. The layer's resident overview is sampled on the GUI thread and
+           reported right away as a coarse value.
+        2. The native content is read on a background worker and reported
+           as a refined value, unless the cursor has moved on by then.
+
+    Only one background read is in flight at a time; positions arriving
+    meanwhile replace each other and the newest is probed when it finishes.
+
+    """
+    didProbeValue = pyqtSignal(object, tuple, object, bool)  # uuid, xy_pos, value or None, refined
+
+    def __init__(self, workspace, queue, resident_value=None, interval=PROBE_INTERVAL_MS, parent=None):
+        """
+        :param workspace: Workspace to read native content from
+        :param queue: TaskQueue to read it on
+        :param resident_value: callable(uuid, row, col) returning an in-memory value or None
+        :param interval: least milliseconds between probes
+        """
+        super().__init__(parent)
+        self.workspace = workspace
+        self.queue = queue
+        self.resident_value = resident_value
+        self.interval = interval
+        self._latest = None  # (uuid, xy_pos) not yet probed
+        self._in_flight = None  # (uuid, xy_pos) being read in the background
+        self._refined = None  # value read by the background task
+        self._last_probe = 0.
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._probe_latest)
+
+    def probe(self, uuid, xy_pos):
+        """Request the value of a layer at a lon/lat position; results arrive through didProbeValue."""
+        self._latest = (uuid, tuple(xy_pos[:2]))
+        if self._timer.isActive() or self._in_flight is not None:
+            return
+        wait = self.interval - (time.monotonic() - self._last_probe) * 1000.
+        self._timer.start(max(0, int(wait)))
+
+    def cancel(self):
+        """Forget any position not yet probed and ignore the result of the one in flight."""
+        self._latest = None
+        self._timer.stop()
+        if self._in_flight is not None:
+            self._in_flight = (None, ())
+
+    def _probe_latest(self):
+        if self._latest is None or self._in_flight is not None:
+            return
+        uuid, xy_pos = self._latest
+        self._latest = None
+        self._last_probe = time.monotonic()
+        try:
+            row, col = self.workspace.get_content_index(uuid, xy_pos)
+        except (ValueError, KeyError, TypeError):
+            LOG.debug("Could not locate probe position", exc_info=True)
+            row, col = None, None
+        if row is None:
+            self.didProbeValue.emit(uuid, xy_pos, None, True)
+            return
+        coarse = self.resident_value(uuid, row, col) if self.resident_value is not None else None
+        if coarse is not None:
+            self.didProbeValue.emit(uuid, xy_pos, coarse, False)
+        self._in_flight = (uuid, xy_pos)
+        self._refined = None
+        self.queue.add('cursor-probe', self._bgnd_read(uuid, xy_pos), 'Probe cursor value',
+                       interactive=True, and_then=self._finish_read)
+
+    def _bgnd_read(self, uuid, xy_pos):
+        yield {TASK_DOING: 'Probe cursor value', TASK_PROGRESS: 0.0}
+        try:
+            self._refined = self.workspace.get_content_point(uuid, xy_pos)
+        except ValueError:
+            LOG.debug("Could not get data value", exc_info=True)
+        yield {TASK_DOING: 'Probe cursor value', TASK_PROGRESS: 1.0}
+
+    def _finish_read(self, succeeded):
+        uuid, xy_pos = self._in_flight
+        self._in_flight = None
+        if succeeded and uuid is not None and self._latest is None:
+            self.didProbeValue.emit(uuid, xy_pos, self._refined, True)
+        if self._latest is not None:
+            self.probe(*self._latest)
@@ -12,11 +12,13 @@ import os, sys
 import logging, unittest
 from uuid import UUID
 from typing import Tuple, Optional, Mapping, List, Any, Callable, Set, Iterable
-from PyQt4.QtGui import QMenu
+import numpy as np
+from PyQt4.QtGui import QMenu, QImage, qRgb
 
 from sift.common import span, STATE, flags
-from sift.view.TimelineCommon import VisualState
-from sift.view.TimelineItems import QTrackItem, QFrameItem
+from sift.queue import TaskQueue, TASK_DOING, TASK_PROGRESS
+from sift.view.TimelineCommon import VisualState, frametup
+from sift.view.TimelineItems import QTrackItem
 from sift.view.TimelineScene import QFramesInTracksScene
 from sift.workspace import Workspace
 from sift.model.document import Document, DocumentAsTrackStack, FrameInfo, TrackInfo
@@ -25,6 +27,8 @@ from sift.workspace.metadatabase import Metadatabase
 
 LOG = logging.getLogger(__name__)
 
+GRAY_COLOR_TABLE = [qRgb(v, v, v) for v in range(256)]
+
 
 # since timeline view is interface-independent of sift.common, we translate
 DOC_STATE_TO_VISUAL_STATE = {
@@ -52,6 +56,7 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
     including handling inquiries about the legality of operations like drag-n-drops
     """
     _doc: DocumentAsTrackStack = None
+    _queue: TaskQueue = None
 
     def __init__(self, doc: Document, ws: Workspace, *args, **kwargs):
         """
@@ -62,6 +67,7 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
         """
         super(SiftDocumentAsFramesInTracks, self).__init__(*args, **kwargs)
         self._doc = doc.as_track_stack  # we should be limiting our interaction to this context
+        self._queue = doc.queue  # thumbnails are read in the background
         self._connect_signals(doc, ws)  # but the main doc is still the signaling hub
 
     @property
@@ -77,34 +83,45 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
         qti = QTrackItem(self, self.coords, trk.track, z, trk.primary, trk.secondary)
         return qti
 
-    def _create_frame(self, qti: QTrackItem, frm: FrameInfo) -> QFrameItem:
-        qfi = QFrameItem(qti, self.coords, frm.uuid, frm.when.s, frm.when.d, _translate_to_visual_state(frm.state),
-                         frm.primary, frm.secondary)
-        return qfi
+    def _frame_tuple(self, frm: FrameInfo) -> frametup:
+        return frametup(frm.uuid, frm.when.s, frm.when.d, _translate_to_visual_state(frm.state),
+                        frm.primary, frm.secondary)
 
-    def _sync_frame(self, qfi: QFrameItem, frm: FrameInfo):
-        qfi.state = _translate_to_visual_state(frm.state)
-        # qfi.update()
+    def _purge_orphan_tracks(self, tracks: Iterable[str]):
+        """Remove QTrackItem instances, and with them their frames, that no longer correspond to document content
+        """
+        LOG.debug("purging {} orphan tracks from timeline scene".format(len(tracks)))
+        for track in tracks:
+            self._del_track(self._track_items[track])
 
-    def _purge_orphan_tracks_frames(self, tracks: Iterable[str], frames: Iterable[UUID]):
-        """Remove QTrackItem and QFrameItem instances that no longer correspond to document content
+    def _sync_track_order(self) -> List[QTrackItem]:
+        """drop tracks the document no longer has and follow z-order changes of the others, without reading frames
+        return the tracks which moved
         """
-        LOG.debug("purging {} orphan tracks and {} orphan frames from timeline scene".format(len(tracks), len(frames)))
-        for frid in frames:
-            self.removeItem()
-        self._frame_items = dict((k, v) for (k,v) in self._frame_items.items() if k not in frames)
-        self._track_items = dict((k, v) for (k,v) in self._track_items.items() if k not in tracks)
-
-    def _sync_tracks_frames(self):
-        """populate QTrackItems and QFrameItems, filling any gaps and removing as needed
+        order = dict((track, z) for (z, track) in self._doc.enumerate_track_names())
+        self._purge_orphan_tracks([track for track in self._track_items.keys() if track not in order])
+        moved = []
+        for track, qti in self._track_items.items():
+            if qti.z != order[track]:
+                qti.z = order[track]
+                moved.append(qti)
+        return moved
+
+    def _sync_tracks_frames(self, tracks: Optional[Iterable[str]] = None):
+        """populate QTrackItems with frames, filling any gaps and removing as needed
+        QFrameItems are only made for the frames in the visible window, see QFramesInTracksScene.realize_track
+        Args:
+            tracks: only re-read frames for these tracks, e.g. those whose products changed; default all of them
         """
         new_tracks = []
-        new_frames = []
+        moved = self._sync_track_order()
         orphan_tracks = set(self._track_items.keys())
-        orphan_frames = set(self._frame_items.keys())
-        LOG.debug("current timeline scene population: {} frames in {} tracks".format(len(orphan_frames), len(orphan_tracks)))
+        if tracks is not None:
+            tracks = set(tracks)
+            orphan_tracks &= tracks
+        LOG.debug("current timeline scene population: {} frames in {} tracks".format(len(self._frame_tracks), len(self._track_items)))
         iters = 0
-        for z, trk in self._doc.enumerate_tracks_frames():
+        for z, trk in self._doc.enumerate_tracks_frames(tracks=tracks):
             qti = self._track_items.get(trk.track)
             if qti is not None:
                 self._sync_track(qti, z, trk)
@@ -112,28 +129,18 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
             else:
                 qti = self._create_track(z, trk)
                 new_tracks.append(qti)
-            _first = True
             LOG.debug("track {} z={} has {} frames".format(trk.track, z, len(trk.frames)))
-            for frm in trk.frames:
-                iters += 1
-                if _first:  # debug
-                    _first = False
-                    LOG.debug("track {} frame {}".format(trk.track, frm))
-                qfi = self._frame_items.get(frm.uuid)
-                if qfi is not None:
-                    self._sync_frame(qfi, frm)
-                    try:
-                        orphan_frames.remove(qfi.uuid)
-                    except KeyError:
-                        LOG.warning("frame {} <{}> found but not originally present in collection {}".format(frm.ident, frm.uuid, orphan_frames))
-                else:
-                    new_frames.append(self._create_frame(qti, frm))
-        LOG.debug("added {} tracks and {} frames to timeline scene after {} iterations".format(len(new_tracks), len(new_frames), iters))
-        self._purge_orphan_tracks_frames(orphan_tracks, orphan_frames)
+            iters += len(trk.frames)
+            qti.set_frames(self._frame_tuple(frm) for frm in trk.frames)
+        LOG.debug("added {} tracks to timeline scene after {} frames".format(len(new_tracks), iters))
+        self._purge_orphan_tracks(orphan_tracks)
+        old_max_z = self.coords.max_z
         self.propagate_max_z()
-        for track in new_tracks:
+        if self.coords.max_z != old_max_z:  # every track shifts vertically
+            moved = list(self._track_items.values())
+        for track in set(new_tracks) | set(moved):
             track.update_pos_bounds()
-            track.update_frame_positions()
+            self.realize_track(track)
         super(SiftDocumentAsFramesInTracks, self).update()
 
 
@@ -142,17 +149,63 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
         """
         self._sync_tracks_frames()
 
-    def _sync_and_update_frame(self, uuid: UUID, frm: Optional[FrameInfo]=None):
-        qfi = self._frame_items.get(uuid)
-        if qfi is not None:
+    def _sync_and_update_frame(self, uuid: UUID, frm: Optional[FrameInfo]=None, state: Optional[flags]=None):
+        """revise a frame the timeline already holds, returning the track holding it, or None if it's not known
+        """
+        qti = self.track_for_frame(uuid)
+        if qti is not None:
             if frm is None:
-                frm = self._doc.frame_info_for_product(uuid=uuid)
-            self._sync_frame(qfi, frm)
-            qfi.update()
-            return qfi
+                frm = self._doc.frame_info_for_product(uuid=uuid, state=state)
+            qti.update_frame(self._frame_tuple(frm))
+            return qti
         else:  # FUTURE: create the frame and if necessary the track
             return None
 
+    def _update_frame_state(self, uuid: UUID, state: flags):
+        """apply a state pushed by the workspace, without consulting the metadatabase
+        """
+        qti = self.track_for_frame(uuid)
+        if qti is not None:
+            qti.set_frame_state(uuid, _translate_to_visual_state(state))
+        return qti
+
+    def thumbnail_image(self, uuid: UUID) -> Optional[QImage]:
+        """grayscale preview of a product's overview content, stretched between its extremes
+        """
+        data = self._doc.thumbnail_data(uuid)
+        if data is None:
+            return None
+        good = np.isfinite(data)
+        if not good.any():
+            return None
+        lo, hi = np.nanmin(data[good]), np.nanmax(data[good])
+        gray = np.zeros(data.shape, dtype=np.uint8)
+        gray[good] = 255.0 * (data[good] - lo) / (hi - lo) if hi > lo else 128
+        rows, cols = gray.shape
+        img = QImage(gray.data, cols, rows, cols, QImage.Format_Indexed8)
+        img.setColorTable(GRAY_COLOR_TABLE)
+        return img.copy()  # detach from the numpy buffer
+
+    def request_thumbnail(self, uuid: UUID, request: int):
+        """read the overview and make its image on the background queue, rather than while painting
+        """
+        made = []
+
+        def _bgnd_make_thumbnail(uuid=uuid):
+            if self._thumbs_pending.get(uuid) != request:  # scrolled out of view while queued
+                return
+            yield {TASK_DOING: "thumbnail", TASK_PROGRESS: 0.0}
+            made.append(self.thumbnail_image(uuid))
+            yield {TASK_DOING: "thumbnail", TASK_PROGRESS: 1.0}
+
+        def _then_show_thumbnail(ok: bool, uuid=uuid, request=request):
+            """finally-do-this section back on UI thread
+            """
+            self.thumbnail_arrived(uuid, request, made[0] if (ok and made) else None)
+
+        self._queue.add("thumbnail {} {}".format(uuid, request), _bgnd_make_thumbnail(), "thumbnail",
+                        interactive=False, and_then=_then_show_thumbnail)
+
     def sync_available_tracks(self):
         self._doc.sync_available_tracks()
 
@@ -161,7 +214,8 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
 
     def _update_visibility_for_products(self, uuid_vis: Mapping[UUID, bool]):
         # set the corresponding display state for these products
-        all_frame_items = [self._sync_and_update_frame(uuid) for uuid in uuid_vis.keys()]
+        states = self._doc.product_states(uuid_vis.keys())
+        all_frame_items = [self._sync_and_update_frame(uuid, state=states[uuid]) for uuid in uuid_vis.keys()]
         if None in all_frame_items:
             LOG.debug("a frame did not exist to update, have to refresh everything")
             self._invalidate()
@@ -180,19 +234,25 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
         def refresh_with_new_product(order, uuid, presentation, ts=self):
             LOG.debug("new layer added to document, refreshing timeline for product {}".format(str(uuid)))
             if ts._sync_and_update_frame(uuid) is None:
-                LOG.info("no corresponding frame glyph, re-syncing timeline")
+                LOG.info("no corresponding frame glyph, re-syncing its track")
                 ts.sync_available_tracks()
-                ts.sync_items()
+                ts.sync_items(changed_frame_uuids=[uuid])
         doc.didAddBasicLayer.connect(refresh_with_new_product)
+
+        def refresh_with_new_products(order, uuids, presentations, ts=self):
+            LOG.debug("{} new layers added to document, refreshing timeline".format(len(uuids)))
+            ts.sync_available_tracks()
+            ts.sync_items(changed_frame_uuids=uuids)
+        doc.didAddBasicLayers.connect(refresh_with_new_products)
         doc.didAddCompositeLayer.connect(refresh_with_new_product)
 
         doc.didChangeLayerVisibility.connect(self._update_visibility_for_products)
 
         def refresh_product_new_name(uuid, name, ts=self):
             if None == ts._sync_and_update_frame(uuid):
-                LOG.warning("no corresponding frame glyph after rename??; re-syncing timeline")
+                LOG.warning("no corresponding frame glyph after rename??; re-syncing its track")
                 ts.sync_available_tracks()
-                ts.sync_items()
+                ts.sync_items(changed_frame_uuids=[uuid])
         doc.didChangeLayerName.connect(refresh_product_new_name)
 
         # def refresh_track_order(self, added_tracks, removed_tracks, ts=self):
@@ -210,7 +270,7 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
 
         def refresh_product(uuid, state, *args, **kwargs):
             LOG.debug('updating frame state {} in timeline'.format(str(uuid)))
-            self._sync_and_update_frame(uuid)
+            self._update_frame_state(uuid, state)
         ws.didChangeProductState.connect(refresh_product)
 
     # def get(self, uuid: UUID) -> [QTrackItem, QFrameItem, None]:
@@ -284,18 +344,25 @@ class SiftDocumentAsFramesInTracks(QFramesInTracksScene):
         Parameters serve only as hints
         """
         acted = False
+        stale_tracks = set(changed_tracks or ())
         with self._doc.mdb as consolidate_sessions_by_nesting:  # optional peformance optimization to prevent session flipping
             if changed_frame_uuids is not None:
                 changed_frame_uuids = list(changed_frame_uuids)
-                all_frame_items = [self._sync_and_update_frame(uuid) for uuid in changed_frame_uuids]
-                if None in all_frame_items:
-                    LOG.debug("new frames, resorting to invalidate")
-                    self._invalidate()
-                    return
+                states = self._doc.product_states(changed_frame_uuids)
+                for uuid in changed_frame_uuids:
+                    qti = self.track_for_frame(uuid)
+                    track = self._doc.track_for_product(uuid)
+                    if qti is not None and qti.track == track:
+                        self._sync_and_update_frame(uuid, state=states[uuid])
+                        continue
+                    # new, deleted or re-categorized frames mean re-reading the tracks they left and joined
+                    stale_tracks.update(t for t in (track, qti.track if qti is not None else None) if t is not None)
                 LOG.debug("done updating {} products in timeline".format(len(changed_frame_uuids)))
                 acted = True
-        if changed_tracks is not None:
-            LOG.warning("NOT IMPLEMENTED: selectively updating {} tracks in timeline".format(len(list(changed_tracks))))
+            if stale_tracks:
+                LOG.debug("re-syncing {} tracks in timeline".format(len(stale_tracks)))
+                self._sync_tracks_frames(tracks=stale_tracks)
+                acted = True
         if not acted:
             self._invalidate()
         self.update()
@@ -65,6 +65,7 @@ import logging
 import unittest
 import argparse
 from collections import MutableSequence, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from itertools import groupby, chain
 from uuid import UUID, uuid1 as uuidgen
 from datetime import datetime, timedelta
@@ -75,7 +76,7 @@ from weakref import ref
 import os
 import json
 import warnings
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, subqueryload
 
 from sift.workspace.metadatabase import Product
 from sift.common import KIND, INFO, prez, span, FCS_SEP, ZList, flags, STATE
@@ -93,6 +94,7 @@ from vispy.color.colormap import Colormap
 LOG = logging.getLogger(__name__)
 
 DEFAULT_LAYER_SET_COUNT = 1  # this should match the ui configuration!
+DEFAULT_RECIPE_WORKERS = 4  # time steps of an algebraic recipe calculated concurrently
 
 
 def unit_symbol(unit):
@@ -636,13 +638,26 @@ class DocumentAsTrackStack(DocumentAsContextBase):
         # s.update(self.doc.product_state.get(prod.uuid) or flags())
         return s
 
-    def frame_info_for_product(self, prod: Product=None, uuid: UUID=None, when_overlaps: span=None) -> T.Optional[FrameInfo]:
+    def product_states(self, uuids: T.Iterable[UUID] = None) -> T.Mapping[UUID, flags]:
+        """Merge document state with workspace state for many products in one metadatabase query
+        :param uuids: products of interest, default all of them
+        """
+        return self.ws.product_states(uuids)
+
+    def thumbnail_data(self, uuid: UUID):
+        """Small 2D array of a product's overview content for previewing, or None if it has no content cached
+        """
+        return self.ws.get_content_thumbnail(uuid)
+
+    def frame_info_for_product(self, prod: Product=None, uuid: UUID=None, when_overlaps: span=None,
+                               state: flags=None) -> T.Optional[FrameInfo]:
         """Generate info struct needed for timeline representation, optionally returning None if outside timespan of interest
+        state, if already known from product_states, saves querying it for this one product
         """
         if prod is None:
             with self.mdb as S:  # this is a potential performance toilet, but OK to use sparsely
                 prod = S.query(Product).filter_by(uuid_str=str(uuid)).first()
-                return self.frame_info_for_product(prod=prod, when_overlaps=when_overlaps)
+                return self.frame_info_for_product(prod=prod, when_overlaps=when_overlaps, state=state)
         prod_e = prod.obs_time + prod.obs_duration
         if (when_overlaps is not None) and ((prod_e <= when_overlaps.s) or (prod.obs_time >= when_overlaps.e)):
             # does not intersect our desired span, skip it
@@ -656,30 +671,42 @@ class DocumentAsTrackStack(DocumentAsContextBase):
             ident=prod.ident,
             when=span(prod.obs_time, prod.obs_duration),
             # FIXME: new model old model
-            state=self.product_state(prod.uuid),
+            state=state if state is not None else self.product_state(prod.uuid),
             primary=dn,
             secondary=dt,  # prod.obs_time.strftime("%Y-%m-%d %H:%M:%S")
             # thumb=
         )
         return fin
 
-    def enumerate_tracks_frames(self, only_active: bool = False, when: span = None) -> T.Iterable[TrackInfo]:
+    def enumerate_tracks_frames(self, only_active: bool = False, when: span = None,
+                                tracks: T.Iterable[str] = None) -> T.Iterable[TrackInfo]:
         """enumerate tracks as TrackInfo and FrameInfo structures for timeline use, in top-Z to bottom-Z order
+        :param tracks: only these tracks, e.g. those whose products changed; default all of them
         """
         if when is None:  # default to the document's span, either explicit (user-specified) or implicit
             when = self.timeline_span
         when_e = when.e
+        # one aggregated query for the state of every frame, instead of one per frame
+        if tracks is None:
+            states = self.product_states()
+        else:
+            tracks = set(tracks)
+            states = self.product_states([uuid for track in tracks for _, uuid in self.ws.matrix.frames_in_track(track)])
         with self.mdb as s:
             for z, track in self.doc.track_order.items():  # enumerates from high Z to low Z
                 if only_active and (z < 0):
                     break
+                if tracks is not None and track not in tracks:
+                    continue
                 fam, ctg = track.split(FCS_SEP)
                 LOG.debug("yielding TrackInfo and FrameInfos for {}".format(track))
                 frames = []
                 # fam_nfo = self.doc.family_info(fam)
                 que = s.query(Product).filter((Product.family == fam) & (Product.category == ctg))
+                # labels come from key-values, load them for the whole track rather than product by product
+                que = que.options(subqueryload(Product._key_values))
                 for prod in que.all():
-                    frm = self.frame_info_for_product(prod, when_overlaps=when)
+                    frm = self.frame_info_for_product(prod, when_overlaps=when, state=states.get(prod.uuid, flags()))
                     if frm is not None:
                         frames.append(frm)
                 if not frames:
@@ -724,14 +751,13 @@ class DocumentAsTrackStack(DocumentAsContextBase):
 
         def _bgnd_ensure_content_loaded(ws=self.ws, frames=frames):
             ntot = len(frames)
-            for nth, frame in enumerate(frames):
-                yield {TASK_DOING: "importing {}/{}".format(nth+1, ntot), TASK_PROGRESS: float(nth+1)/float(ntot+1)}
-                ws.import_product_content(frame)
+            for nth, (frame, done) in enumerate(ws.iter_import_product_contents(frames)):
+                yield {TASK_DOING: "importing {}/{}".format(nth+1, ntot), TASK_PROGRESS: done}
 
         def _then_show_frames_in_document(doc = self.doc, frames = frames):
             """finally-do-this section back on UI thread
             """
-            [self.doc.activate_product_uuid_as_new_layer(frame) for frame in frames]
+            doc.add_basic_layers(frames)
             return
             # ensure that the track these frames belongs to is activated itself
             # update the timeline view states of these frames to show them as active as well
@@ -742,22 +768,7 @@ class DocumentAsTrackStack(DocumentAsContextBase):
                   interactive=False, and_then=_then_show_frames_in_document)
 
     def _products_in_track(self, track: str, during: span = None) -> T.List[UUID]:
-        fam, ctg = track.split(FCS_SEP)
-
-        def uu(x):
-            LOG.debug("found product {}".format(x))
-            return UUID(x)
-
-        if during is None:
-            with self.mdb as S:
-                return [uu(x) for x in S.query(Product.uuid_str).filter(
-                    (Product.family == fam) & (Product.category == ctg)).all()]
-        else:
-            start, end = during.s, during.e
-            with self.mdb as S:
-                return [uu(x) for x in S.query(Product.uuid_str).filter(
-                    (Product.family == fam) & (Product.category == ctg) &
-                    ~((Product.obs_time > end) | ((Product.obs_time + Product.obs_duration) < start))).all()]
+        return [uuid for _, uuid in self.ws.matrix.frames_in_track(track, during)]
 
     def _products_in_tracks(self, tracks: T.Iterable[str], during: span=None) -> T.Iterable[UUID]:
         for track in tracks:
@@ -825,6 +836,26 @@ class DocumentAsTrackStack(DocumentAsContextBase):
             if tfam == family:
                 yield track
 
+    def track_for_product(self, uuid: UUID) -> T.Optional[str]:
+        """name of the track a product belongs to, or None if it is not in the metadatabase
+        """
+        return self.ws.matrix.track_for_product(uuid)
+
+    def frame_times_in_track(self, track: str, during: span = None) -> T.List[T.Tuple[datetime, UUID]]:
+        """(observation time, product uuid) of each frame in a track, in time order
+        """
+        return self.ws.matrix.frames_in_track(track, during)
+
+    def iter_track_probe(self, track: str, xy_pos=None, polygon=None, during: span = None):
+        """Probe a point, or the mean over a polygon, in every frame of a track
+        Runs on the calling thread, typically a background task; frames are probed in parallel.
+        Closing the generator cancels frames not yet probed.
+        :return: generator of (observation time, uuid, value or None, fraction done) in completion order
+        """
+        when_for_uuid = dict((uuid, when) for when, uuid in self.frame_times_in_track(track, during))
+        for uuid, value, done in self.ws.iter_probe_series(when_for_uuid.keys(), xy_pos=xy_pos, points=polygon):
+            yield when_for_uuid[uuid], uuid, value, done
+
     def sync_available_tracks(self):
         old_tracks = set(self.doc.track_order.values())
         self.doc.sync_potential_tracks_from_metadata()
@@ -1168,6 +1199,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
     # signals
     # Clarification: Layer interfaces migrate to layer meaning "current active products under the playhead"
     didAddBasicLayer = pyqtSignal(tuple, UUID, prez)  # new order list with None for new layer; info-dictionary, overview-content-ndarray
+    didAddBasicLayers = pyqtSignal(tuple, list, list)  # new order list with None for new layers, new layer UUIDs bottom to top, their prezs
     didAddCompositeLayer = pyqtSignal(tuple, UUID, prez)  # comp layer is derived from multiple basic layers and has its own UUID
     didRemoveLayers = pyqtSignal(tuple, list, int, int)  # new order, UUIDs that were removed from current layer set, first row removed, num rows removed
     willPurgeLayer = pyqtSignal(UUID)  # UUID of the layer being removed
@@ -1188,6 +1220,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
     didRemoveFamily = pyqtSignal(str)  # name of the newly added family and dict of family info
     didReorderTracks = pyqtSignal(set, set)  # added track names, removed track names
     didChangeImageKind = pyqtSignal(dict)
+    didCalculateAlgebraicStep = pyqtSignal(UUID, object, int)  # uuid, info, insert_before of one step of apply_algebraic_recipe; emitted from the task queue
 
     # high-level contexts providing purposed access to low-level document and its storage, as well as MDB and WS
     # layer display shows active products under the playhead
@@ -1223,6 +1256,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         self.as_region_probes = DocumentAsRegionProbes(self, workspace.metadatabase, workspace)
 
         self._workspace = workspace
+        self.didCalculateAlgebraicStep.connect(self._add_algebraic_layer)
         self._layer_sets = [DocLayerStack(self)] + [None] * (layer_set_count - 1)
         self._layer_with_uuid = {}
         self.colormaps = COLORMAP_MANAGER
@@ -1321,10 +1355,10 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         self.family_composition = {}
         self.family_presentation = {}
 
-        # scan available metadata for initial state
-        # FIXME: refresh this once background scan finishes and new products are found
+        # scan available metadata for initial state, then follow tracks as the workspace gains and loses products
         # self.timeline_span = self.playback_span = self.potential_product_span()
         self.sync_potential_tracks_from_metadata()
+        self._workspace.matrix.didChangeTracks.connect(self.sync_potential_tracks_from_metadata)
 
     def potential_product_span(self) -> T.Optional[span]:
         with self._workspace.metadatabase as S:
@@ -1343,21 +1377,26 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         with self._workspace.metadatabase as S:
             return list((f + FCS_SEP + c) for (f, c) in S.query(Product.family, Product.category).distinct())
 
-    def sync_potential_tracks_from_metadata(self):
-        """update track_order to include any newly available tracks
-        """
-        all_tracks = list(self.potential_tracks())
-        all_tracks.sort()
-        old_tracks = set(name for z, name in self.track_order.items())
-        for track in all_tracks:
+    def sync_potential_tracks_from_metadata(self, gained: T.Iterable[str] = None, lost: T.Iterable[str] = None):
+        """update track_order to include any newly available tracks and drop those left without products
+        given the tracks gained and lost, as from the workspace matrix's didChangeTracks, only those are touched;
+        otherwise track_order is reconciled with the tracks the matrix holds, without querying the metadatabase
+        """
+        old_tracks = set(self.track_order.values())
+        if gained is None and lost is None:
+            present = set(self._workspace.matrix.tracks)
+            gained, lost = present - old_tracks, old_tracks - present
+        gained = sorted(set(gained or ()) - old_tracks)
+        lost = set(lost or ()) & old_tracks
+        for track in gained:
             self.track_order.append(track, start_negative=True, not_if_present=True)
-        for dismissed in old_tracks - set(all_tracks):
+        for dismissed in lost:
             LOG.debug("removing track {} from track_order".format(dismissed))
             self.track_order.remove(dismissed)
-        new_tracks = set(name for z, name in self.track_order.items())
-        if old_tracks != new_tracks:
-            LOG.info("went from {} available tracks to {}".format(len(old_tracks), len(new_tracks)))
-            self.didReorderTracks.emit(new_tracks - old_tracks, old_tracks - new_tracks)
+        if gained or lost:
+            LOG.info("{} available tracks after {} added and {} removed".format(
+                len(old_tracks) + len(gained) - len(lost), len(gained), len(lost)))
+            self.didReorderTracks.emit(set(gained), lost)
 
     def find_colormap(self, colormap):
         if isinstance(colormap, str) and colormap in self.colormaps:
@@ -1444,8 +1483,9 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             if lset is not None:  # uninitialized layer sets will be None
                 lset.insert(insert_before, p if dex == self.current_set_index else q)
 
-        reordered_indices = tuple([None] + list(range(old_layer_count)))  # FIXME: this should obey insert_before, currently assumes always insert at top
-        return p, reordered_indices
+        reordered_indices = list(range(old_layer_count))
+        reordered_indices.insert(insert_before, None)
+        return p, tuple(reordered_indices)
 
     def open_file(self, path, insert_before=0):
         """
@@ -1459,14 +1499,11 @@ class Document(QObject):  # base class is rightmost, mixins left of that
                       DeprecationWarning)
         return list(self.import_files([path], insert_before=insert_before))
 
-    def activate_product_uuid_as_new_layer(self, uuid: UUID, insert_before=0, **importer_kwargs):
-        if uuid in self._layer_with_uuid:
-            LOG.debug("Layer already loaded: {}".format(uuid))
-            active_content_data = self._workspace.import_product_content(uuid, **importer_kwargs)
-            return uuid, self[uuid], active_content_data
-
-        # FUTURE: Load this async, the slots for the below signal need to be OK with that
-        active_content_data = self._workspace.import_product_content(uuid, **importer_kwargs)
+    def _new_basic_layer(self, uuid: UUID, insert_before=0):
+        """
+        make a layer for a product whose content is imported, and insert it into the layer sets, but do not signal
+        :return: DocBasicLayer, new prez tuple, new reordered indices tuple
+        """
         # updated metadata with content information (most importantly nav information)
         info = self._workspace.get_info(uuid)
         assert(info is not None)
@@ -1479,6 +1516,17 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         if INFO.FAMILY not in dataset:
             dataset[INFO.FAMILY] = self.family_for_product_or_layer(dataset)
         presentation, reordered_indices = self._insert_layer_with_info(dataset, insert_before=insert_before)
+        return dataset, presentation, reordered_indices
+
+    def activate_product_uuid_as_new_layer(self, uuid: UUID, insert_before=0, **importer_kwargs):
+        if uuid in self._layer_with_uuid:
+            LOG.debug("Layer already loaded: {}".format(uuid))
+            active_content_data = self._workspace.import_product_content(uuid, **importer_kwargs)
+            return uuid, self[uuid], active_content_data
+
+        # FUTURE: Load this async, the slots for the below signal need to be OK with that
+        active_content_data = self._workspace.import_product_content(uuid, **importer_kwargs)
+        dataset, presentation, reordered_indices = self._new_basic_layer(uuid, insert_before=insert_before)
 
         # signal updates from the document
         self.didAddBasicLayer.emit(reordered_indices, dataset.uuid, presentation)
@@ -1488,6 +1536,51 @@ class Document(QObject):  # base class is rightmost, mixins left of that
 
         return uuid, dataset, active_content_data
 
+    def add_basic_layers(self, uuids: T.Iterable[UUID], insert_before=0) -> T.List[DocBasicLayer]:
+        """
+        add products whose content is already imported as layers, announcing them all with one didAddBasicLayers
+        products already in the document are skipped
+        :param uuids: products in the order to add them, the last ending up topmost
+        :return: list of new layers
+        """
+        # compose each insertion's reordering into one relative to the layers before the batch
+        reordered_indices = list(range(len(self.current_layer_set)))
+        layers, presentations = [], []
+        for uuid in uuids:
+            if uuid in self._layer_with_uuid:
+                LOG.debug("Layer already loaded: {}".format(uuid))
+                continue
+            dataset, presentation, step = self._new_basic_layer(uuid, insert_before=insert_before)
+            reordered_indices = [None if dex is None else reordered_indices[dex] for dex in step]
+            layers.append(dataset)
+            presentations.append(presentation)
+        if not layers:
+            return []
+
+        # signal updates from the document
+        self.didAddBasicLayers.emit(tuple(reordered_indices), [layer.uuid for layer in layers], presentations)
+        for dataset in layers:
+            self._add_layer_family(dataset)
+        # update any RGBs that could use these to make an RGB
+        self.sync_composite_layer_prereqs(sorted(set(layer[INFO.SCHED_TIME] for layer in layers)))
+        return layers
+
+    def activate_product_uuids_as_new_layers(self, uuids: T.Iterable[UUID], insert_before=0, **importer_kwargs):
+        """
+        import content for many products concurrently, then add them as layers with a single didAddBasicLayers
+        :param uuids: products in the order to add them, the last ending up topmost
+        :return: generator of task progress dicts; the layers are added once it is exhausted
+        """
+        uuids = [uuid for uuid in uuids if uuid not in self._layer_with_uuid]
+        for dex, (uuid, done) in enumerate(self._workspace.iter_import_product_contents(uuids, **importer_kwargs)):
+            yield {
+                TASK_DOING: 'Loading content {}/{}'.format(dex + 1, len(uuids)),
+                TASK_PROGRESS: done,
+                'uuid': uuid,
+                'num_products': len(uuids),
+            }
+        self.add_basic_layers(uuids, insert_before=insert_before)
+
     def family_for_product_or_layer(self, uuid_or_layer):
         if isinstance(uuid_or_layer, UUID):
             with self._workspace.metadatabase as s:
@@ -1594,21 +1687,20 @@ class Document(QObject):  # base class is rightmost, mixins left of that
 
         # reverse list since we always insert a top layer
         uuids = list(reversed(self.sort_product_uuids(uuids)))
-
-        # collect product and resource information but don't yet import content
-        for dex, uuid in enumerate(uuids):
+        for uuid in uuids:
             if uuid in self._layer_with_uuid:
                 LOG.warning("layer with UUID {} already in document?".format(uuid))
                 self._workspace.get_content(uuid)
-            else:
-                self.activate_product_uuid_as_new_layer(uuid, insert_before=insert_before, **importer_kwargs)
 
-            yield {
-                TASK_DOING: 'Loading content {}/{}'.format(dex + 1, total_products),
-                TASK_PROGRESS: float(dex + 1) / float(total_products),
-                'uuid': uuid,
-                'num_products': total_products,
-            }
+        # import content concurrently, then add every new layer at once
+        yield from self.activate_product_uuids_as_new_layers(uuids, insert_before=insert_before, **importer_kwargs)
+        # content arrives in any order; finish with the topmost layer, which callers take to be the last uuid
+        yield {
+            TASK_DOING: 'Loaded content',
+            TASK_PROGRESS: 1.0,
+            'uuid': uuids[-1],
+            'num_products': total_products,
+        }
 
     def sort_paths(self, paths):
         """
@@ -2053,6 +2145,37 @@ class Document(QObject):  # base class is rightmost, mixins left of that
                     L[dex] = pinfo._replace(climits=nfo[uuid])
         self.didChangeColorLimits.emit(nfo)
 
+    def auto_contrast_layers(self, uuids=None, regions=None):
+        """Stretch color limits of layers and their time siblings to the 2nd-98th percentile of their data.
+        Percentiles come from the per-tile statistics written at import; layers without them are left alone.
+        Siblings share the limits of the given layer so animation doesn't flicker.
+        :param uuids: layers to stretch, None for all data layers
+        :param regions: {uuid: (row slice, column slice)} of content to stretch for, typically what is in view;
+                        layers not in it are stretched for their whole image
+        """
+        regions = regions or {}
+        L = self.current_layer_set
+        if uuids is None:  # all data layers
+            uuids = [pinfo.uuid for pinfo in L]
+        nfo = {}
+        for uuid in uuids:
+            layer = self._layer_with_uuid.get(uuid)
+            if layer is None or layer[INFO.KIND] not in {KIND.IMAGE, KIND.COMPOSITE}:
+                continue
+            rows, cols = regions.get(uuid, (None, None))
+            clims = self._workspace.auto_clims(uuid, rows=rows, cols=cols)
+            if clims is None:
+                LOG.info("no statistics to auto-contrast {}".format(uuid))
+                continue
+            siblings = set(self.time_siblings(uuid)[0])
+            for dex, pinfo in enumerate(L):
+                if pinfo.uuid in siblings:
+                    # keep a flipped colormap flipped
+                    flipped = pinfo.climits is not None and pinfo.climits[0] > pinfo.climits[1]
+                    nfo[pinfo.uuid] = clims[::-1] if flipped else clims
+                    L[dex] = pinfo._replace(climits=nfo[pinfo.uuid])
+        self.didChangeColorLimits.emit(nfo)
+
     def change_gamma_for_layers_where(self, gamma, **query):
         nfo = {}
         L = self.current_layer_set
@@ -2084,10 +2207,12 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             layer_set[idx] = new_pz
         self.didChangeImageKind.emit(nfo)
 
-    def create_algebraic_composite(self, operations, namespace, info=None, insert_before=0):
-        if info is None:
-            info = {}
-
+    def _algebraic_time_steps(self, namespace):
+        """
+        resolve algebraic operands for every time step where all of them are available
+        :param namespace: {variable: uuid, } operands as chosen for one time step
+        :return: list of (scheduled time, {variable: uuid, }) per time step
+        """
         # Map a UUID's short name to the variable name in the namespace
         # Keep track of multiple ns variables being the same UUID
         short_name_to_ns_name = {}
@@ -2101,6 +2226,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         # NOTE: This does not handle if one product has a missing step and
         # another has a different missing time step
         time_master = max(namespace_siblings.values(), key=lambda v: len(v))
+        steps = []
         for idx in range(len(time_master)):
             t = self[time_master[idx]][INFO.SCHED_TIME]
             channel_siblings = [(self[u][INFO.SHORT_NAME], u) for u in self.channel_siblings(time_master[idx])[0]]
@@ -2114,17 +2240,84 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             if len(temp_namespace) != len(namespace):
                 LOG.info("Missing some layers to create algebraic layer at {:%Y-%m-%d %H:%M:%S}".format(t))
                 continue
-            LOG.info("Creating algebraic layer '{}' for time {:%Y-%m-%d %H:%M:%S}".format(info.get(INFO.SHORT_NAME), self[time_master[idx]].get(INFO.SCHED_TIME)))
+            steps.append((t, temp_namespace))
+        return steps
+
+    def _add_algebraic_layer(self, uuid, layer_info, insert_before=0):
+        """
+        register a calculated algebraic product as a layer and announce it
+        """
+        if uuid in self._layer_with_uuid:
+            # the workspace reused a product we already present for this time step
+            LOG.info("algebraic layer {} is already loaded".format(uuid))
+            return
+        self._layer_with_uuid[uuid] = dataset = DocBasicLayer(self, layer_info)
+        presentation, reordered_indices = self._insert_layer_with_info(dataset, insert_before=insert_before)
+        if INFO.UNIT_CONVERSION not in dataset:
+            dataset[INFO.UNIT_CONVERSION] = units_conversion(dataset)
+        if INFO.FAMILY not in dataset:
+            dataset[INFO.FAMILY] = self.family_for_product_or_layer(dataset)
+        self._add_layer_family(dataset)
+        self.didAddCompositeLayer.emit(reordered_indices, dataset.uuid, presentation)
+
+    def create_algebraic_composite(self, operations, namespace, info=None, insert_before=0):
+        if info is None:
+            info = {}
 
+        for t, temp_namespace in self._algebraic_time_steps(namespace):
+            LOG.info("Creating algebraic layer '{}' for time {:%Y-%m-%d %H:%M:%S}".format(info.get(INFO.SHORT_NAME), t))
             uuid, layer_info, data = self._workspace.create_algebraic_composite(operations, temp_namespace, info.copy())
-            self._layer_with_uuid[uuid] = dataset = DocBasicLayer(self, layer_info)
-            presentation, reordered_indices = self._insert_layer_with_info(dataset, insert_before=insert_before)
-            if INFO.UNIT_CONVERSION not in dataset:
-                dataset[INFO.UNIT_CONVERSION] = units_conversion(dataset)
-            if INFO.FAMILY not in dataset:
-                dataset[INFO.FAMILY] = self.family_for_product_or_layer(dataset)
-            self._add_layer_family(dataset)
-            self.didAddCompositeLayer.emit(reordered_indices, dataset.uuid, presentation)
+            self._add_algebraic_layer(uuid, layer_info, insert_before=insert_before)
+
+    def apply_algebraic_recipe(self, operations, namespace, info=None, insert_before=0):
+        """
+        create an algebraic layer for every time step of its operands on background workers
+        each time step is calculated concurrently and becomes a layer as soon as it finishes
+        :param operations: python statements, the last of which assigns the result
+        :param namespace: {variable: uuid, } operands as chosen for one time step
+        :param info: initial metadata for the new layers
+        :param insert_before: layer list position for the new layers
+        """
+        if info is None:
+            info = {}
+        steps = self._algebraic_time_steps(namespace)
+        if not steps:
+            return
+        LOG.info("Creating algebraic layer '{}' for {} time steps".format(info.get(INFO.SHORT_NAME), len(steps)))
+        self.queue.add("algebraic recipe " + str(uuidgen()),
+                       self._bgnd_algebraic_recipe(operations, steps, info, insert_before),
+                       "Calculating {} algebraic layers".format(len(steps)), interactive=False)
+
+    def _bgnd_algebraic_recipe(self, operations, steps, info, insert_before):
+        """
+        background task running one algebraic calculation per time step in a thread pool
+        completed steps are handed to the UI thread through didCalculateAlgebraicStep as they finish
+        """
+        total = len(steps)
+        progress = [0.0] * total  # written by pool threads, summed here for overall progress
+
+        def _calculate(idx, temp_namespace):
+            status = {}
+            for status in self._workspace.iter_algebraic_composite(operations, temp_namespace, info.copy()):
+                progress[idx] = status[TASK_PROGRESS]
+            return status['result']
+
+        finished = 0
+        yield {TASK_DOING: 'Calculating algebraic layers 0/{}'.format(total), TASK_PROGRESS: 0.0}
+        with ThreadPoolExecutor(max_workers=min(total, DEFAULT_RECIPE_WORKERS)) as pool:
+            pending = set(pool.submit(_calculate, idx, ns) for idx, (t, ns) in enumerate(steps))
+            while pending:
+                done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished += 1
+                    try:
+                        uuid, layer_info, data = future.result()
+                    except Exception:
+                        LOG.error("algebraic layer calculation failed", exc_info=True)
+                        continue
+                    self.didCalculateAlgebraicStep.emit(uuid, layer_info, insert_before)
+                yield {TASK_DOING: 'Calculating algebraic layers {}/{}'.format(finished, total),
+                       TASK_PROGRESS: sum(progress) / total}
 
     def available_rgb_components(self):
         non_rgb_classes = [DocBasicLayer, DocCompositeLayer]
@@ -2597,6 +2790,13 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         """
         if sibling_infos is None:
             sibling_infos = self._layer_with_uuid
+            if uuid in sibling_infos and uuid in self._workspace.matrix:
+                # only visit the products of this one's category and scheduled time, rather than every layer
+                candidates = (sibling_infos[u] for u in self._workspace.matrix.channel_siblings(uuid)[0]
+                              if u in sibling_infos)
+                sibs = sorted((x[INFO.SHORT_NAME], x[INFO.UUID]) for x in self._filter(
+                    candidates, sibling_infos[uuid], {INFO.SCENE, INFO.SCHED_TIME, INFO.INSTRUMENT, INFO.PLATFORM}))
+                return [u for _, u in sibs], [u for _, u in sibs].index(uuid)
         it = sibling_infos.get(uuid, None)
         if it is None:
             return None
@@ -2628,6 +2828,10 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         """
         if sibling_infos is None:
             sibling_infos = self._layer_with_uuid
+            if uuid in sibling_infos and uuid in self._workspace.matrix:
+                # the matrix holds this layer's track in time order, so only that track is visited
+                sibs = [u for u in self._workspace.matrix.time_siblings(uuid)[0] if u in sibling_infos]
+                return sibs, sibs.index(uuid)
         it = sibling_infos.get(uuid, None)
         if it is None:
             return [], 0
@@ -66,15 +66,10 @@ def mask_inside_index_shape(xoff, yoff, width, height, shape):
     return mask
 
 
-def content_within_shape(content:np.ndarray, trans:Affine, shape:sgp.LinearRing):
+def _shape_index_bounds(trans:Affine, shape:sgp.LinearRing):
     """
-
-    :param content: data being displayed on the screen
-    :param trans: affine transform between content array indices and screen coordinates
-    :param shape: LinearRing in screen coordinates (e.g. mercator meters)
-    :return: masked_content:masked_array, (y_index_offset:int, x_index_offset:int) containing minified masked content array
+    :return: (x_index_offset, y_index_offset, width, height) of the content box holding the shape
     """
-    # Get the bounds so we can limit how big our rasterize boolean array actually is
     inv_trans = ~trans
     # convert bounding box to content coordinates
     # (0, 0) image index is upper-left origin of data (needs more work if otherwise)
@@ -87,10 +82,25 @@ def content_within_shape(content:np.ndarray, trans:Affine, shape:sgp.LinearRing)
     # subset the content (ny is the higher *index*, my is the lower *index*)
     w = (mx-nx)+1
     h = (ny-my)+1
+    return nx, my, w, h
 
+
+def _oriented_polygon(shape:sgp.LinearRing):
     # Make our linear ring a properly oriented shapely polygon
-    shape = sgp.Polygon(shape)
-    shape = sgp.orient(shape)
+    return sgp.orient(sgp.Polygon(shape))
+
+
+def content_within_shape(content:np.ndarray, trans:Affine, shape:sgp.LinearRing):
+    """
+
+    :param content: data being displayed on the screen
+    :param trans: affine transform between content array indices and screen coordinates
+    :param shape: LinearRing in screen coordinates (e.g. mercator meters)
+    :return: masked_content:masked_array, (y_index_offset:int, x_index_offset:int) containing minified masked content array
+    """
+    # Get the bounds so we can limit how big our rasterize boolean array actually is
+    nx, my, w, h = _shape_index_bounds(trans, shape)
+    shape = _oriented_polygon(shape)
     # create a transform that is shifted to where the polygon is
     offset_trans = trans * Affine.translation(nx, my)
 
@@ -101,6 +111,99 @@ def content_within_shape(content:np.ndarray, trans:Affine, shape:sgp.LinearRing)
     return index_mask, content[index_mask]
 
 
+def shape_stride(trans:Affine, shape:sgp.LinearRing, max_cells):
+    """
+    :param trans: affine transform between content array indices and screen coordinates
+    :param shape: LinearRing in screen coordinates
+    :param max_cells: most content cells wanted in the box around the shape
+    :return: stride along both axes keeping the strided box within max_cells
+    """
+    _, _, w, h = _shape_index_bounds(trans, shape)
+    return max(1, int(np.ceil(np.sqrt(float(w) * h / max_cells))))
+
+
+class ShapeMask(object):
+    """
+    cells of a content grid inside a shape, stored as a bounding box plus a packed bitmask
+    a few bits per cell of the box, so it can be kept and reused for every product on the same grid
+    """
+    y0 = 0  # first row of the box, in strided rows
+    x0 = 0  # first column of the box, in strided columns
+    height = 0
+    width = 0
+    stride = 1  # box indices times stride are full content indices
+    bits = None  # (height, ceil(width / 8)) uint8 array from np.packbits
+
+    def __init__(self, y0, x0, height, width, stride, bits):
+        self.y0, self.x0, self.height, self.width, self.stride, self.bits = y0, x0, height, width, stride, bits
+
+    @property
+    def nbytes(self):
+        return 0 if self.bits is None else self.bits.nbytes
+
+    def iter_index(self, chunk_rows=256):
+        """
+        :param chunk_rows: box rows unpacked at a time
+        :return: generator of ((row indices, column indices) into the full content, fraction of rows done)
+        """
+        for start in range(0, self.height, chunk_rows):
+            stop = min(self.height, start + chunk_rows)
+            block = np.unpackbits(self.bits[start:stop], axis=1)[:, :self.width]
+            iy, ix = np.nonzero(block)
+            yield ((iy + self.y0 + start) * self.stride, (ix + self.x0) * self.stride), float(stop) / self.height
+
+    def index(self):
+        """
+        :return: (row indices, column indices) of every cell in the shape, like np.nonzero
+        """
+        parts = [index for index, _ in self.iter_index()]
+        if not parts:
+            return np.zeros((0,), dtype=np.int64), np.zeros((0,), dtype=np.int64)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def rasterize_shape_mask(trans:Affine, shape:sgp.LinearRing, content_shape, stride=1, chunk_rows=256):
+    """
+    rasterize a shape onto (a stride of) a content grid, a block of rows at a time
+    :param trans: affine transform between content array indices and screen coordinates
+    :param shape: LinearRing in screen coordinates (e.g. mercator meters)
+    :param content_shape: (rows, cols) of the content
+    :param stride: sample every stride'th row and column, for a quick coarse pass
+    :param chunk_rows: strided rows rasterized per block
+    :return: ShapeMask
+    """
+    trans = trans * Affine.scale(stride)
+    nx, my, w, h = _shape_index_bounds(trans, shape)
+    # keep to the strided content
+    rows, cols = (content_shape[0] + stride - 1) // stride, (content_shape[1] + stride - 1) // stride
+    x0, x1 = max(0, nx), min(cols, nx + w)
+    y0, y1 = max(0, my), min(rows, my + h)
+    if x1 <= x0 or y1 <= y0:
+        return ShapeMask(0, 0, 0, 0, stride, None)
+    shape = _oriented_polygon(shape)
+    bits = np.empty((y1 - y0, (x1 - x0 + 7) // 8), dtype=np.uint8)
+    for start in range(y0, y1, chunk_rows):
+        stop = min(y1, start + chunk_rows)
+        offset_trans = trans * Affine.translation(x0, start)
+        mask = rasterize([shape], out_shape=(stop - start, x1 - x0), transform=offset_trans, default_value=1)
+        bits[start - y0:stop - y0] = np.packbits(mask.astype(np.bool_), axis=1)
+    return ShapeMask(y0, x0, y1 - y0, x1 - x0, stride, bits)
+
+
+def iter_content_within_shape(content:np.ndarray, mask:ShapeMask, chunk_rows=256):
+    """
+    like content_within_shape, but gathers a block of rows at a time,
+    so the selected content never exists in full
+    :param content: data being displayed on the screen
+    :param mask: ShapeMask on the content's grid
+    :param chunk_rows: mask rows handled per block
+    :return: generator of ((row indices, column indices), content values, fraction of rows done);
+             indices are into the full content regardless of the mask's stride
+    """
+    for index_mask, done in mask.iter_index(chunk_rows):
+        yield index_mask, content[index_mask], done
+
+
 def original_data_within_shape(raw_data:np.ndarray,
                                content_proj:prj.Proj,
                                display_xform:prj.Proj,
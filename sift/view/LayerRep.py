@@ -162,6 +162,48 @@ _texture_lookup = """
     }"""
 
 
+_spatial_filters = None  # (kernel Texture2D, {interpolation: filter name}) shared by all tiled visuals
+
+
+def shared_spatial_filters():
+    """
+    Load the spatial filter kernel once and share its texture between visuals, since it never changes
+    :return: (kernel texture, dictionary of lower-case interpolation name to spatial filter function name)
+    """
+    global _spatial_filters
+    if _spatial_filters is None:
+        # load 'float packed rgba8' interpolation kernel
+        # to load float interpolation kernel use
+        # `load_spatial_filters(packed=False)`
+        kernel, names = load_spatial_filters()
+        # The unpacking can be debugged by changing "spatial-filters.frag"
+        # to have the "unpack" function just return the .r component. That
+        # combined with using Texture2D(kernel, interpolation='linear', internalformat='r32f')
+        # as the kernel texture allows debugging of the pipeline
+        _spatial_filters = (Texture2D(kernel, interpolation='nearest'), dict((n.lower(), n) for n in names))
+    return _spatial_filters
+
+
+class InterpolationFunctions(dict):
+    """
+    Interpolation shader functions for one visual, keyed by lower-case interpolation name.
+    Functions carry per-visual variables so they can't be shared, but most visuals only ever use one,
+    so each is created when first looked up instead of parsing every filter up front.
+    """
+    def __init__(self, filter_names):
+        super(InterpolationFunctions, self).__init__()
+        self._filter_names = filter_names
+
+    def __missing__(self, name):
+        if name in ('nearest', 'bilinear'):
+            # "hardware" interpolation
+            fun = Function(_texture_lookup)
+        else:
+            fun = Function(_interpolation_template % self._filter_names[name])
+        self[name] = fun
+        return fun
+
+
 class TextureTileState(object):
     """Object to hold the state of the current tile texture.
 
@@ -295,34 +337,11 @@ class TiledGeolocatedImageVisual(ImageVisual):
         # What tiles have we used and can we use
         self.texture_state = TextureTileState(self.num_tex_tiles)
 
-        # load 'float packed rgba8' interpolation kernel
-        # to load float interpolation kernel use
-        # `load_spatial_filters(packed=False)`
-        kernel, self._interpolation_names = load_spatial_filters()
-
-        self._kerneltex = Texture2D(kernel, interpolation='nearest')
-        # The unpacking can be debugged by changing "spatial-filters.frag"
-        # to have the "unpack" function just return the .r component. That
-        # combined with using the below as the _kerneltex allows debugging
-        # of the pipeline
-        # self._kerneltex = Texture2D(kernel, interpolation='linear',
-        #                             internalformat='r32f')
-
-        # create interpolation shader functions for available
-        # interpolations
-        fun = [Function(_interpolation_template % n)
-               for n in self._interpolation_names]
-        self._interpolation_names = [n.lower()
-                                     for n in self._interpolation_names]
-
-        self._interpolation_fun = dict(zip(self._interpolation_names, fun))
-        self._interpolation_names.sort()
-        self._interpolation_names = tuple(self._interpolation_names)
-
-        # overwrite "nearest" and "bilinear" spatial-filters
-        # with  "hardware" interpolation _data_lookup_fn
-        self._interpolation_fun['nearest'] = Function(_texture_lookup)
-        self._interpolation_fun['bilinear'] = Function(_texture_lookup)
+        # the interpolation kernel texture is shared by all tiled visuals,
+        # shader functions are only created for the interpolations actually used
+        self._kerneltex, filter_names = shared_spatial_filters()
+        self._interpolation_fun = InterpolationFunctions(filter_names)
+        self._interpolation_names = tuple(sorted(filter_names.keys()))
 
         if interpolation not in self._interpolation_names:
             raise ValueError("interpolation must be one of %s" %
@@ -420,7 +439,9 @@ class TiledGeolocatedImageVisual(ImageVisual):
         self._data = ArrayProxy(self.ndim, self.shape)
         self.overview_info = nfo = {}
         y_slice, x_slice = self.calc.overview_stride
-        nfo["data"] = data[y_slice, x_slice]
+        # keep a copy in memory rather than a strided view of the memmap, so it can be probed without disk access
+        nfo["data"] = np.ascontiguousarray(data[y_slice, x_slice])
+        nfo["stride"] = (y_slice.step, x_slice.step)
         # Update kwargs to reflect the new spatial resolution of the overview image
         nfo["cell_width"] = self.cell_width * x_slice.step
         nfo["cell_height"] = self.cell_height * y_slice.step
@@ -744,34 +765,11 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
         self.ndim = len(self.shape) or [x for x in data_arrays if x is not None][0].ndim
         self.num_channels = len(data_arrays)
 
-        # load 'float packed rgba8' interpolation kernel
-        # to load float interpolation kernel use
-        # `load_spatial_filters(packed=False)`
-        kernel, self._interpolation_names = load_spatial_filters()
-
-        self._kerneltex = Texture2D(kernel, interpolation='nearest')
-        # The unpacking can be debugged by changing "spatial-filters.frag"
-        # to have the "unpack" function just return the .r component. That
-        # combined with using the below as the _kerneltex allows debugging
-        # of the pipeline
-        # self._kerneltex = Texture2D(kernel, interpolation='linear',
-        #                             internalformat='r32f')
-
-        # create interpolation shader functions for available
-        # interpolations
-        fun = [Function(_interpolation_template % n)
-               for n in self._interpolation_names]
-        self._interpolation_names = [n.lower()
-                                     for n in self._interpolation_names]
-
-        self._interpolation_fun = dict(zip(self._interpolation_names, fun))
-        self._interpolation_names.sort()
-        self._interpolation_names = tuple(self._interpolation_names)
-
-        # overwrite "nearest" and "bilinear" spatial-filters
-        # with  "hardware" interpolation _data_lookup_fn
-        self._interpolation_fun['nearest'] = Function(_texture_lookup)
-        self._interpolation_fun['bilinear'] = Function(_texture_lookup)
+        # the interpolation kernel texture is shared by all tiled visuals,
+        # shader functions are only created for the interpolations actually used
+        self._kerneltex, filter_names = shared_spatial_filters()
+        self._interpolation_fun = InterpolationFunctions(filter_names)
+        self._interpolation_names = tuple(sorted(filter_names.keys()))
 
         if interpolation not in self._interpolation_names:
             raise ValueError("interpolation must be one of %s" %
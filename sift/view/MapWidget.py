@@ -33,6 +33,7 @@ __author__ = 'rayg'
 __docformat__ = 'reStructuredText'
 
 import logging
+import time
 
 LOG = logging.getLogger(__name__)
 
@@ -202,8 +203,134 @@ class Animating(Idling):
     """
 
 
+_BLIT_VERTEX = """
+attribute vec2 a_position;
+varying vec2 v_texcoord;
+void main() {
+    v_texcoord = (a_position + 1.0) / 2.0;
+    gl_Position = vec4(a_position, 0.0, 1.0);
+}
+"""
+
+_BLIT_FRAGMENT = """
+uniform sampler2D u_texture;
+varying vec2 v_texcoord;
+void main() {
+    gl_FragColor = texture2D(u_texture, v_texcoord);
+}
+"""
+
+
 class SIFTMainMapCanvas(scene.SceneCanvas):
-    pass
+    """
+    Main map canvas.
+    Can capture the scene into offscreen textures and then present one of them in place of drawing the scene graph,
+    which lets a looping animation play back as a single textured quad per frame (see SceneGraphManager flipbook).
+    While the user is interacting, the scene is drawn into a reduced-resolution framebuffer and stretched to the
+    canvas; the reduction adapts to the measured frame time and full resolution returns when interaction ends.
+    """
+    interactive_frame_time = 1.0 / 30.0  # seconds per frame to aim for while interacting
+    min_render_scale = 0.25  # lowest fraction of full resolution used while interacting
+
+    _blit_program = None  # gloo.Program drawing a full-canvas textured quad
+    _flipbook_frame = None  # gloo.Texture2D shown instead of the scene, or None to draw the scene
+    _interacting = False
+    _render_scale = 1.0  # fraction of full resolution used while interacting, adapted to frame time
+    _scaled_target = None  # (size, texture, framebuffer) reused between reduced-resolution frames
+
+    def _offscreen_target(self, size, interpolation='nearest'):
+        texture = gloo.Texture2D(shape=size[::-1] + (4,), interpolation=interpolation)
+        fbo = gloo.FrameBuffer(color=texture, depth=gloo.RenderBuffer(size[::-1]))
+        return texture, fbo
+
+    def _draw_scene_into(self, fbo, bgcolor=None):
+        # the framebuffer may be smaller than the canvas; vispy maps the canvas size onto it
+        self.push_fbo(fbo, (0, 0), self.size)
+        try:
+            self.context.clear(color=self.bgcolor if bgcolor is None else bgcolor, depth=True)
+            self.draw_visual(self.scene)
+        finally:
+            self.pop_fbo()
+
+    def _blit(self, texture):
+        if self._blit_program is None:
+            self._blit_program = gloo.Program(_BLIT_VERTEX, _BLIT_FRAGMENT)
+            self._blit_program['a_position'] = np.array([[-1., -1.], [1., -1.], [-1., 1.], [1., 1.]], dtype=np.float32)
+        self.context.set_viewport(0, 0, *self.physical_size)
+        self.context.clear(color=self.bgcolor, depth=True)
+        self._blit_program['u_texture'] = texture
+        self._blit_program.draw('triangle_strip')
+
+    def render_to_texture(self, bgcolor=None):
+        """
+        draw the scene once into an offscreen framebuffer at display resolution
+        :return: gloo.Texture2D holding the rendered frame
+        """
+        self.set_current()
+        texture, fbo = self._offscreen_target(tuple(self.physical_size))
+        self._draw_scene_into(fbo, bgcolor)
+        return texture
+
+    def show_flipbook_frame(self, texture=None):
+        """
+        present a texture from render_to_texture instead of the scene graph; None returns to drawing the scene
+        """
+        if texture is self._flipbook_frame:
+            return
+        self._flipbook_frame = texture
+        self.update()
+
+    @property
+    def render_scale(self):
+        """fraction of full resolution the next frame will be drawn at
+        """
+        return self._render_scale if self._interacting else 1.0
+
+    def begin_interaction(self):
+        """the view is being dragged or zoomed: draw at reduced resolution until end_interaction
+        """
+        self._interacting = True
+
+    def end_interaction(self):
+        """the view has settled: redraw at full resolution
+        """
+        if not self._interacting:
+            return
+        self._interacting = False
+        self._scaled_target = None
+        self.update()
+
+    def _adapt_render_scale(self, frame_time):
+        if frame_time > self.interactive_frame_time * 1.2:
+            self._render_scale = max(self.min_render_scale, self._render_scale * 0.8)
+        elif frame_time < self.interactive_frame_time * 0.6:
+            self._render_scale = min(1.0, self._render_scale * 1.1)
+
+    def _draw_scaled(self):
+        start = time.time()
+        size = tuple(max(1, int(dim * self._render_scale)) for dim in self.physical_size)
+        if self._scaled_target is None or self._scaled_target[0] != size:
+            self._scaled_target = (size,) + self._offscreen_target(size, interpolation='linear')
+        _, texture, fbo = self._scaled_target
+        self._draw_scene_into(fbo)
+        self._blit(texture)
+        # wait for the GPU so the measurement covers the actual rendering
+        self.context.finish()
+        self._adapt_render_scale(time.time() - start)
+
+    def on_draw(self, event):
+        if self._flipbook_frame is not None:
+            self._blit(self._flipbook_frame)
+        elif self._interacting and self._render_scale < 1.0:
+            self._draw_scaled()
+        elif self._interacting:
+            # full resolution while it keeps up; time it so we know when to start reducing
+            start = time.time()
+            super(SIFTMainMapCanvas, self).on_draw(event)
+            self.context.finish()
+            self._adapt_render_scale(time.time() - start)
+        else:
+            super(SIFTMainMapCanvas, self).on_draw(event)
 
 
 class SIFTMainMapWidget(app.Canvas):
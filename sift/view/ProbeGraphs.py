@@ -18,14 +18,17 @@ from PyQt4.QtCore import QObject, pyqtSignal
 # a useful constant
 from sift.common import INFO, KIND
 from sift.queue import TASK_PROGRESS, TASK_DOING
+from sift.workspace.statistics import StreamingHistogram, SummaryStatistics
 
 import logging
+import time
 import numpy as np
 
 # http://stackoverflow.com/questions/12459811/how-to-embed-matplotib-in-pyqt-for-dummies
 # see also: http://matplotlib.org/users/navigation_toolbar.html
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt4agg import NavigationToolbar2QT as NavigationToolbar
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 from matplotlib.colors import LogNorm
 
@@ -81,6 +84,57 @@ class NavigationToolbar(NavigationToolbar):
         figureoptions.figure_edit(axes, self)
 
 
+class ProbeCanvas(FigureCanvas):
+    """Qt canvas showing plots that were rasterized off the GUI thread.
+
+    Plot tasks draw a figure of their own with a non-GUI FigureCanvasAgg and hand over the figure and its pixels.
+    The canvas shows those pixels until it has to redraw by itself (toolbar pan/zoom, resizing),
+    at which point it draws the adopted figure like any other.
+    """
+    render_size = None  # (width, height) in pixels that plots rendered elsewhere should have
+
+    def __init__(self, figure):
+        super(ProbeCanvas, self).__init__(figure)
+        self.render_size = self.get_width_height()
+        self._rendered = None  # QImage handed over by present, until the next draw of our own
+
+    def present(self, figure, bgra, size):
+        """Adopt a figure rendered by a plot task and show its pixels; call from the GUI thread
+        :param figure: Figure the task drew
+        :param bgra: its pixels as bytes in QImage.Format_ARGB32 order
+        :param size: (width, height) of the pixels
+        """
+        figure.set_canvas(self)
+        self.figure = figure
+        width, height = size
+        if size != (self.width(), self.height()):
+            # resized while the task was rendering: redraw the figure at the new size instead
+            self._rendered = None
+            figure.set_size_inches(self.width() / figure.dpi, self.height() / figure.dpi)
+            self.draw_idle()
+            return
+        self._rendered = QtGui.QImage(bgra, width, height, width * 4, QtGui.QImage.Format_ARGB32).copy()
+        self.update()
+
+    def draw(self):
+        # interactive redraws (toolbar pan/zoom, resizing) replace the handed-over pixels
+        self._rendered = None
+        super(ProbeCanvas, self).draw()
+
+    def paintEvent(self, e):
+        if self._rendered is None:
+            super(ProbeCanvas, self).paintEvent(e)
+            return
+        painter = QtGui.QPainter(self)
+        painter.drawImage(0, 0, self._rendered)
+        painter.end()
+
+    def resizeEvent(self, e):
+        self._rendered = None
+        self.render_size = (e.size().width(), e.size().height())
+        super(ProbeCanvas, self).resizeEvent(e)
+
+
 class ProbeGraphManager(QObject):
     """The ProbeGraphManager manages the many tabs of the Area Probe Graphs."""
 
@@ -134,6 +188,7 @@ class ProbeGraphManager(QObject):
         self.document.didReorderLayers.connect(self.handleLayersChanged)
         self.document.didChangeLayerName.connect(self.handleLayersChanged)
         self.document.didAddBasicLayer.connect(self.handleLayersChanged)
+        self.document.didAddBasicLayers.connect(self.handleLayersChanged)
         self.document.didAddCompositeLayer.connect(self.handleLayersChanged)
         self.document.willPurgeLayer.connect(self.handleLayersChanged)
         self.document.didSwitchLayerSet.connect(self.handleLayersChanged)
@@ -304,6 +359,9 @@ class ProbeGraphDisplay (object) :
     # the default number of bins for the histogram and density scatter plot
     DEFAULT_NUM_BINS = 100
 
+    # seconds between redraws while a region plot is refined at full resolution
+    REFINE_REDRAW_INTERVAL = 0.5
+
     # the display name of the probe, should be unique across all probes
     myName          = None
 
@@ -312,6 +370,7 @@ class ProbeGraphDisplay (object) :
     canvas          = None
     toolbar         = None
     yCheckBox       = None
+    seriesCheckBox  = None
     xDropDown       = None
     yDropDown       = None
 
@@ -328,6 +387,7 @@ class ProbeGraphDisplay (object) :
     ySelectedUUID   = None
     uuidMap         = None  # this is needed because the drop downs can't properly handle objects as ids
     _stale          = True  # whether or not the plot needs to be redrawn
+    _generation     = 0  # counts plot rebuilds, so a superseded plot task can stop early
 
     def __init__(self, manager, qt_parent, workspace, queue, document, name_str):
         """build the graph tab controls
@@ -347,7 +407,9 @@ class ProbeGraphDisplay (object) :
         self.figure = Figure(figsize=(3,3), dpi=72)
         # this is the Canvas Widget that displays the `figure`
         # it takes the `figure` instance as a parameter to __init__
-        self.canvas = FigureCanvas(self.figure, )
+        # plots are rasterized by the background tasks that build them and handed over; see ProbeCanvas
+        self.canvas = ProbeCanvas(self.figure)
+        self._rendered = None  # (figure, pixels, size) from the latest plot task, not yet shown
         self.canvas.setMinimumSize(100, 100)
         # make sure our figure is clear
         self.clearPlot()
@@ -365,6 +427,11 @@ class ProbeGraphDisplay (object) :
         self.yCheckBox.setToolTip("Plot X layer data vs Y layer when this is checked.")
         self.yCheckBox.stateChanged.connect(self.vsChecked)
 
+        # the check box that turns on and off plotting the x layer's track over time
+        self.seriesCheckBox = QtGui.QCheckBox("Time series")
+        self.seriesCheckBox.setToolTip("Plot the point value, or the region mean, of every frame in the X layer's track.")
+        self.seriesCheckBox.stateChanged.connect(self.seriesChecked)
+
         # the drop down for selecting the x layer
         self.xDropDown = QtGui.QComboBox(qt_parent)
         self.xDropDown.setToolTip("The X layer data to use for plotting.")
@@ -385,6 +452,7 @@ class ProbeGraphDisplay (object) :
         layout.addWidget(self.xDropDown, 3, 2, 1, 2)
         layout.addWidget(self.yCheckBox, 4, 1)
         layout.addWidget(self.yDropDown, 4, 2, 1, 2)
+        layout.addWidget(self.seriesCheckBox, 5, 1, 1, 3)
         qt_parent.setLayout(layout)
 
     def set_possible_layers (self, uuid_list, do_rebuild_plot=False) :
@@ -512,6 +580,17 @@ class ProbeGraphDisplay (object) :
         self._stale = True
         self.rebuildPlot()
 
+    def seriesChecked (self) :
+        """The time series check box was checked!
+        """
+
+        # the y layer has no part in a time series
+        self.yCheckBox.setDisabled(self.seriesCheckBox.isChecked())
+
+        # regenerate the plot
+        self._stale = True
+        self.rebuildPlot()
+
     def setPolygon (self, polygonPoints) :
         """Set the polygon selection for this graph
         """
@@ -546,23 +625,34 @@ class ProbeGraphDisplay (object) :
             LOG.debug("Plot doesn't need to be rebuilt")
             return
 
+        # any plot still being built for this tab is now out of date and will stop at its next chunk
+        self._generation += 1
+
+        if self.seriesCheckBox.isChecked():
+            task_name = "%s_series_plotting" % (self.myName,)
+            self.queue.add(task_name, self._series_plot_task(self.xSelectedUUID, self.polygon, self.point,
+                                                             generation=self._generation),
+                           "Creating time series plot for probe", interactive=False)
+            self._stale = False
+            return
+
         # should be be plotting vs Y?
         doPlotVS = self.yCheckBox.isChecked()
         task_name = "%s_%s_region_plotting" % (self.xSelectedUUID, self.ySelectedUUID)
-        self.queue.add(task_name, self._rebuild_plot_task(self.xSelectedUUID, self.ySelectedUUID, self.polygon, self.point, plot_versus=doPlotVS), "Creating plot for region probe data", interactive=True)
+        self.queue.add(task_name, self._rebuild_plot_task(self.xSelectedUUID, self.ySelectedUUID, self.polygon, self.point,
+                                                          plot_versus=doPlotVS, generation=self._generation),
+                       "Creating plot for region probe data", interactive=True)
         # Assume that the task gets resolved otherwise we might try to draw multiple times
         self._stale = False
 
-    def _rebuild_plot_task(self, x_uuid, y_uuid, polygon, point_xy, plot_versus=False):
+    def _rebuild_plot_task(self, x_uuid, y_uuid, polygon, point_xy, plot_versus=False, generation=None):
 
         # if we are plotting only x and we have a selected x and a polygon
         if not plot_versus and x_uuid is not None and polygon is not None :
             yield {TASK_DOING: 'Probe Plot: Collecting polygon data...', TASK_PROGRESS: 0.0}
 
-            # get the data and info we need for this plot
-            data_polygon = self.workspace.get_content_polygon(x_uuid, polygon)
+            # get the info we need for this plot
             unit_info = self.document[x_uuid][INFO.UNIT_CONVERSION]
-            data_polygon = unit_info[1](data_polygon)
             title = self.document[x_uuid][INFO.DISPLAY_NAME]
 
             # get point probe value
@@ -572,13 +662,36 @@ class ProbeGraphDisplay (object) :
             else:
                 x_point = None
 
-            # plot a histogram
-            yield {TASK_DOING: 'Probe Plot: Creating histogram plot', TASK_PROGRESS: 0.25}
-            self.plotHistogram(data_polygon, title, x_point)
+            # plot a histogram from an overview of the region first, then refine it at full resolution
+            ranges = None
+            for stride, first, last in self._region_passes(self.workspace.polygon_stride(x_uuid, polygon)):
+                hist = StreamingHistogram(self.DEFAULT_NUM_BINS, ranges=ranges)
+                stats = SummaryStatistics()
+                last_draw = time.monotonic()
+                for _, data, done in self.workspace.iter_content_polygon(x_uuid, polygon, stride=stride):
+                    if generation is not None and generation != self._generation:
+                        LOG.debug("abandoning superseded plot for {}".format(self.myName))
+                        return
+                    data = unit_info[1](data)
+                    hist.add(data)
+                    stats.add(data)
+                    if stride == 1 and time.monotonic() - last_draw > self.REFINE_REDRAW_INTERVAL:
+                        self._render(self.plotHistogramCounts, hist.counts, hist.edges[0], title, x_point,
+                                     stats=stats, preview=True)
+                        self.manager.drawChildGraph.emit(self.myName)
+                        last_draw = time.monotonic()
+                    yield {TASK_DOING: 'Probe Plot: Collecting polygon data...', TASK_PROGRESS: first + (last - first) * done}
+                if hist.ranges is None:
+                    self._render(self.clearPlot)
+                else:
+                    self._render(self.plotHistogramCounts, hist.counts, hist.edges[0], title, x_point,
+                                 stats=stats, preview=stride != 1)
+                    ranges = hist.ranges
+                self.manager.drawChildGraph.emit(self.myName)
 
         # if we are plotting x vs y and have x, y, and a polygon
         elif plot_versus and x_uuid is not None and y_uuid is not None and polygon is not None :
-            yield {TASK_DOING: 'Probe Plot: Collecting polygon data (layer 1)...', TASK_PROGRESS: 0.0}
+            yield {TASK_DOING: 'Probe Plot: Collecting polygon data...', TASK_PROGRESS: 0.0}
 
             # get the data and info we need for this plot
             x_info = self.document[x_uuid]
@@ -586,26 +699,11 @@ class ProbeGraphDisplay (object) :
             name1 = x_info[INFO.DISPLAY_NAME]
             name2 = y_info[INFO.DISPLAY_NAME]
             hires_uuid = self.workspace.lowest_resolution_uuid(x_uuid, y_uuid)
-            # hires_coord_mask are the lat/lon coordinates of each of the
-            # pixels in hires_data. The coordinates are (lat, lon) to resemble
-            # the (Y, X) indexing of numpy arrays
-            hires_coord_mask, hires_data = self.workspace.get_coordinate_mask_polygon(hires_uuid, polygon)
+            other_uuid = y_uuid if hires_uuid == x_uuid else x_uuid
             hires_conv_func = self.document[hires_uuid][INFO.UNIT_CONVERSION][1]
+            other_conv_func = self.document[other_uuid][INFO.UNIT_CONVERSION][1]
             x_conv_func = x_info[INFO.UNIT_CONVERSION][1]
             y_conv_func = y_info[INFO.UNIT_CONVERSION][1]
-            hires_data = hires_conv_func(hires_data)
-            yield {TASK_DOING: 'Probe Plot: Collecting polygon data (layer 2)...', TASK_PROGRESS: 0.15}
-            if hires_uuid == x_uuid:
-                # the hires data was from the X UUID
-                data1 = hires_data
-                data2 = self.workspace.get_content_coordinate_mask(y_uuid, hires_coord_mask)
-                data2 = y_conv_func(data2)
-            else:
-                # the hires data was from the Y UUID
-                data2 = hires_data
-                data1 = self.workspace.get_content_coordinate_mask(x_uuid, hires_coord_mask)
-                data1 = x_conv_func(data1)
-            yield {TASK_DOING: 'Probe Plot: Creating scatter plot...', TASK_PROGRESS: 0.25}
 
             if point_xy:
                 x_point = self.workspace.get_content_point(x_uuid, point_xy)
@@ -616,30 +714,124 @@ class ProbeGraphDisplay (object) :
                 x_point = None
                 y_point = None
 
-            # plot a scatter plot
-            good_mask = ~(np.isnan(data1) | np.isnan(data2))
-            data1 = data1[good_mask]
-            data2 = data2[good_mask]
-            self.plotDensityScatterplot(data1, name1, data2, name2, x_point, y_point)
+            # bin the pairs from an overview of the region first, then refine at full resolution
+            ranges = None
+            for stride, first, last in self._region_passes(self.workspace.polygon_stride(hires_uuid, polygon)):
+                hist = StreamingHistogram(self.DEFAULT_NUM_BINS, ndim=2, ranges=ranges)
+                last_draw = time.monotonic()
+                # hires_coord_mask are the lat/lon coordinates of each of the
+                # pixels in hires_data. The coordinates are (lat, lon) to resemble
+                # the (Y, X) indexing of numpy arrays
+                for hires_coord_mask, hires_data, done in self.workspace.iter_coordinate_mask_polygon(
+                        hires_uuid, polygon, stride=stride):
+                    if generation is not None and generation != self._generation:
+                        LOG.debug("abandoning superseded plot for {}".format(self.myName))
+                        return
+                    hires_data = hires_conv_func(hires_data)
+                    other_data = other_conv_func(self.workspace.get_content_coordinate_mask(other_uuid, hires_coord_mask))
+                    if hires_uuid == x_uuid:
+                        hist.add(hires_data, other_data)
+                    else:
+                        hist.add(other_data, hires_data)
+                    if stride == 1 and time.monotonic() - last_draw > self.REFINE_REDRAW_INTERVAL:
+                        self._render(self.plotDensityHistogram, hist.counts, hist.edges, name1, name2, x_point, y_point,
+                                     preview=True)
+                        self.manager.drawChildGraph.emit(self.myName)
+                        last_draw = time.monotonic()
+                    yield {TASK_DOING: 'Probe Plot: Collecting polygon data...', TASK_PROGRESS: first + (last - first) * done}
+                if hist.ranges is None:
+                    self._render(self.clearPlot)
+                else:
+                    self._render(self.plotDensityHistogram, hist.counts, hist.edges, name1, name2, x_point, y_point,
+                                 preview=stride != 1)
+                    ranges = hist.ranges
+                self.manager.drawChildGraph.emit(self.myName)
 
         # if we have some combination of selections we don't understand, clear the figure
         else :
             yield {TASK_DOING: 'Probe Plot: Clearing plot figure...', TASK_PROGRESS: 0.0}
-            self.clearPlot()
+            self._render(self.clearPlot)
 
         yield {TASK_DOING: 'Probe Plot: Drawing plot...', TASK_PROGRESS: 0.95}
         self.manager.drawChildGraph.emit(self.myName)
         yield {TASK_DOING: 'Probe Plot: Done', TASK_PROGRESS: 1.0}
 
-    def draw(self):
-        self.canvas.draw()
+    def _series_plot_task(self, x_uuid, polygon, point_xy, generation=None):
+        """Plot the mean over the polygon, or else the point value, for every frame in the X layer's track.
+        Frames are probed in parallel and the plot is redrawn as their values arrive.
+        """
+        track = self.document.as_track_stack.track_for_product(x_uuid) if x_uuid is not None else None
+        if track is None or (polygon is None and not point_xy):
+            yield {TASK_DOING: 'Probe Plot: Clearing plot figure...', TASK_PROGRESS: 0.0}
+            self._render(self.clearPlot)
+            self.manager.drawChildGraph.emit(self.myName)
+            return
+
+        yield {TASK_DOING: 'Probe Plot: Collecting time series...', TASK_PROGRESS: 0.0}
+        info = self.document[x_uuid]
+        conv_func = info[INFO.UNIT_CONVERSION][1]
+        title = info[INFO.DISPLAY_NAME]
+        what = "region mean" if polygon is not None else "point value"
+        series = {}  # observation time: value
+        last_draw = time.monotonic()
+        probes = self.document.as_track_stack.iter_track_probe(track, xy_pos=None if polygon is not None else point_xy,
+                                                               polygon=polygon)
+        try:
+            for when, uuid, value, done in probes:
+                if generation is not None and generation != self._generation:
+                    LOG.debug("abandoning superseded time series for {}".format(self.myName))
+                    return
+                if value is not None:
+                    series[when] = conv_func(value)
+                if time.monotonic() - last_draw > self.REFINE_REDRAW_INTERVAL:
+                    self._render(self.plotTimeSeries, series, title, what, preview=True)
+                    self.manager.drawChildGraph.emit(self.myName)
+                    last_draw = time.monotonic()
+                yield {TASK_DOING: 'Probe Plot: Collecting time series...', TASK_PROGRESS: done * 0.95}
+        finally:
+            # stop probing frames nobody will see
+            probes.close()
+
+        self._render(self.plotTimeSeries, series, title, what)
+        yield {TASK_DOING: 'Probe Plot: Drawing plot...', TASK_PROGRESS: 0.95}
+        self.manager.drawChildGraph.emit(self.myName)
+        yield {TASK_DOING: 'Probe Plot: Done', TASK_PROGRESS: 1.0}
 
-    def plotHistogram (self, data, title, x_point, numBins=100) :
-        """Make a histogram using the given data and label it with the given title
+    @staticmethod
+    def _region_passes(stride):
+        """(stride, first progress, last progress) for an overview pass, if worthwhile, and the full resolution pass
         """
-        self.figure.clf()
-        axes = self.figure.add_subplot(111)
-        bars = axes.hist(data[~np.isnan(data)], bins=self.DEFAULT_NUM_BINS)
+        if stride > 1:
+            return [(stride, 0.0, 0.1), (1, 0.1, 0.9)]
+        return [(1, 0.0, 0.9)]
+
+    def draw(self):
+        # the plot task already rasterized its figure, hand it to the canvas
+        rendered, self._rendered = self._rendered, None
+        if rendered is not None:
+            self.figure = rendered[0]
+            self.canvas.present(*rendered)
+
+    def _render(self, plot, *args, **kwargs):
+        """Build a plot on a figure of its own and rasterize it with a non-GUI canvas, off the GUI thread
+        draw() passes the result to the widget once drawChildGraph reaches the GUI thread
+        """
+        width, height = self.canvas.render_size
+        dpi = self.figure.dpi
+        figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        agg = FigureCanvasAgg(figure)
+        plot(figure, *args, **kwargs)
+        agg.draw()
+        width, height = agg.get_width_height()
+        rgba = np.frombuffer(agg.buffer_rgba(), dtype=np.uint8).reshape(height, width, 4)
+        self._rendered = (figure, rgba[..., [2, 1, 0, 3]].tobytes(), (width, height))
+
+    def plotHistogramCounts (self, figure, counts, edges, title, x_point, stats=None, preview=False) :
+        """Draw an already binned histogram and label it with the given title and summary statistics
+        """
+        figure.clf()
+        axes = figure.add_subplot(111)
+        bars = axes.hist(edges[:-1], bins=edges, weights=counts)
         if x_point is not None:
             # go through each rectangle object and make the one that contains x_point 'red'
             # default color is blue so red should stand out
@@ -647,7 +839,22 @@ class ProbeGraphDisplay (object) :
                 if bar.xy[0] <= x_point:
                     bar.set_color('red')
                     break
-        axes.set_title(title)
+        axes.set_title(title + (" (preview)" if preview else ""))
+        if stats is not None and stats.count:
+            axes.set_xlabel("N={:d} mean={:.4g} std={:.4g} min={:.4g} max={:.4g}".format(
+                stats.count, stats.mean, stats.std, stats.minimum, stats.maximum))
+
+    def plotTimeSeries (self, figure, series, title, what, preview=False) :
+        """Plot a dictionary of {time: value} as a line in time order
+        """
+        figure.clf()
+        axes = figure.add_subplot(111)
+        if series:
+            times = sorted(series.keys())
+            axes.plot(times, [series[t] for t in times], marker='.', color='b')
+            figure.autofmt_xdate()
+        axes.set_ylabel(what)
+        axes.set_title(title + (" (preview)" if preview else ""))
 
     def plotScatterplot (self, dataX, nameX, dataY, nameY) :
         """Make a scatter plot of the x and y data
@@ -670,25 +877,16 @@ class ProbeGraphDisplay (object) :
             axes.set_title(nameX + " vs " + nameY)
             self._draw_xy_line(axes)
 
-    def plotDensityScatterplot (self, dataX, nameX, dataY, nameY, pointX, pointY) :
-        """Make a density scatter plot for the given data
+    def plotDensityHistogram (self, figure, density_map, edges, nameX, nameY, pointX, pointY, preview=False) :
+        """Draw an already binned density scatter plot, indexed [x, y] like numpy.histogram2d
         """
 
         # clear the figure and make a new subplot
-        self.figure.clf()
-        axes = self.figure.add_subplot(111)
-
-        # figure out the range of the data
-        # you might not be comparing the same units
-        xmin_value = np.min(dataX)
-        xmax_value = np.max(dataX)
-        ymin_value = np.min(dataY)
-        ymax_value = np.max(dataY)
-        # bounds should be defined in the form [[xmin, xmax], [ymin, ymax]]
-        bounds = [[xmin_value, xmax_value], [ymin_value, ymax_value]]
-
-        # make the binned density map for this data set
-        density_map, _, _ = np.histogram2d(dataX, dataY, bins=self.DEFAULT_NUM_BINS, range=bounds)
+        figure.clf()
+        axes = figure.add_subplot(111)
+        xmin_value, xmax_value = edges[0][0], edges[0][-1]
+        ymin_value, ymax_value = edges[1][0], edges[1][-1]
+
         # mask out zero counts; flip because y goes the opposite direction in an imshow graph
         density_map = np.flipud(np.transpose(np.ma.masked_array(density_map, mask=density_map == 0)))
 
@@ -702,22 +900,22 @@ class ProbeGraphDisplay (object) :
                       markersize=10, markeredgewidth=1.)
             axes.set_autoscale_on(True)
 
-        colorbar = self.figure.colorbar(img)
+        colorbar = figure.colorbar(img)
         colorbar.set_label('log(count of data points)')
 
         # set the various text labels
         axes.set_xlabel(nameX)
         axes.set_ylabel(nameY)
-        axes.set_title(nameX + " vs " + nameY)
+        axes.set_title(nameX + " vs " + nameY + (" (preview)" if preview else ""))
 
         # draw the x vs y line
         self._draw_xy_line(axes)
 
-    def clearPlot(self):
-        """Clear our plot
+    def clearPlot(self, figure=None):
+        """Clear our plot, or a figure being built for it
         """
 
-        self.figure.clf()
+        (figure or self.figure).clf()
 
     def _draw_xy_line (self, axes) :
 
@@ -31,7 +31,8 @@ from vispy.visuals.transforms import STTransform, MatrixTransform, ChainTransfor
 from vispy.visuals import MarkersVisual, marker_types, LineVisual
 from vispy.scene.visuals import Markers, Polygon, Compound, Line
 from vispy.geometry import Rect
-from sift.common import DEFAULT_ANIMATION_DELAY, INFO, KIND, TOOL, prez
+from sift.common import (DEFAULT_ANIMATION_DELAY, DEFAULT_ANIMATION_PREFETCH, ANIMATION_PACING,
+                         INFO, KIND, TOOL, prez, box, vue)
 from sift.view.LayerRep import (NEShapefileLines, TiledGeolocatedImage,
                                 RGBCompositeLayer, PrecomputedIsocurve)
 from sift.view.MapWidget import SIFTMainMapCanvas
@@ -39,23 +40,27 @@ from sift.view.Cameras import PanZoomProbeCamera
 from sift.model.document import DocLayerStack, DocBasicLayer
 from sift.queue import TASK_DOING, TASK_PROGRESS
 from sift.view.ProbeGraphs import DEFAULT_POINT_PROBE
-from sift.view.transform import PROJ4Transform
+from sift.view.transform import shared_proj4_transform
 from sift.util import get_package_data_dir
 
 from PyQt4.QtCore import QObject, pyqtSignal, Qt
 from PyQt4.QtGui import QCursor, QPixmap
 import numpy as np
 from uuid import UUID
+from functools import partial
 
 import os
 import sys
+import time
 import logging
+from collections import deque
 
 LOG = logging.getLogger(__name__)
 DATA_DIR = get_package_data_dir()
 DEFAULT_SHAPE_FILE = os.path.join(DATA_DIR, 'ne_50m_admin_0_countries', 'ne_50m_admin_0_countries.shp')
 DEFAULT_STATES_SHAPE_FILE = os.path.join(DATA_DIR, 'ne_50m_admin_1_states_provinces_lakes', 'ne_50m_admin_1_states_provinces_lakes.shp')
 DEFAULT_TEXTURE_SHAPE = (4, 16)
+FLIPBOOK_BYTES = 512 * 1024 * 1024  # GPU memory for prerendered animation frames; frames beyond it are drawn live
 
 
 class Markers2(Markers):
@@ -174,6 +179,11 @@ class LayerSet(object):
         self._frame_change_cb = frame_change_cb
         self._animation_speed = DEFAULT_ANIMATION_DELAY  # milliseconds
         self._animation_timer = app.Timer(self._animation_speed/1000.0, connect=self.next_frame)
+        self._pacing = ANIMATION_PACING.FIXED
+        self._prefetch_depth = DEFAULT_ANIMATION_PREFETCH
+        self._readiness = {}  # {layer_uuid: bool}, layers not listed are ready
+        self._frame_times = deque(maxlen=32)  # wall-clock times frames were shown while animating
+        self._clock_start = None  # (time, frame_number) wall-clock pacing is measured from
 
         if layers is not None:
             self.set_layers(layers)
@@ -207,12 +217,94 @@ class LayerSet(object):
         self._animation_timer.stop()
         self._animation_speed = milliseconds
         self._animation_timer.interval = milliseconds/1000.0
+        self._reset_clock()
         if self._frame_order:
             self._animating = True
             self._animation_timer.start()
         if self._frame_change_cb is not None and self._frame_order:
             uuid = self._frame_order[self._frame_number]
-            self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid))
+            self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid, self.achieved_fps))
+
+    @property
+    def pacing(self):
+        """ANIMATION_PACING mode used when the next frame is not ready
+        """
+        return self._pacing
+
+    @pacing.setter
+    def pacing(self, mode):
+        self._pacing = ANIMATION_PACING(mode)
+        self._reset_clock()
+
+    @property
+    def prefetch_depth(self):
+        """number of frames after the current one to retile in the background while animating
+        """
+        return self._prefetch_depth
+
+    @prefetch_depth.setter
+    def prefetch_depth(self, frames):
+        self._prefetch_depth = max(0, int(frames))
+
+    @property
+    def achieved_fps(self):
+        """frames per second actually shown over the recent animation history, None if not enough history
+        """
+        if len(self._frame_times) < 2:
+            return None
+        elapsed = self._frame_times[-1] - self._frame_times[0]
+        if elapsed <= 0.:
+            return None
+        return (len(self._frame_times) - 1) / elapsed
+
+    def set_frame_ready(self, uuid, ready=True):
+        """Record whether a layer's tiles for the current view are resident.
+        """
+        if ready:
+            self._readiness.pop(uuid, None)
+        else:
+            self._readiness[uuid] = False
+
+    def is_frame_ready(self, uuid):
+        return self._readiness.get(uuid, True)
+
+    @property
+    def readiness(self):
+        """
+        :return: list of readiness flags in animation order
+        """
+        return [self.is_frame_ready(uuid) for uuid in self._frame_order]
+
+    def _reset_clock(self):
+        self._frame_times.clear()
+        self._clock_start = None
+
+    def _upcoming_frames(self, frame_number):
+        lfo = len(self._frame_order)
+        depth = min(self._prefetch_depth, lfo - 1)
+        return [self._frame_order[(frame_number + dex) % lfo] for dex in range(1, depth + 1)]
+
+    def _paced_frame(self, now):
+        """
+        decide which frame the animation timer should show next according to the pacing mode
+        :return: frame number to show, or None to stay on the current frame
+        """
+        lfo = len(self._frame_order)
+        if self._pacing == ANIMATION_PACING.HOLD:
+            frame = (self._frame_number + 1) % lfo
+        elif self._pacing == ANIMATION_PACING.DROP:
+            if self._clock_start is None:
+                self._clock_start = (now, self._frame_number)
+            start_time, start_frame = self._clock_start
+            frame = (start_frame + int((now - start_time) * 1000.0 / self._animation_speed)) % lfo
+            if frame == self._frame_number:
+                return None
+        else:
+            return (self._frame_number + 1) % lfo
+        if not self.is_frame_ready(self._frame_order[frame]):
+            # hold: wait for it; drop: the clock moves on without it
+            return None
+        return frame
 
     def set_layers(self, layers):
         # FIXME clear the existing layers
@@ -289,11 +381,12 @@ class LayerSet(object):
         elif not self._animating and animate and self._frame_order:
             # We are not currently, but want to be
             self._animating = True
+            self._reset_clock()
             self._animation_timer.start()
             # TODO: Add a proper AnimationEvent to self.events
         if self._frame_change_cb is not None and self._frame_order:
             uuid = self._frame_order[self._frame_number]
-            self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid))
+            self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid, self.achieved_fps))
 
     def toggle_animation(self, *args):
         self.animating = not self._animating
@@ -327,24 +420,38 @@ class LayerSet(object):
         :return:
         """
         lfo = len(self._frame_order)
+        now = time.time()
         frame = self._frame_number
         if frame_number is None:
-            frame = self._frame_number + 1
+            if event is not None and lfo > 0 and self._animating:
+                # timer tick: let the pacing mode decide whether and where to go
+                frame = self._paced_frame(now)
+                if frame is None:
+                    self.parent.prefetch_frames(self._upcoming_frames(self._frame_number))
+                    return
+            else:
+                frame = self._frame_number + 1
         elif isinstance(frame_number, int):
             if frame_number==-1:
                 frame = self._frame_number + (lfo - 1)
             else:
                 frame = frame_number
+            # a jump restarts wall-clock pacing from the new frame
+            self._reset_clock()
         if lfo>0:
             frame %= lfo
         else:
             frame = 0
         self._set_visible_child(frame)
         self._frame_number = frame
+        if self._animating:
+            self._frame_times.append(now)
+        if lfo > 1:
+            self.parent.prefetch_frames(self._upcoming_frames(frame))
         self.parent.update()
         if self._frame_change_cb is not None and lfo:
             uuid = self._frame_order[self._frame_number]
-            self._frame_change_cb((self._frame_number, lfo, self._animating, uuid))
+            self._frame_change_cb((self._frame_number, lfo, self._animating, uuid, self.achieved_fps))
 
 
 class ContourGroupNode(scene.Node):
@@ -425,6 +532,187 @@ class ContourGroupNode(scene.Node):
         return zoom_level
 
 
+class ViewPrefetcher(object):
+    """
+    Extrapolate pan/zoom motion of the view and warm the page cache for the tiles a layer is about to need.
+    View boxes are sampled while the camera moves; center and zoom velocity are projected forward by `lookahead`
+    and the tiles of the predicted view are read from the workspace content on the background worker,
+    so that the retile following the idle scheduler finds its memory-mapped data already resident.
+    A prefetch is abandoned as soon as the motion changes direction.
+    """
+    sample_interval = 0.1  # seconds between view samples
+    lookahead = 0.5  # seconds of motion to extrapolate
+    history_length = 4  # number of view samples used to estimate velocity
+    deadband = 0.02  # fraction of the view size per second below which an axis is considered still
+    max_warmed = 4096  # forget which tiles have been warmed after this many
+
+    workspace = None  # where we get data arrays from
+    queue = None  # prefetch jobs go to the background worker here
+
+    _history = None  # {layer_uuid: deque of (time, vue)}
+    _direction = None  # {layer_uuid: (sign_y, sign_x, sign_zoom)} of the last scheduled prefetch
+    _generation = None  # {layer_uuid: int}, bumping it cancels the outstanding prefetch
+    _scheduled = None  # {layer_uuid: (stride, tile_box)} of the last scheduled prefetch
+    _warmed = None  # {layer_uuid: set((stride, tiy, tix))} tiles already read
+    _last_sample = 0.
+
+    def __init__(self, workspace, queue):
+        self.workspace = workspace
+        self.queue = queue
+        self._history = {}
+        self._direction = {}
+        self._generation = {}
+        self._scheduled = {}
+        self._warmed = {}
+        self._last_sample = 0.
+
+    def wants_sample(self, when=None):
+        """
+        :return: True if enough time has passed since the previous sample to take another
+        """
+        when = time.time() if when is None else when
+        if when - self._last_sample < self.sample_interval:
+            return False
+        self._last_sample = when
+        return True
+
+    def forget(self, uuid):
+        """Cancel any prefetch for a layer and drop its motion history, e.g. when the layer is removed.
+        """
+        self.cancel(uuid)
+        self._history.pop(uuid, None)
+        self._direction.pop(uuid, None)
+        self._scheduled.pop(uuid, None)
+        self._warmed.pop(uuid, None)
+
+    def cancel(self, uuid):
+        """Abandon the outstanding prefetch for a layer; the task notices at its next tile.
+        """
+        self._generation[uuid] = self._generation.get(uuid, 0) + 1
+        self._scheduled.pop(uuid, None)
+
+    def reset(self):
+        """Motion stopped: the retile will take over, so abandon all outstanding prefetches.
+        """
+        for uuid in list(self._history.keys()):
+            self.cancel(uuid)
+            self._direction.pop(uuid, None)
+        self._history.clear()
+
+    def _velocity(self, history):
+        """
+        :param history: sequence of (time, vue) samples, oldest first
+        :return: (vy, vx, vzoom) in world units per second and log-scale per second, or None if not enough history
+        """
+        if len(history) < 2:
+            return None
+        t0, v0 = history[0]
+        t1, v1 = history[-1]
+        dt = t1 - t0
+        if dt <= 0. or v0.dx <= 0. or v1.dx <= 0.:
+            return None
+        vy = ((v1.t + v1.b) - (v0.t + v0.b)) / 2. / dt
+        vx = ((v1.l + v1.r) - (v0.l + v0.r)) / 2. / dt
+        vz = np.log(v1.dx / v0.dx) / dt
+        return vy, vx, vz
+
+    def _direction_of(self, view_box, velocity):
+        vy, vx, vz = velocity
+        height = abs(view_box.t - view_box.b) or 1.
+        width = abs(view_box.r - view_box.l) or 1.
+
+        def _sign(v, size):
+            return 0 if abs(v) < self.deadband * size else int(np.sign(v))
+        return _sign(vy, height), _sign(vx, width), _sign(vz, 1.)
+
+    def predict(self, view_box, velocity):
+        """Extrapolate a view box `lookahead` seconds ahead given its velocity.
+        """
+        vy, vx, vz = velocity
+        scale = np.exp(vz * self.lookahead)
+        cy = (view_box.t + view_box.b) / 2. + vy * self.lookahead
+        cx = (view_box.l + view_box.r) / 2. + vx * self.lookahead
+        hh = (view_box.t - view_box.b) / 2. * scale
+        hw = (view_box.r - view_box.l) / 2. * scale
+        return vue(b=cy - hh, l=cx - hw, t=cy + hh, r=cx + hw,
+                   dy=view_box.dy * scale, dx=view_box.dx * scale)
+
+    def sample(self, uuid, element, view_box, sources, when=None):
+        """Record a view box for a layer and, if it is moving, schedule a prefetch of the tiles it is heading for.
+
+        :param uuid: layer UUID
+        :param element: tiled image element, used for its tile calculator and currently shown tiles
+        :param view_box: vue of the current view in the element's projection
+        :param sources: sequence of (content_uuid, factor) to read, factor being the channel resolution factor
+        :param when: sample time, defaults to now
+        """
+        when = time.time() if when is None else when
+        history = self._history.setdefault(uuid, deque(maxlen=self.history_length))
+        history.append((when, view_box))
+        velocity = self._velocity(history)
+        if velocity is None:
+            return
+        direction = self._direction_of(view_box, velocity)
+        if direction != self._direction.get(uuid):
+            # turned around or started/stopped along an axis: what we were fetching is no longer useful
+            self.cancel(uuid)
+            self._direction[uuid] = direction
+        if not any(direction):
+            return
+
+        predicted = self.predict(view_box, velocity)
+        try:
+            stride = element.calc.calc_stride(predicted)
+            tile_box = element.calc.visible_tiles(predicted, stride=stride, extra_tiles_box=box(1, 1, 1, 1))
+        except (ValueError, ZeroDivisionError):
+            return
+        if self._scheduled.get(uuid) == (stride, tile_box):
+            return
+
+        warmed = self._warmed.setdefault(uuid, set())
+        if len(warmed) > self.max_warmed:
+            warmed.clear()
+        shown = element._latest_tile_box if element._stride == stride else None
+        tiles = []
+        for tiy in range(tile_box.t, tile_box.b):
+            for tix in range(tile_box.l, tile_box.r):
+                if (stride, tiy, tix) in warmed:
+                    continue
+                if shown is not None and shown.t <= tiy < shown.b and shown.l <= tix < shown.r:
+                    continue
+                tiles.append((tiy, tix))
+        if not tiles:
+            return
+
+        self._scheduled[uuid] = (stride, tile_box)
+        generation = self._generation.setdefault(uuid, 0)
+        LOG.debug("Prefetching %d tiles at stride %r for layer %s", len(tiles), stride, uuid)
+        self.queue.add(str(uuid) + "_prefetch",
+                       self._bgnd_prefetch(uuid, element.calc, stride, tiles, sources, generation, warmed),
+                       'Prefetch tiles for image layer ' + str(uuid), interactive=False)
+
+    def _bgnd_prefetch(self, uuid, calc, stride, tiles, sources, generation, warmed):
+        """Read the requested tiles from each content array so that their pages are resident when the retile asks.
+        """
+        yield {TASK_DOING: 'Prefetching', TASK_PROGRESS: 0.0}
+        arrays = []
+        for content_uuid, factor in sources:
+            data = self.workspace.get_content(content_uuid, lod=stride)
+            if data is not None:
+                arrays.append(data[::int(stride[0] / factor), ::int(stride[1] / factor)])
+        for idx, (tiy, tix) in enumerate(tiles):
+            if self._generation.get(uuid, 0) != generation:
+                LOG.debug("Prefetch for layer %s cancelled after %d of %d tiles", uuid, idx, len(tiles))
+                break
+            y_slice, x_slice = calc.calc_tile_slice(tiy, tix, stride)
+            for data in arrays:
+                # touching the data is enough to page it in; keep no copy
+                np.add.reduce(data[y_slice, x_slice], axis=None)
+            warmed.add((stride, tiy, tix))
+            yield {TASK_DOING: 'Prefetching', TASK_PROGRESS: float(idx + 1) / len(tiles)}
+        self.workspace.bgnd_task_complete()
+
+
 class SceneGraphManager(QObject):
     """
     SceneGraphManager represents a document as a vispy scenegraph.
@@ -449,9 +737,14 @@ class SceneGraphManager(QObject):
     datasets = None
     colormaps = None
     layer_set = None
+    prefetcher = None  # ViewPrefetcher warming tiles ahead of pan/zoom motion
 
     _current_tool = None
     _color_choices = None
+    _pending_retiles = None  # {layer_uuid: number of its latest retile}, for layers with a retile queued or running
+    _retiles_started = 0  # numbers retiles, so completions of superseded ones can be told apart
+    _flipbook = False  # opt-in: play animations back from prerendered frames
+    _flipbook_frames = None  # {frame_layer_uuid: gloo.Texture2D} rendered for the current view, least recently shown first
 
     # FIXME: many more undocumented member variables
 
@@ -479,7 +772,10 @@ class SceneGraphManager(QObject):
 
         self.image_elements = {}
         self.composite_element_dependencies = {}
+        self._pending_retiles = {}
+        self._flipbook_frames = {}
         self.layer_set = LayerSet(self, frame_change_cb=self.frame_changed)
+        self.prefetcher = ViewPrefetcher(self.workspace, self.queue)
         self._current_tool = None
 
         self._connect_doc_signals(self.document)
@@ -520,11 +816,12 @@ class SceneGraphManager(QObject):
         """
         callback which emits information on current animation frame as a signal
         (see LayerSet.next_frame)
-        :param frame_info: tuple to be relayed in the signal, typically (frame_index:int, total_frames:int, animating:bool, frame_id:UUID)
+        :param frame_info: tuple to be relayed in the signal, typically (frame_index:int, total_frames:int, animating:bool, frame_id:UUID, achieved_fps:float-or-None)
         """
         # LOG.debug('emitting didChangeFrame')
         self.didChangeFrame.emit(frame_info)
         is_animating = frame_info[2]
+        self._show_flipbook_frame(frame_info[3] if is_animating else None)
         if not is_animating:
             # emit a signal equivalent to document's didChangeLayerVisibility,
             # except that visibility is being changed by animation interactions
@@ -537,6 +834,62 @@ class SceneGraphManager(QObject):
             vis = dict((u,tfu(u)) for u in uuids)
             self.didChangeLayerVisibility.emit(vis)
 
+    @property
+    def flipbook(self):
+        """whether animation frames are rendered offscreen once and played back as textures
+        """
+        return self._flipbook
+
+    @flipbook.setter
+    def flipbook(self, enabled):
+        self._flipbook = bool(enabled)
+        self.invalidate_flipbook()
+        if not self._flipbook:
+            self.main_canvas.show_flipbook_frame(None)
+
+    def invalidate_flipbook(self, *args, uuid=None, **kwargs):
+        """Forget prerendered animation frames, all of them or only the one for `uuid`.
+        Accepts and ignores signal arguments so it can be connected directly to change signals.
+        """
+        if not self._flipbook_frames:
+            return
+        if uuid is None:
+            self._flipbook_frames.clear()
+            self.main_canvas.show_flipbook_frame(None)
+        elif self._flipbook_frames.pop(uuid, None) is not None:
+            if uuid == self.layer_set.top_layer_uuid():
+                self.main_canvas.show_flipbook_frame(None)
+
+    def _show_flipbook_frame(self, uuid):
+        """Present the prerendered frame for an animation layer, rendering it first if its tiles are resident.
+        Frames that are still retiling are drawn live and captured on a later loop.
+        """
+        if not self._flipbook or uuid is None:
+            self.main_canvas.show_flipbook_frame(None)
+            return
+        texture = self._flipbook_frames.pop(uuid, None)
+        if texture is None and self.layer_set.is_frame_ready(uuid) and self._make_flipbook_room():
+            self.main_canvas.show_flipbook_frame(None)
+            texture = self.main_canvas.render_to_texture()
+        if texture is not None:
+            self._flipbook_frames[uuid] = texture
+        self.main_canvas.show_flipbook_frame(texture)
+
+    def _make_flipbook_room(self):
+        """Evict the least recently shown frames that are no longer in the animation until one more fits FLIPBOOK_BYTES.
+        Frames of the current loop are kept, so once they fill the budget the rest of the loop is drawn live
+        rather than evicting frames that are about to be shown again.
+        :return: whether another frame can be rendered into the flipbook
+        """
+        width, height = self.main_canvas.physical_size
+        capacity = FLIPBOOK_BYTES // max(1, width * height * 4)
+        looping = set(self.layer_set.frame_order)
+        for uuid in [u for u in self._flipbook_frames if u not in looping]:
+            if len(self._flipbook_frames) < capacity:
+                break
+            del self._flipbook_frames[uuid]
+        return len(self._flipbook_frames) < capacity
+
     def setup_initial_canvas(self, center=None):
         self.main_canvas = SIFTMainMapCanvas(parent=self.parent())
         self.main_view = self.main_canvas.central_widget.add_view()
@@ -563,7 +916,7 @@ class SceneGraphManager(QObject):
         # Head node of the map graph
         proj_info = self.document.projection_info()
         self.main_map = MainMap(name="MainMap", parent=self.main_map_parent)
-        self.main_map.transform = PROJ4Transform(proj_info['proj4_str'])
+        self.main_map.transform = shared_proj4_transform(proj_info['proj4_str'])
         self.proxy_nodes = {}
 
         self._borders_color_idx = 0
@@ -586,6 +939,11 @@ class SceneGraphManager(QObject):
         ll_xy = self.borders.transforms.get_transform(map_to="scene").map([(center[0] - width, center[1] - height)])[0][:2]
         ur_xy = self.borders.transforms.get_transform(map_to="scene").map([(center[0] + width, center[1] + height)])[0][:2]
         self.main_view.camera.rect = Rect(ll_xy, (ur_xy[0] - ll_xy[0], ur_xy[1] - ll_xy[1]))
+        # sample the view while it moves so tiles can be prefetched ahead of the retile
+        self.main_view.scene.transform.changed.connect(self.on_view_sample)
+        # prerendered animation frames only hold for the view and canvas size they were rendered at
+        self.main_view.scene.transform.changed.connect(self.invalidate_flipbook)
+        self.main_canvas.events.resize.connect(self.invalidate_flipbook)
 
     def create_test_image(self):
         proj4_str = os.getenv("SIFT_DEBUG_IMAGE_PROJ", None)
@@ -619,12 +977,12 @@ class SceneGraphManager(QObject):
             parent=self.main_map,
             projection=proj4_str,
         )
-        image.transform = PROJ4Transform(proj4_str, inverse=True)
+        image.transform = shared_proj4_transform(proj4_str, inverse=True)
         image.transform *= STTransform(translate=(0, 0, -50.0))
         self._test_img = image
 
     def set_projection(self, projection_name, proj_info, center=None):
-        self.main_map.transform = PROJ4Transform(proj_info['proj4_str'])
+        self.main_map.transform = shared_proj4_transform(proj_info['proj4_str'])
         center = center or proj_info["default_center"]
         width = proj_info["default_width"] / 2.
         height = proj_info["default_height"] / 2.
@@ -730,6 +1088,24 @@ class SceneGraphManager(QObject):
     def has_pending_polygon(self):
         return len(self.pending_polygon.points) != 0
 
+    def overview_point(self, uuid, row, col):
+        """Value of a layer's in-memory overview image near a native content cell.
+
+        :param uuid: layer UUID
+        :param row: native content row
+        :param col: native content column
+        :return: the overview value, or None if the layer has no resident overview or the cell is outside it
+        """
+        element = self.image_elements.get(uuid)
+        nfo = getattr(element, 'overview_info', None)
+        if not nfo or 'stride' not in nfo:
+            return None
+        data = nfo['data']
+        r, c = row // nfo['stride'][0], col // nfo['stride'][1]
+        if not ((0 <= r < data.shape[0]) and (0 <= c < data.shape[1])):
+            return None
+        return data[r, c]
+
     def on_point_probe_set(self, probe_name, state, xy_pos, **kwargs):
         z = float(kwargs.get("z", 60))
         edge_color = kwargs.get("edge_color", np.array([1.0, 0.5, 0.5, 1.]))
@@ -759,6 +1135,7 @@ class SceneGraphManager(QObject):
 
         # set the Point visible or not
         point_visual.visible = state
+        self.invalidate_flipbook()
 
     def on_new_polygon(self, probe_name, points, **kwargs):
         kwargs.setdefault("color", (1.0, 0.0, 1.0, 0.5))
@@ -770,6 +1147,7 @@ class SceneGraphManager(QObject):
         if probe_name in self.polygon_probes :
             self.polygon_probes[probe_name].parent = None
         self.polygon_probes[probe_name] = poly
+        self.invalidate_flipbook()
 
     def copy_polygon(self, old_name, new_name):
         self.on_new_polygon(new_name, self.polygon_probes[old_name].pos)
@@ -792,6 +1170,7 @@ class SceneGraphManager(QObject):
             self.borders.visible = True
             self.conus_states.set_data(color=self._color_choices[self._borders_color_idx])
             self.conus_states.visible = True
+        self.invalidate_flipbook()
 
     def cycle_grid_color(self):
         self._latlon_grid_color_idx = (self._latlon_grid_color_idx + 1) % len(self._color_choices)
@@ -800,6 +1179,7 @@ class SceneGraphManager(QObject):
         else:
             self.latlon_grid.set_data(color=self._color_choices[self._latlon_grid_color_idx])
             self.latlon_grid.visible = True
+        self.invalidate_flipbook()
 
     def change_tool(self, name):
         prev_tool = self._current_tool
@@ -913,7 +1293,7 @@ class SceneGraphManager(QObject):
         parent = self.proxy_nodes.get(proj4_str)
         if parent is None:
             parent = ContourGroupNode(parent=self.main_map)
-            parent.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
+            parent.transform = shared_proj4_transform(layer[INFO.PROJ], inverse=True)
             self.proxy_nodes[proj4_str] = parent
 
         contour_visual = PrecomputedIsocurve(verts, connects, level_indexes,
@@ -927,19 +1307,30 @@ class SceneGraphManager(QObject):
         self.on_view_change(None)
 
     def add_basic_layer(self, new_order:tuple, uuid:UUID, p:prez):
+        if self._add_basic_layer(uuid, p):
+            self.on_view_change(None)
+
+    def add_basic_layers(self, new_order:tuple, uuids:list, prezs:list):
+        """build nodes for many new layers, updating the view once rather than after each"""
+        added = [self._add_basic_layer(uuid, p) for uuid, p in zip(uuids, prezs)]
+        if any(added):
+            self.on_view_change(None)
+
+    def _add_basic_layer(self, uuid:UUID, p:prez):
+        """create scene graph node for a layer; returns True if an image node was added"""
         layer = self.document[uuid]
         # create a new layer in the imagelist
         if not layer.is_valid:
             LOG.warning('unable to add an invalid layer, will try again later when layer changes')
-            return
+            return False
         if layer[INFO.UUID] in self.image_elements:
             image = self.image_elements[layer[INFO.UUID]]
             if p.kind == KIND.CONTOUR and isinstance(image, PrecomputedIsocurve):
                 LOG.warning("Contour layer already exists in scene")
-                return
+                return False
             if p.kind == KIND.IMAGE and isinstance(image, TiledGeolocatedImage):
                 LOG.warning("Image layer already exists in scene")
-                return
+                return False
             # we already have an image layer for it and it isn't what we want
             # remove the existing image object and create the proper type now
             image.parent = None
@@ -947,7 +1338,8 @@ class SceneGraphManager(QObject):
 
         overview_content = self.workspace.get_content(layer.uuid, kind=p.kind)
         if p.kind == KIND.CONTOUR:
-            return self.add_contour_layer(layer, p, overview_content)
+            self.add_contour_layer(layer, p, overview_content)
+            return False
 
         image = TiledGeolocatedImage(
             overview_content,
@@ -967,12 +1359,12 @@ class SceneGraphManager(QObject):
             parent=self.main_map,
             projection=layer[INFO.PROJ],
         )
-        image.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
+        image.transform = shared_proj4_transform(layer[INFO.PROJ], inverse=True)
         image.transform *= STTransform(translate=(0, 0, -50.0))
         self.image_elements[uuid] = image
         self.layer_set.add_layer(image)
         image.determine_reference_points()
-        self.on_view_change(None)
+        return True
 
     def add_composite_layer(self, new_order:tuple, uuid:UUID, p:prez):
         layer = self.document[uuid]
@@ -1003,7 +1395,7 @@ class SceneGraphManager(QObject):
                 parent=self.main_map,
                 projection=layer[INFO.PROJ],
             )
-            element.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
+            element.transform = shared_proj4_transform(layer[INFO.PROJ], inverse=True)
             element.transform *= STTransform(translate=(0, 0, -50.0))
             self.composite_element_dependencies[uuid] = dep_uuids
             self.layer_set.add_layer(element)
@@ -1089,6 +1481,9 @@ class SceneGraphManager(QObject):
             image_layer = self.image_elements[uuid_removed]
             image_layer.parent = None
             del self.image_elements[uuid_removed]
+            self.prefetcher.forget(uuid_removed)
+            self._pending_retiles.pop(uuid_removed, None)
+            self.layer_set.set_frame_ready(uuid_removed, True)
             LOG.info("layer {} purge from scenegraphmanager".format(uuid_removed))
         else:
             LOG.debug("Layer {} already purged from Scene Graph".format(uuid_removed))
@@ -1110,6 +1505,7 @@ class SceneGraphManager(QObject):
     def _connect_doc_signals(self, document):
         document.didReorderLayers.connect(self._rebuild_layer_order)  # current layer set changed z/anim order
         document.didAddBasicLayer.connect(self.add_basic_layer)  # layer added to one or more layer sets
+        document.didAddBasicLayers.connect(self.add_basic_layers)  # several layers added at once
         document.didAddCompositeLayer.connect(self.add_composite_layer)  # layer derived from other layers (either basic or composite themselves)
         document.didRemoveLayers.connect(self._remove_layer)  # layer removed from current layer set
         document.willPurgeLayer.connect(self._purge_layer)  # layer removed from document
@@ -1122,6 +1518,14 @@ class SceneGraphManager(QObject):
         document.didChangeColorLimits.connect(self.change_layers_color_limits)
         document.didChangeGamma.connect(self.change_layers_gamma)
         document.didChangeImageKind.connect(self.change_layers_image_kind)
+        # any change to layers or their presentation makes prerendered animation frames stale
+        for signal in (document.didReorderLayers, document.didAddBasicLayer, document.didAddBasicLayers,
+                       document.didAddCompositeLayer,
+                       document.didRemoveLayers, document.willPurgeLayer, document.didSwitchLayerSet,
+                       document.didChangeColormap, document.didChangeLayerVisibility, document.didReorderAnimation,
+                       document.didChangeComposition, document.didChangeCompositions, document.didChangeColorLimits,
+                       document.didChangeGamma, document.didChangeImageKind):
+            signal.connect(self.invalidate_flipbook)
 
     def set_frame_number(self, frame_number=None):
         self.layer_set.next_frame(None, frame_number)
@@ -1220,6 +1624,10 @@ class SceneGraphManager(QObject):
         # Stop the timer so it doesn't continuously call this slot
         if scheduler:
             scheduler.stop()
+        # motion has settled, the retile takes over from any prediction and we go back to full resolution
+        self.prefetcher.reset()
+        self.main_canvas.end_interaction()
+
         def _assess(uuid, child):
             need_retile, preferred_stride, tile_box = child.assess()
             if need_retile:
@@ -1242,11 +1650,80 @@ class SceneGraphManager(QObject):
         for uuid in current_invisible_layers:
             _assess_if_active(uuid)
 
-    def start_retiling_task(self, uuid, preferred_stride, tile_box):
+    def on_view_sample(self, event=None):
+        """Feed the current view of each visible image layer to the prefetcher while the camera is moving.
+        Also puts the canvas in reduced-resolution interactive drawing until on_view_change sees the view settle.
+        """
+        self.main_canvas.begin_interaction()
+        if not self.prefetcher.wants_sample():
+            return
+        for p, l in self.document.active_layer_order:
+            if not p.visible:
+                continue
+            element = self.image_elements.get(p.uuid, None)
+            if element is None or not hasattr(element, 'get_view_box'):
+                continue
+            try:
+                view_box = element.get_view_box()
+            except ValueError:
+                continue
+            if p.uuid in self.composite_element_dependencies:
+                sources = [(d_uuid, factor) for factor, d_uuid in
+                           zip(element._channel_factors, self.composite_element_dependencies[p.uuid])
+                           if d_uuid is not None]
+            else:
+                sources = [(p.uuid, 1)]
+            self.prefetcher.sample(p.uuid, element, view_box, sources)
+
+    def visible_content_slices(self, uuid):
+        """Rows and columns of a layer's content that are in the current view, e.g. for auto-contrast.
+        :return: (row slice, column slice), or (None, None) when the layer isn't a tiled image in view
+        """
+        element = self.image_elements.get(uuid, None)
+        if element is None or not hasattr(element, 'get_view_box'):
+            return None, None
+        try:
+            view_box = element.get_view_box()
+        except ValueError:
+            return None, None
+        return self.workspace.get_content_slices(uuid, view_box.l, view_box.b, view_box.r, view_box.t)
+
+    def prefetch_frames(self, uuids):
+        """Retile upcoming animation frames in the background so they are resident when shown.
+        Frames with a retile already in flight are left alone.
+        """
+        for uuid in uuids:
+            if uuid in self._pending_retiles:
+                continue
+            element = self.image_elements.get(uuid, None)
+            if element is None or not hasattr(element, 'assess'):
+                continue
+            need_retile, preferred_stride, tile_box = element.assess()
+            if need_retile:
+                self.start_retiling_task(uuid, preferred_stride, tile_box, interactive=False)
+
+    def start_retiling_task(self, uuid, preferred_stride, tile_box, interactive=True):
         LOG.debug("Scheduling retile for child with UUID: %s", uuid)
-        self.queue.add(str(uuid) + "_retile", self._retile_child(uuid, preferred_stride, tile_box), 'Retile calculations for image layer ' + str(uuid), interactive=True)
+        self._retiles_started += 1
+        retile = self._pending_retiles[uuid] = self._retiles_started
+        self.layer_set.set_frame_ready(uuid, False)
+        # each retile gets its own task key, since the queue runs completion callbacks by key
+        self.queue.add("{}_retile_{}".format(uuid, retile), self._retile_child(uuid, retile, preferred_stride, tile_box),
+                       'Retile calculations for image layer ' + str(uuid), interactive=interactive,
+                       and_then=partial(self._retile_finished, uuid, retile))
+
+    def _retile_finished(self, uuid, retile, succeeded):
+        """A retile for a layer is done (or failed); unless a later one has been started since, stop waiting on it.
+        """
+        if self._pending_retiles.get(uuid) != retile:
+            return
+        del self._pending_retiles[uuid]
+        self.layer_set.set_frame_ready(uuid, True)
 
-    def _retile_child(self, uuid, preferred_stride, tile_box):
+    def _retile_child(self, uuid, retile, preferred_stride, tile_box):
+        if self._pending_retiles.get(uuid) != retile:
+            LOG.debug("Skipping superseded retile of child with UUID: '%s'", uuid)
+            return
         LOG.debug("Retiling child with UUID: '%s'", uuid)
         yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.0}
         if uuid not in self.composite_element_dependencies:
@@ -1277,6 +1754,7 @@ class SceneGraphManager(QObject):
             LOG.warning('unable to find uuid %s in image_elements' % uuid)
             return
         child.set_retiled(preferred_stride, tile_box, tiles_info, vertices, tex_coords)
+        self.invalidate_flipbook(uuid=uuid)
         child.update()
 
     def on_layer_visible_toggle(self, visible):
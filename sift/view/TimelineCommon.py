@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 from enum import Enum
 import pickle as pkl
 from typing import Tuple, Optional, NamedTuple, Any
+from uuid import UUID
 
 from PyQt4.QtCore import QObject, QRectF, QByteArray, QPointF
 from PyQt4.QtGui import QGraphicsSceneDragDropEvent
@@ -30,6 +31,12 @@ class GraphicsConfig(object):
     frame_corner_radius: float = 6.0
     frame_title_pos: QPointF = QPointF(2.0, -13.0)
     frame_subtitle_pos: QPointF = QPointF(2.0, 2.0)
+    frame_min_width: float = 3.0  # screen pixels per frame below which a track's frames are drawn as density bars
+    density_bin_width: float = 4.0  # screen pixels per density bar
+    realize_margin: float = 0.5  # fraction of the visible width either side of the view for which frame items are made
+    frame_pool_size: int = 256  # idle frame items kept for reuse
+    thumb_height: float = 40.0  # scene pixels; a frame shows a thumbnail once it is twice this wide
+    thumb_cache_size: int = 512  # thumbnails retained by the scene
 
 
 # graphics constants in setting up items and painting
@@ -48,6 +55,16 @@ class mimed_colormap(NamedTuple):
     colormap: Any
 
 
+class frametup(NamedTuple):
+    """What a track holds for each of its frames, whether or not a QFrameItem is showing it at the moment"""
+    uuid: UUID
+    t: datetime  # start
+    d: timedelta  # duration
+    state: set  # VisualState flags
+    title: str
+    subtitle: str = None
+
+
 class ztdtup(NamedTuple):
     z: int
     t: datetime
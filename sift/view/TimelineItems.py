@@ -63,8 +63,10 @@ https://stackoverflow.com/questions/4216139/python-object-in-qmimedata
 :copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
 :license: GPLv3, see LICENSE for more details
 """
+from bisect import bisect_left, insort
+from math import floor
 from uuid import UUID
-from typing import Mapping, Any
+from typing import Mapping, Any, Iterable, List, Optional
 from weakref import ref
 from PyQt4.QtCore import Qt
 from PyQt4.QtGui import *
@@ -107,7 +109,14 @@ class QTrackItem(QGraphicsObject):
     """ A group of Frames corresponding to a timeline
     This allows drag and drop of timelines to be easier
     """
-    frames = None  # Iterable[QFrameItem], maintained privately between track and frame
+    frames = None  # Mapping[UUID, QFrameItem] realized in the visible window, maintained privately between track and scene
+    _frame_data: Mapping[UUID, frametup] = None  # every frame in the track, whether realized as a QFrameItem or not
+    _frame_order: List[Tuple[datetime, UUID]] = None  # sorted (start, uuid) of all frames
+    _ready_order: List[Tuple[datetime, UUID]] = None  # sorted (start, uuid) of frames which are READY
+    _longest: timedelta = timedelta(0)  # longest frame duration, for finding frames overlapping a window
+    _extent: Tuple[Optional[datetime], Optional[timedelta]] = (None, None)  # start and duration of all frames
+    _density: List[Tuple[float, float, int, bool]] = None  # (x, width, count, any_ready) bars when too dense for frames
+    _window: Tuple[datetime, datetime, float] = None  # start, end and pixels-per-second last realized
     _scene = None  # weakref to scene
     _scale: CoordTransform = None
     _track: str = None  # tracks are family::category, e.g. IMAGE:geo:toa_reflectance:11µm::GOESR-PUG:GOES-16:ABI:CONUS
@@ -136,7 +145,10 @@ class QTrackItem(QGraphicsObject):
         """Create a track and connect it to its Scene
         """
         super(QTrackItem, self).__init__()
-        self.frames = []
+        self.frames = {}
+        self._frame_data = {}
+        self._frame_order = []
+        self._ready_order = []
         self._scene = ref(scene) if scene else None
         self._scale = scale
         self._track = track
@@ -156,10 +168,6 @@ class QTrackItem(QGraphicsObject):
         scene.add_track(self)
         self.setAcceptDrops(True)
 
-    def addFrame(self, frame):
-        self._scene().add_frame(frame)
-        self.frames.append(frame)
-
     # @property
     # def scene(self):
     #     return self._scene()
@@ -229,6 +237,16 @@ class QTrackItem(QGraphicsObject):
         # draw outer boundary
         painter.drawRoundedRect(rect, GFXC.track_corner_radius1, GFXC.track_corner_radius2, Qt.RelativeSize)
 
+        # at coarse zoom, frames are summarized as bars whose height shows how many frames start there
+        if self._density:
+            _, frame_brush = self.default_frame_pen_brush
+            ready_brush = QBrush(Qt.green, Qt.SolidPattern)
+            most = max(count for (_, _, count, _) in self._density)
+            painter.setPen(Qt.NoPen)
+            for x, w, count, ready in self._density:
+                h = GFXC.frame_height * (0.25 + 0.75 * count / most)
+                painter.setBrush(ready_brush if ready else frame_brush)
+                painter.drawRect(QRectF(x, -h / 2, w, h))
 
     def boundingRect(self) -> QRectF:
     #     if self._bounds is None:
@@ -280,31 +298,153 @@ class QTrackItem(QGraphicsObject):
         content = pkl.loads(event.mimeData().data())
         event.setAccepted(False)
 
-    # working with Frames as sub-items, updating and syncing position and extents
+    # working with Frames, of which only those in the visible window are realized as QFrameItem sub-items
+
+    @property
+    def frame_uuids(self) -> Iterable[UUID]:
+        return self._frame_data.keys()
+
+    def frame(self, uuid: UUID) -> Optional[frametup]:
+        return self._frame_data.get(uuid)
+
+    def set_frames(self, frames: Iterable[frametup]):
+        """Replace the frames held by the track
+        QFrameItems are only made for frames in the window the scene has realized
+        """
+        scene = self._scene()
+        data = dict((frm.uuid, frm) for frm in frames)
+        removed = set(self._frame_data.keys()) - set(data.keys())
+        added = set(data.keys()) - set(self._frame_data.keys())
+        self.unrealize()
+        self._frame_data = data
+        self._reindex()
+        scene.update_frame_index(self, removed, added)
+        self.update_pos_bounds()
+        scene.realize_track(self)
+
+    def update_frame(self, frm: frametup):
+        """Add or revise a single frame, re-realizing the track only if its time extent changed
+        """
+        scene = self._scene()
+        old = self._frame_data.get(frm.uuid)
+        self._frame_data[frm.uuid] = frm
+        if old is None or (old.t, old.d) != (frm.t, frm.d):
+            if old is None:
+                scene.update_frame_index(self, (), (frm.uuid,))
+            self.unrealize()
+            self._reindex()
+            self.update_pos_bounds()
+            scene.realize_track(self)
+            return
+        if old.state != frm.state:
+            was_ready, is_ready = VisualState.READY in old.state, VisualState.READY in frm.state
+            if was_ready and not is_ready:
+                del self._ready_order[bisect_left(self._ready_order, (frm.t, frm.uuid))]
+            elif is_ready and not was_ready:
+                insort(self._ready_order, (frm.t, frm.uuid))
+            scene.forget_thumbnail(frm.uuid)
+        item = self.frames.get(frm.uuid)
+        if item is not None:
+            item.bind(self, frm)
+        elif self._density is not None and self._window is not None:
+            self._density = self._calc_density(*self._window)
+            self.update()
+
+    def set_frame_state(self, uuid: UUID, state: flags) -> bool:
+        frm = self._frame_data.get(uuid)
+        if frm is None:
+            return False
+        self.update_frame(frm._replace(state=flags(state)))
+        return True
+
+    def _reindex(self):
+        frames = self._frame_data.values()
+        self._frame_order = sorted((frm.t, frm.uuid) for frm in frames)
+        self._ready_order = sorted((frm.t, frm.uuid) for frm in frames if VisualState.READY in frm.state)
+        self._longest = max((frm.d for frm in frames), default=timedelta(0))
+        if not self._frame_order:
+            self._extent = (None, None)
+            return
+        s = self._frame_order[0][0]
+        e = max(frm.t + frm.d for frm in frames)
+        self._extent = (s, e - s)
+
+    def frames_between(self, s: datetime, e: datetime) -> List[UUID]:
+        """frames which may overlap the time window s..e, in time order
+        """
+        lo = bisect_left(self._frame_order, (s - self._longest,))
+        hi = bisect_left(self._frame_order, (e,))
+        return [uuid for (_, uuid) in self._frame_order[lo:hi]]
 
-    def _iter_frame_children(self):
-        return list(self.frames)
-        # children = tuple(self.childItems())
-        # # LOG.debug("{} children".format(len(children)))
-        # for child in children:
-        #     if isinstance(child, QFrameItem):
-        #         yield child
+    def realize(self, s: datetime, e: datetime, pixels_per_second: float):
+        """Show the frames overlapping the time window s..e at the given zoom
+        when frames would be narrower than GFXC.frame_min_width on screen, draw density bars instead of frame items
+        """
+        scene = self._scene()
+        uuids = self.frames_between(s, e)
+        window_px = (e - s).total_seconds() * pixels_per_second
+        self._window = (s, e, pixels_per_second)
+        if uuids and len(uuids) * GFXC.frame_min_width > window_px:
+            for item in list(self.frames.values()):
+                scene.release_frame_item(item)
+            self.frames = {}
+            self._density = self._calc_density(s, e, pixels_per_second)
+        else:
+            self._density = None
+            wanted = set(uuids)
+            for uuid in list(self.frames.keys()):
+                if uuid not in wanted:
+                    scene.release_frame_item(self.frames.pop(uuid))
+            fresh = [scene.acquire_frame_item(self, self._frame_data[uuid]) for uuid in uuids if uuid not in self.frames]
+            for item in fresh:
+                self.frames[item.uuid] = item
+            self.update_frame_positions(*fresh)
+        self.update()
+
+    def unrealize(self):
+        """Return all frame items to the scene's pool and drop any density bars
+        """
+        scene = self._scene()
+        for item in self.frames.values():
+            scene.release_frame_item(item)
+        self.frames = {}
+        self._density = None
+        self._window = None
+        self.update()
+
+    def _calc_density(self, s: datetime, e: datetime, pixels_per_second: float) -> List[Tuple[float, float, int, bool]]:
+        """Count frames starting in each GFXC.density_bin_width-wide bin across the window
+        bins are aligned to the start of the track so they don't shimmer as the view scrolls
+        """
+        t0 = self._extent[0]
+        if t0 is None:
+            return []
+        step = timedelta(seconds=GFXC.density_bin_width / pixels_per_second)
+        first = max(0, int(floor((s - self._longest - t0) / step)))
+        myx = self.pos().x()
+        bars = []
+        b0 = t0 + step * first
+        lo = bisect_left(self._frame_order, (b0,))
+        rlo = bisect_left(self._ready_order, (b0,))
+        while b0 < e and lo < len(self._frame_order):
+            b1 = b0 + step
+            hi = bisect_left(self._frame_order, (b1,), lo)
+            rhi = bisect_left(self._ready_order, (b1,), rlo)
+            if hi > lo:
+                x, w = self._scale.calc_pixel_x_pos(b0, step)
+                bars.append((x - myx, w, hi - lo, rhi > rlo))
+            elif hi < len(self._frame_order):
+                # skip ahead over empty bins to the bin holding the next frame
+                b1 = t0 + step * int(floor((self._frame_order[hi][0] - t0) / step))
+            b0, lo, rlo = b1, hi, rhi
+        return bars
 
     def _time_extent_of_frames(self):
         """start time and duration of the frames held by the track
         """
-        s, e = None, None
-        for child in self._iter_frame_children():
-            # y relative to track is 0
-            # calculate absolute x position in scene
-            # assert (child.uuid != self.uuid)
-            t,d = child.td
-            s = t if (s is None) else min(t, s)
-            e = (t + d) if (e is None) else max(e, t + d)
-        if e is None:
+        if self._extent[0] is None:
             LOG.info("empty track cannot determine its horizontal extent")
-            return None, None
-        return s, e - s
+        return self._extent
 
     def update_pos_bounds(self):
         """Update position and bounds of the Track to reflect current TimelineCoordTransform, encapsulating frames owned
@@ -336,7 +476,7 @@ class QTrackItem(QGraphicsObject):
         """Update frames' origins relative to self after TimelineCoordTransform has changed scale
         """
         myx = self.pos().x()  # my x coordinate relative to scene
-        frames = tuple(frames) or self._iter_frame_children()
+        frames = tuple(frames) or tuple(self.frames.values())
         for frame in frames:
             # y relative to track is 0
             # calculate absolute x position in scene
@@ -350,6 +490,8 @@ class QFrameItem(QGraphicsObject):
     For SIFT use, this corresponds to a single Product or single composite of multiple Products (e.g. RGB composite)
     QGraphicsView representation of a data frame, with a start and end time relative to the scene.
     Essentially a frame sprite
+    Frame items are only made for frames in the visible window; the scene keeps a pool of them,
+    rebinding them to whichever frame scrolls into view
     """
     _state: flags = None
     _track = None  # weakref to track we belong to
@@ -359,73 +501,70 @@ class QFrameItem(QGraphicsObject):
     _duration: timedelta = None
     _title: str = None
     _subtitle: str = None
-    _thumb: QPixmap = None
+    _thumb: QPixmap = None  # fetched from the scene on first paint wide enough to show it
     _metadata: Mapping = None
     _bounds: QRectF = QRectF()
     # decorations
     _gi_title = None
     _gi_subtitle = None
 
-    def __init__(self, track: QTrackItem, scale: CoordTransform, uuid: UUID,
-                 start: datetime, duration: timedelta, state: flags,
-                 title: str, subtitle: str = None, thumb: QPixmap = None,
-                 metadata: Mapping[str, Any] = None):
-        """create a frame representation and add it to a timeline track within a scene
+    def __init__(self, scale: CoordTransform):
+        """create an unbound frame representation, typically by the scene to fill its pool
         Args:
-            track: which timeline to add it to
-            state: initial state
-            start: frame start time
-            duration: frame duration
-            title: title of frame
-            subtitle: subtitle (below title, optional)
-            thumb: thumbnail image (via pillow), optional, may not be displayed if space is not available
-            uuid: UUID of workspace representation
+            scale: coordinate transform shared with the scene
         """
         super(QFrameItem, self).__init__()
-        self._track = ref(track)
-        self._state = flags(state)
         self._scale = scale
-        self._start = start
-        self._duration = duration
-        self._title = title
-        self._subtitle = subtitle
-        self._thumb = thumb
-        self._metadata = metadata
-        self._uuid = uuid
-        self.setToolTip("{}\n{}".format(title, subtitle))
-        # self._pen, self._brush = track.default_frame_pen_brush
-        # if pen:
-        #     LOG.debug('setting pen')
-        #     self.setPen(pen)
-        # if brush:
-        #     LOG.debug('setting brush')
-        #     self.setBrush(brush)
-        track.addFrame(self)  # adds to track, which in turn adds to scene
-        self.setParentItem(track)
-        self.update_bounds()
-        track.update_pos_bounds()
-        track.update_frame_positions()
+        self._state = flags()
+        self._gi_title = QGraphicsSimpleTextItem(self)
+        self._gi_title.setPos(GFXC.frame_title_pos)
+        self._gi_subtitle = QGraphicsSimpleTextItem(self)
+        self._gi_subtitle.setPos(GFXC.frame_subtitle_pos)
         self.setFlag(QGraphicsItem.ItemClipsChildrenToShape, enabled=True)
-        self._update_decorations()
         # self.setAcceptDrops(True)
 
-    def _update_decorations(self):
-        """Add decor sub-items to self
-        title, subtitle, icon, colormap
-        these are placed left of the local origin inside the _left_pad area
+    def bind(self, track: QTrackItem, frm: frametup, metadata: Mapping[str, Any] = None):
+        """show a frame of a timeline track
+        Args:
+            track: which timeline it belongs to, becomes our parent item
+            frm: uuid, start, duration, state, title and subtitle of the frame
+            metadata: optional key-value store for the frame
         """
-        scene = self.scene_
-        if self._title:
-            self._gi_title = it = self._gi_title or scene.addSimpleText(self._title)
-            it.setParentItem(self)
-            it.setPos(GFXC.frame_title_pos)
-        if self._subtitle:
-            self._gi_subtitle = it = self._gi_subtitle or scene.addSimpleText(self._subtitle)
-            it.setParentItem(self)
-            it.setPos(GFXC.frame_subtitle_pos)
-        # FUTURE: add draggable color-map pixmap
+        if self._uuid != frm.uuid or self._state != frm.state:
+            self._thumb = None
+        self._track = ref(track)
+        self._uuid = frm.uuid
+        self._state = flags(frm.state)
+        self._start = frm.t
+        self._duration = frm.d
+        self._metadata = metadata
+        if (self._title, self._subtitle) != (frm.title, frm.subtitle):
+            self._title = frm.title
+            self._subtitle = frm.subtitle
+            self._update_decorations()
+        if self.parentItem() is not track:
+            self.setParentItem(track)
+        self.update_bounds()
+        self.show()
+        self.update()
 
+    def release(self):
+        """forget the frame we were showing, before being returned to the pool"""
+        self.hide()
+        self._track = None
+        self._uuid = None
+        self._thumb = None
+        self._metadata = None
 
+    def _update_decorations(self):
+        """Revise decor sub-items
+        title, subtitle
+        """
+        self._gi_title.setText(self._title or '')
+        self._gi_title.setVisible(bool(self._title))
+        self._gi_subtitle.setText(self._subtitle or '')
+        self._gi_subtitle.setVisible(bool(self._subtitle))
+        self.setToolTip("{}\n{}".format(self._title, self._subtitle))
 
     @property
     def scene_(self):
@@ -485,6 +624,25 @@ class QFrameItem(QGraphicsObject):
         painter.setRenderHint(QPainter.Antialiasing)
         painter.drawRoundedRect(rect, GFXC.frame_corner_radius, GFXC.frame_corner_radius, Qt.RelativeSize)
         # super(QFrameItem, self).paint(painter, option, widget)
+        if rect.width() >= 2 * GFXC.thumb_height:
+            self._paint_thumbnail(painter, rect)
+
+    def _paint_thumbnail(self, painter: QPainter, rect: QRectF):
+        """draw the frame's thumbnail at its right end, or a placeholder while the scene is still fetching it"""
+        h = min(GFXC.thumb_height, rect.height() - 4)
+        if self._thumb is None:
+            scene = self.scene_
+            self._thumb = scene.frame_thumbnail(self._uuid)
+            if self._thumb is None:
+                if scene.thumbnail_pending(self._uuid):
+                    painter.setPen(QPen(Qt.gray, 1.0, Qt.DashLine))
+                    painter.setBrush(Qt.NoBrush)
+                    painter.drawRect(QRectF(rect.right() - h - 4, -h / 2, h, h))
+                return
+        pm = self._thumb
+        w = h * pm.width() / max(1, pm.height())
+        target = QRectF(rect.right() - w - 4, -h / 2, w, h)
+        painter.drawPixmap(target, pm, QRectF(pm.rect()))
 
     def boundingRect(self) -> QRectF:
         """return relative bounding rectangle, given position is set by Track parent as needed
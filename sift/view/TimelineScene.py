@@ -19,13 +19,13 @@ from typing import Tuple, Optional, Mapping, List, Callable, Set, Iterable, Sequ
 from abc import ABC, abstractmethod, abstractproperty
 from uuid import UUID
 
-from PyQt4.QtCore import QRectF, Qt, pyqtSignal
+from PyQt4.QtCore import QRectF, Qt, pyqtSignal, QTimer
 from PyQt4.QtGui import QGraphicsScene, QPen, QBrush, QPainter, QGraphicsView, QMenu, QGraphicsTextItem, QFont, \
-    QMainWindow, QStatusBar, QApplication, QGraphicsItem, QGraphicsItemAnimation
+    QMainWindow, QStatusBar, QApplication, QGraphicsItem, QGraphicsItemAnimation, QImage, QPixmap
 from PyQt4.QtOpenGL import QGLFormat, QGL, QGLWidget
 
 from sift.common import flags, span
-from sift.view.TimelineCommon import VisualState, CoordTransform
+from sift.view.TimelineCommon import VisualState, CoordTransform, GFXC, frametup
 from sift.view.TimelineItems import QTrackItem, QFrameItem, QTimeRulerItem
 
 LOG = logging.getLogger(__name__)
@@ -58,9 +58,19 @@ class QFramesInTracksScene(QGraphicsScene):
 
     # content representing document / workspace / scenegraph
     _track_items: Mapping[str, QTrackItem] = None  # retain QTrackItem objects lest they disappear; also bookkeeping
-    _frame_items: Mapping[UUID, QFrameItem] = None  # likewise for QFrameItems
+    _frame_items: Mapping[UUID, QFrameItem] = None  # likewise for QFrameItems, only those realized in the visible window
+    _frame_tracks: Mapping[UUID, QTrackItem] = None  # track holding each frame, realized or not
+    _frame_pool: List[QFrameItem] = None  # idle QFrameItems, out of the scene, ready to be bound to a frame
+    _thumbs: Mapping[UUID, Optional[QPixmap]] = None  # frame thumbnails, including those found not to be available
+    _thumbs_pending: Mapping[UUID, int] = None  # thumbnails requested and not yet arrived, by request number
+    _thumb_requests: int = 0
     _decor_items: Mapping[Any, QGraphicsItem] = None  # decoration items
 
+    # visible window: (scene rect, view scale) last drawn, and that for which frame items were realized
+    _exposed: Tuple[QRectF, float] = None
+    _realized: Tuple[QRectF, float] = None
+    _realize_pending: bool = False
+
     # styling settings
     _track_pen_brush = None, None
     _frame_pen_brush = None, None
@@ -72,6 +82,10 @@ class QFramesInTracksScene(QGraphicsScene):
         self._coords = CoordTransform()
         self._track_items = {}
         self._frame_items = {}
+        self._frame_tracks = {}
+        self._frame_pool = []
+        self._thumbs = {}
+        self._thumbs_pending = {}
         pen = QPen()
         pen.setWidthF(1.25)
         pen.setColor(Qt.black)
@@ -97,7 +111,11 @@ class QFramesInTracksScene(QGraphicsScene):
         super(QFramesInTracksScene, self).update()
         self._track_items = {}
         self._frame_items = {}
+        self._frame_tracks = {}
+        self._thumbs = {}
+        self._thumbs_pending = {}
         self._decor_items = {}
+        self._realized = None
 
     @property
     def coords(self) -> CoordTransform:
@@ -113,13 +131,127 @@ class QFramesInTracksScene(QGraphicsScene):
         self.addItem(track)
         self._verify_z_contiguity()
 
-    def add_frame(self, frame:QFrameItem):
-        """Called by QTrackItem at QFrameItem's constructor-time
+    def update_frame_index(self, track: QTrackItem, removed: Iterable[UUID], added: Iterable[UUID]):
+        """Called by QTrackItem as frames come and go, whether or not they're realized as QFrameItems
+        """
+        for uuid in removed:
+            if self._frame_tracks.get(uuid) is track:
+                del self._frame_tracks[uuid]
+            self._thumbs.pop(uuid, None)
+            self._thumbs_pending.pop(uuid, None)
+        for uuid in added:
+            self._frame_tracks[uuid] = track
+
+    def track_for_frame(self, uuid: UUID) -> Optional[QTrackItem]:
+        return self._frame_tracks.get(uuid)
+
+    def acquire_frame_item(self, track: QTrackItem, frm: frametup) -> QFrameItem:
+        """Called by QTrackItem to realize a frame in the visible window, reusing a pooled QFrameItem if there is one
         We need to maintain references to Q*Items, Qt will not do it for us
         """
-        if frame.uuid in self._frame_items:
-            LOG.error("frame {} was already present in scene".format(frame.uuid))
-        self._frame_items[frame.uuid] = frame
+        item = self._frame_pool.pop() if self._frame_pool else QFrameItem(self._coords)
+        item.bind(track, frm)
+        if frm.uuid in self._frame_items:
+            LOG.error("frame {} was already present in scene".format(frm.uuid))
+        self._frame_items[frm.uuid] = item
+        return item
+
+    def release_frame_item(self, item: QFrameItem):
+        """Called by QTrackItem when a frame leaves the visible window; keep the item for reuse if the pool has room
+        """
+        if self._frame_items.get(item.uuid) is item:
+            del self._frame_items[item.uuid]
+            # a thumbnail still on its way is no longer wanted; it's requested again if the frame comes back into view
+            self._thumbs_pending.pop(item.uuid, None)
+        item.release()
+        self.removeItem(item)
+        if len(self._frame_pool) < GFXC.frame_pool_size:
+            self._frame_pool.append(item)
+
+    #
+    # virtualization: frame items exist only for the visible window plus a margin
+    #
+
+    def _note_exposed(self, rect: QRectF, scale: float):
+        """Record the area being drawn, and if it's outside what was realized or the zoom changed, realize it soon
+        """
+        if scale <= 0.0 or rect.isEmpty():
+            return
+        self._exposed = (QRectF(rect), scale)
+        if self._realized is not None:
+            realized_rect, realized_scale = self._realized
+            if realized_rect.contains(rect) and 0.8 < scale / realized_scale < 1.25:
+                return
+        if not self._realize_pending:
+            self._realize_pending = True
+            QTimer.singleShot(0, self._realize_exposed)
+
+    def _realize_exposed(self):
+        self._realize_pending = False
+        if self._exposed is None:
+            return
+        rect, scale = self._exposed
+        mx, my = rect.width() * GFXC.realize_margin, rect.height() * GFXC.realize_margin
+        self._realized = (rect.adjusted(-mx, -my, mx, my), scale)
+        for track in tuple(self._track_items.values()):
+            self.realize_track(track)
+
+    def realize_track(self, track: QTrackItem):
+        """Make frame items or density bars for the part of a track in the realized window, and drop the rest
+        """
+        if self._realized is None:  # not drawn yet; the first paint will realize tracks
+            return
+        rect, scale = self._realized
+        if not track.sceneBoundingRect().intersects(rect):
+            track.unrealize()
+            return
+        s, d = self._coords.calc_time_duration(rect.left(), rect.width())
+        pixels_per_second = scale * self._coords.calc_pixel_duration(timedelta(seconds=1))
+        track.realize(s, s + d, pixels_per_second)
+
+    #
+    # thumbnails
+    #
+
+    def frame_thumbnail(self, uuid: UUID) -> Optional[QPixmap]:
+        """Called by QFrameItem when it's wide enough to show a thumbnail; cached, including misses
+        the first call requests the thumbnail and returns None until it arrives, see thumbnail_pending
+        """
+        if uuid in self._thumbs:
+            return self._thumbs[uuid]
+        if uuid not in self._thumbs_pending:
+            self._thumb_requests += 1
+            self._thumbs_pending[uuid] = self._thumb_requests
+            self.request_thumbnail(uuid, self._thumb_requests)
+        return self._thumbs.get(uuid)
+
+    def thumbnail_pending(self, uuid: UUID) -> bool:
+        """whether a frame's thumbnail has been requested and not yet arrived, in which case items draw a placeholder
+        """
+        return uuid in self._thumbs_pending
+
+    def thumbnail_arrived(self, uuid: UUID, request: int, img: Optional[QImage]):
+        """Called on the UI thread with the image for a request made by frame_thumbnail
+        the image becomes a pixmap here, since pixmaps only belong to the UI thread, and the frame is redrawn
+        """
+        if self._thumbs_pending.get(uuid) != request:  # forgotten or re-requested since
+            return
+        del self._thumbs_pending[uuid]
+        pm = None
+        if img is not None and not img.isNull():
+            pm = QPixmap.fromImage(img).scaledToHeight(int(GFXC.thumb_height), Qt.SmoothTransformation)
+        if len(self._thumbs) >= GFXC.thumb_cache_size:
+            self._thumbs.pop(next(iter(self._thumbs)))
+        self._thumbs[uuid] = pm
+        item = self._frame_items.get(uuid)
+        if item is not None and item.uuid == uuid:
+            item.update()
+
+    def forget_thumbnail(self, uuid: UUID):
+        """Content for a frame has changed, e.g. it's now cached; fetch its thumbnail again next time it's drawn
+        """
+        self._thumbs.pop(uuid, None)
+        self._thumbs_pending.pop(uuid, None)
 
     #
     # drawing and arranging QGraphicsItems
@@ -149,6 +281,8 @@ class QFramesInTracksScene(QGraphicsScene):
 
     def drawBackground(self, painter: QPainter, invalidated_region: QRectF):
         super(QFramesInTracksScene, self).drawBackground(painter, invalidated_region)
+        # FUTURE: with more than one view, realize the union of their visible areas
+        self._note_exposed(invalidated_region, painter.worldTransform().m11())
 
     def _update_rulers_to_extents(self, tick_interval: timedelta=None):
         """Revise ruler size and internal tick items and labels to match scene extents"""
@@ -171,15 +305,27 @@ class QFramesInTracksScene(QGraphicsScene):
         """
         raise NotImplementedError("NYI")  # FIXME
 
-    def visible_time_range(self, view: QGraphicsView = None):
-        """return visible time range for the view in question
+    def visible_time_range(self, view: QGraphicsView = None) -> Tuple[Optional[datetime], Optional[timedelta]]:
+        """return visible time range for the view in question, as start time and duration
         """
-        raise NotImplementedError("NYI")  # FIXME
+        views = [view] if view is not None else self.views()
+        if not views:
+            return None, None
+        gv = views[0]
+        rect = gv.mapToScene(gv.viewport().rect()).boundingRect()
+        return self._coords.calc_time_duration(rect.left(), rect.width())
 
     def center_view_on_frame(self, gv: QGraphicsView, frame_uuid: UUID):
         item = self._frame_items.get(frame_uuid)
         if item is not None:
             gv.centerOn(item)
+            return
+        # not realized, likely off-screen; centering on it will realize it
+        track = self._frame_tracks.get(frame_uuid)
+        frm = track.frame(frame_uuid) if track is not None else None
+        if frm is not None:
+            x, w = self._coords.calc_pixel_x_pos(frm.t, frm.d)
+            gv.centerOn(x + w / 2, track.pos().y())
 
     #
     # internal mid-level update commands
@@ -206,13 +352,19 @@ class QFramesInTracksScene(QGraphicsScene):
     #         if existing is None:
     #             self._frame_items[frame.uuid] = frame
 
-    def _del_track(self, track):
-        raise NotImplementedError("NYI")  # FIXME
+    def _del_track(self, track: QTrackItem):
+        track.unrealize()
+        self.update_frame_index(track, tuple(track.frame_uuids), ())
+        if self._track_items.get(track.track) is track:
+            del self._track_items[track.track]
+        self.removeItem(track)
 
     def _change_frame_state(self, frame: UUID, new_state: flags):
         """Change the displayed state of a frame and queue a visual refresh
         """
-        raise NotImplementedError("NYI")  # FIXME
+        track = self._frame_tracks.get(frame)
+        if track is not None:
+            track.set_frame_state(frame, new_state)
 
     def _change_track_state(self, track: str, new_state: flags):
         """Change the displayed state of a track and queue a visual refresh
@@ -415,6 +567,17 @@ class QFramesInTracksScene(QGraphicsScene):
         """Yield series of track information tuples which will be used to generate/update QTrackItems
         """
 
+    def thumbnail_image(self, uuid: UUID) -> Optional[QImage]:
+        """Provide a small image previewing a frame's content, or None if there's nothing to show
+        """
+        return None
+
+    def request_thumbnail(self, uuid: UUID, request: int):
+        """Start making a frame's thumbnail, handing it to thumbnail_arrived on the UI thread when done
+        by default thumbnail_image is called right away; override to make the image in the background
+        """
+        self.thumbnail_arrived(uuid, request, self.thumbnail_image(uuid))
+
     def get(self, item: [UUID, str]) -> [QTrackItem, QFrameItem, None]:
         if isinstance(item, UUID):
             z = self._frame_items.get(item)
@@ -490,19 +653,19 @@ class TestScene(QFramesInTracksScene):
         track0 = QTrackItem(self, self.coords, 'IMAGE:test::timeline:GOES-21:QBI:mars', 1,
                             "G21 QBI B99 BT", "test track", tooltip="peremptorily cromulent")
         # scene.addItem(abitrack)  # done in init
-        frame01 = QFrameItem(track0, self.coords, uuidgen(), once + mm(5), mm(5),
-                             flags([VisualState.BUSY]), "abi1", "fulldiskimus")
+        frame01 = frametup(uuidgen(), once + mm(5), mm(5), flags([VisualState.BUSY]), "abi1", "fulldiskimus")
+        track0.set_frames([frame01])
         track1 = QTrackItem(self, self.coords, 'IMAGE:test::timeline:Himawari-11:AHI:mars', 0,
                             "H11 AHI B99 Rad", "second test track", tooltip="nominally cromulent")
-        frame11 = QFrameItem(track1, self.coords, uuidgen(), once + mm(6), mm(1),
-                             flags([VisualState.READY]), "ahi1", "JP04")
+        frame11 = frametup(uuidgen(), once + mm(6), mm(1), flags([VisualState.READY]), "ahi1", "JP04")
+        track1.set_frames([frame11])
         # self.insert_track(track0)
         # self.insert_track(track1)
         # assert(hasattr(self, '_propagate_max_z'))
         self.propagate_max_z()
         for track in [track0, track1]:
             track.update_pos_bounds()
-            track.update_frame_positions()
+            self.realize_track(track)
         # scene.addItem(frame1)  # done in init
         # blabla = QGraphicsTextItem('abcdcba')
         # font = QFont('White Rabbit')
@@ -595,11 +758,95 @@ class TestWindow(QMainWindow):
 
 
 class tests(unittest.TestCase):
-    def setUp(self):
-        pass
+    class _AsyncThumbnailScene(QFramesInTracksScene):
+        """holds thumbnail requests for the test to answer, like a background queue would"""
+        def __init__(self):
+            super(tests._AsyncThumbnailScene, self).__init__()
+            self.requests = []
 
-    def test_something(self):
-        pass
+        def request_thumbnail(self, uuid: UUID, request: int):
+            self.requests.append((uuid, request))
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        from uuid import uuid1 as uuidgen
+        self.scene = tests._AsyncThumbnailScene()
+        self.t0 = datetime(2017, 9, 1, 12)
+        # a day of one-minute frames, the first ten of them ready
+        self.frames = [frametup(uuidgen(), self.t0 + timedelta(minutes=m), timedelta(minutes=1),
+                                flags([VisualState.READY] if m < 10 else []), 'frame {}'.format(m))
+                       for m in range(1000)]
+        self.track = QTrackItem(self.scene, self.scene.coords, 'IMAGE:test::CAT:test', 0, 'test track')
+        self.scene.propagate_max_z()
+        self.track.set_frames(self.frames)
+
+    def _realize(self, start_minute: int, minutes: int, scale: float = 1.0):
+        """realize the track for a window of the timeline, as _realize_exposed does for the view"""
+        x, w = self.scene.coords.calc_pixel_x_pos(self.t0 + timedelta(minutes=start_minute), timedelta(minutes=minutes))
+        self.scene._realized = (QRectF(x, -1.0e4, w, 2.0e4), scale)
+        self.scene.realize_track(self.track)
+
+    def _assert_realized(self, first: int, last: int):
+        expected = [frm.uuid for frm in self.frames[first:last]]
+        self.assertEqual(sorted(self.track.frames.keys()), sorted(expected))
+        self.assertEqual(sorted(self.scene._frame_items.keys()), sorted(expected))
+        for uuid, item in self.track.frames.items():
+            self.assertIs(self.scene._frame_items[uuid], item)
+            self.assertEqual(item.uuid, uuid)
+            self.assertEqual(item.td, (self.track.frame(uuid).t, self.track.frame(uuid).d))
+
+    def test_pool(self):
+        # frames overlapping the window, including the one running into its start, get items
+        self._realize(100, 30)
+        self._assert_realized(99, 130)
+        before = set(id(item) for item in self.track.frames.values())
+        # scrolling reuses the items of frames that left the window for those that entered it
+        self._realize(115, 30)
+        self._assert_realized(114, 145)
+        self.assertTrue(set(id(item) for item in self.track.frames.values()) <= before)
+        self.assertFalse(self.track._density)
+
+    def test_density(self):
+        self._realize(100, 30)
+        pooled = len(self.scene._frame_pool)
+        # zoomed out to 1000 minutes across 600 screen pixels, frames give way to 4-pixel bars of 400 seconds
+        self._realize(0, 1000, scale=0.01)
+        self.assertEqual(self.track.frames, {})
+        self.assertEqual(self.scene._frame_items, {})
+        self.assertEqual(len(self.scene._frame_pool), pooled + 31)
+        bars = self.track._density
+        self.assertEqual(len(bars), 150)
+        self.assertEqual(sum(count for _, _, count, _ in bars), len(self.frames))
+        self.assertEqual([count for _, _, count, _ in bars[:3]], [7, 7, 6])
+        self.assertEqual([ready for _, _, _, ready in bars], [True, True] + [False] * 148)
+
+    def test_late_thumbnail(self):
+        scene = self.scene
+        self._realize(100, 30)
+        gone, kept = self.frames[100].uuid, self.frames[120].uuid
+        self.assertIsNone(scene.frame_thumbnail(gone))
+        self.assertIsNone(scene.frame_thumbnail(kept))
+        self.assertTrue(scene.thumbnail_pending(gone))
+        self.assertEqual(len(scene.requests), 2)
+        (_, gone_request), (_, kept_request) = scene.requests
+        # scroll until the first frame's item is recycled for a frame further along
+        self._realize(115, 30)
+        self.assertNotIn(gone, scene._frame_items)
+        self.assertFalse(scene.thumbnail_pending(gone))
+        img = QImage(8, 8, QImage.Format_RGB32)
+        img.fill(0)
+        # its thumbnail arriving late is dropped, rather than landing on whatever frame the item now shows
+        scene.thumbnail_arrived(gone, gone_request, img)
+        self.assertNotIn(gone, scene._thumbs)
+        self.assertTrue(all(item._thumb is None for item in self.track.frames.values()))
+        # the frame still in view gets its thumbnail, sized for the frame
+        scene.thumbnail_arrived(kept, kept_request, img)
+        self.assertFalse(scene.thumbnail_pending(kept))
+        self.assertEqual(scene.frame_thumbnail(kept).height(), int(GFXC.thumb_height))
+        self.assertEqual(len(scene.requests), 2)
 
 
 def _debug(type, value, tb):
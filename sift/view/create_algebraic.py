@@ -144,7 +144,7 @@ class CreateAlgebraicDialog(QtGui.QDialog):
             INFO.SHORT_NAME: new_name,
         }
 
-        self.doc.create_algebraic_composite(operations=operations, namespace=namespace, info=info)
+        self.doc.apply_algebraic_recipe(operations=operations, namespace=namespace, info=info)
 
     def done(self, r):
         if r == QtGui.QDialog.Accepted:
@@ -793,3 +793,22 @@ class PROJ4Transform(BaseTransform):
 
     def __repr__(self):
         return "<%s:%s at 0x%x>" % (self.__class__.__name__, self.proj4_str, id(self))
+
+
+_transforms = {}  # {(proj4_str, inverse): PROJ4Transform}
+
+
+def shared_proj4_transform(proj4_str, inverse=False):
+    """Get the PROJ4Transform for a projection, shared by every node using it.
+
+    Building the transform parses the PROJ.4 string and generates its GLSL,
+    and sharing one instance lets every layer in the same projection use the
+    same shader functions. The transform is never modified after creation;
+    per-layer pieces (like the Z-order STTransform) are chained after it.
+
+    """
+    key = (proj4_str, bool(inverse))
+    transform = _transforms.get(key)
+    if transform is None:
+        transform = _transforms[key] = PROJ4Transform(proj4_str, inverse=inverse)
+    return transform
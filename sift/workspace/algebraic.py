@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+algebraic.py
+~~~~~~~~~~~~
+
+PURPOSE
+Chunked evaluation of algebraic layer expressions over workspace content.
+
+Operands are memory-mapped content arrays, possibly at different integer-factor resolutions of the same grid.
+Rather than materializing every operand at the finest resolution and running the expression over whole images,
+the output is produced in blocks of rows: each block reads only the matching rows of each operand,
+evaluates the expression, and hands the result back to be written into the output content.
+Peak memory is bounded by the chunk budget instead of the image size.
+
+Expressions made only of arithmetic on operands, constants and a few elementwise numpy functions are compiled
+into a single fused kernel (numexpr when installed, otherwise numba) which makes one multithreaded pass per block
+with NaN propagating inline, instead of one masked-array temporary per operator.
+Anything else falls back to executing the python statements on each block.
+Fused kernels read coarser operands at their native size: numba indexes them directly at i // factor,
+numexpr sees reshaped views that broadcast against finer operands, so no operand is upsampled in memory.
+
+REFERENCES
+
+
+REQUIRES
+numpy
+numba
+numexpr (optional)
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+__author__ = 'rayg'
+__docformat__ = 'reStructuredText'
+
+import ast
+import hashlib
+import logging
+import unittest
+import warnings
+from math import gcd
+from uuid import UUID
+
+import numba as nb
+import numpy as np
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024  # working set for one block of every operand plus the result
+TEMPORARY_FACTOR = 3  # allowance for the temporaries an expression creates per operand-sized array
+
+# elementwise functions available to fused kernels as np.<name>, all of which numexpr and numba share
+FUSED_FUNCTIONS = ('sqrt', 'exp', 'log', 'log10', 'abs', 'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan')
+_BINARY_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**'}
+_UNARY_OPS = {ast.USub: '-', ast.UAdd: '+'}
+_numba_kernels = {}  # (expression, operand count, dtype) -> compiled kernel
+
+
+def parse_operations(operations):
+    """
+    compile algebraic layer code
+    :param operations: python statements, the last of which assigns the result
+    :return: (code object, result variable name)
+    """
+    try:
+        ops_ast = ast.parse(operations, mode='exec')
+        code = compile(ops_ast, '<string>', 'exec')
+        result_name = ops_ast.body[-1].targets[0].id
+    except (SyntaxError, IndexError, AttributeError):
+        raise ValueError("Invalid syntax or operations in algebraic layer")
+    return code, result_name
+
+
+class _OperandsToUUIDs(ast.NodeTransformer):
+    """
+    rename operand variables after the UUIDs they are bound to, and the result variable to a fixed name,
+    so the variable names chosen don't matter
+    """
+    def __init__(self, namespace, result_name):
+        super(_OperandsToUUIDs, self).__init__()
+        self.namespace = namespace
+        self.result_name = result_name
+
+    def visit_Name(self, node):
+        value = self.namespace.get(node.id)
+        if isinstance(value, UUID):
+            return ast.copy_location(ast.Name(id='_' + value.hex, ctx=node.ctx), node)
+        if node.id == self.result_name:
+            return ast.copy_location(ast.Name(id='_result', ctx=node.ctx), node)
+        return node
+
+
+def result_key(operations, namespace, versions, info=None):
+    """
+    identify the result of algebraic code independent of formatting and variable naming
+    :param operations: python statements, the last of which assigns the result
+    :param namespace: {variable: uuid, } operands of the calculation
+    :param versions: {variable: hashable} version of the content each operand uuid reads, e.g. (lod, path, mtime)
+    :param info: initial metadata requested for the result, which also distinguishes products
+    :return: hex digest string
+    """
+    _, result_name = parse_operations(operations)
+    tree = _OperandsToUUIDs(namespace, result_name).visit(ast.parse(operations, mode='exec'))
+    digest = hashlib.sha1(ast.dump(tree).encode('utf-8'))
+    for name in sorted(namespace.keys(), key=lambda n: str(namespace[n])):
+        value = namespace[name]
+        # operand variable names are already folded into the expression, non-uuid values are not
+        tag = (str(value), versions.get(name)) if isinstance(value, UUID) else (name, value)
+        digest.update(repr(tag).encode('utf-8'))
+    if info:
+        digest.update(repr(sorted((str(k), repr(v)) for k, v in info.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _expression_source(node, names, function_prefix):
+    """
+    render a whitelisted expression AST as fully parenthesized source
+    :param node: expression AST node
+    :param names: {variable: source} for operands and previously assigned variables
+    :param function_prefix: how the target backend spells numpy functions, e.g. 'np.' or ''
+    :return: source string, ValueError if the expression can't be fused
+    """
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        return '({} {} {})'.format(_expression_source(node.left, names, function_prefix),
+                                   _BINARY_OPS[type(node.op)],
+                                   _expression_source(node.right, names, function_prefix))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return '({}{})'.format(_UNARY_OPS[type(node.op)], _expression_source(node.operand, names, function_prefix))
+    if isinstance(node, ast.Name) and node.id in names:
+        return names[node.id]
+    if type(node).__name__ in ('Num', 'Constant'):
+        value = getattr(node, 'value', getattr(node, 'n', None))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return repr(float(value))
+    if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords and \
+            isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) and \
+            node.func.value.id in ('np', 'numpy') and node.func.attr in FUSED_FUNCTIONS:
+        return '{}{}({})'.format(function_prefix, node.func.attr,
+                                 _expression_source(node.args[0], names, function_prefix))
+    raise ValueError("cannot fuse {}".format(type(node).__name__))
+
+
+def _numba_kernel(source, count, dtype):
+    """
+    compile (or reuse) a parallel numba loop writing the expression into a 2D output
+    :param source: expression over v0[i // r0, j // c0] .. vN[i // rN, j // cN]
+    :param count: number of operands
+    :param dtype: output dtype
+    :return: kernel(out, v0, r0, c0, .., vN, rN, cN) taking native-resolution operands and their factors
+    """
+    key = (source, count, dtype.str)
+    kernel = _numba_kernels.get(key)
+    if kernel is None:
+        args = ', '.join('v{0}, r{0}, c{0}'.format(idx) for idx in range(count))
+        scope = {'np': np, 'prange': nb.prange}
+        exec('def _kernel(out, {}):\n'
+             '    for i in prange(out.shape[0]):\n'
+             '        for j in range(out.shape[1]):\n'
+             '            out[i, j] = {}\n'.format(args, source), scope)
+        # numpy error model: division by zero gives inf/nan like the array path instead of raising
+        kernel = nb.njit(parallel=True, nogil=True, error_model='numpy')(scope['_kernel'])
+        _numba_kernels[key] = kernel
+    return kernel
+
+
+class FusedKernel(object):
+    """
+    an algebraic expression compiled into one elementwise pass over its operand blocks
+    NaN operands propagate to NaN results within the same pass, standing in for masked-array bookkeeping
+    """
+    source = None  # expression in terms of v0 .. vN for the chosen backend
+    names = None  # operand names in argument order
+    dtype = None  # result dtype
+
+    def __init__(self, source, names, dtype):
+        self.source = source
+        self.names = tuple(names)
+        self.dtype = np.dtype(dtype)
+
+    def __call__(self, blocks, factors, shape):
+        """
+        :param blocks: {name: array} operand blocks at native resolution, from native_chunk
+        :param factors: {name: (row factor, column factor)} of output to operand resolution
+        :param shape: shape of the output block
+        :return: result block
+        """
+        arrays = [blocks[name] for name in self.names]
+        scales = [factors[name] for name in self.names]
+        if ne is not None:
+            views, full_shape = broadcast_blocks(arrays, scales, shape)
+            result = ne.evaluate(self.source, local_dict=dict(('v{}'.format(idx), arr) for idx, arr in enumerate(views)))
+            return np.broadcast_to(result, full_shape).reshape(shape).astype(self.dtype, copy=False)
+        out = np.empty(shape, dtype=self.dtype)
+        args = []
+        for arr, (f0, f1) in zip(arrays, scales):
+            args.extend((arr, f0, f1))
+        _numba_kernel(self.source, len(arrays), self.dtype)(out, *args)
+        return out
+
+
+def fuse_operations(operations, operands):
+    """
+    compile algebraic layer code into a fused kernel if it is simple enough
+    statements must be plain assignments of arithmetic on operands, constants and FUSED_FUNCTIONS
+    :param operations: python statements, the last of which assigns the result
+    :param operands: {name: array} operands the code will see
+    :return: FusedKernel, or None if the code needs the general evaluation path
+    """
+    if not operands or any(np.ndim(data) != 2 or not np.issubdtype(data.dtype, np.floating) for data in operands.values()):
+        return None
+    names = sorted(operands.keys())
+    prefix = '' if ne is not None else 'np.'
+    index = '' if ne is not None else '[i // r{0}, j // c{0}]'
+    sources = dict((name, 'v{0}'.format(idx) + index.format(idx)) for idx, name in enumerate(names))
+    try:
+        statements = ast.parse(operations, mode='exec').body
+        if not statements:
+            return None
+        for stmt in statements:
+            if not isinstance(stmt, ast.Assign) or len(stmt.targets) != 1 or not isinstance(stmt.targets[0], ast.Name):
+                return None
+            sources[stmt.targets[0].id] = _expression_source(stmt.value, sources, prefix)
+    except (SyntaxError, ValueError) as err:
+        LOG.debug("algebraic expression not fused: {}".format(err))
+        return None
+    dtype = np.result_type(*[data.dtype for data in operands.values()])
+    return FusedKernel(sources[statements[-1].targets[0].id], names, dtype)
+
+
+def resolution_factors(shape, out_shape):
+    """
+    :param shape: operand shape
+    :param out_shape: output shape, an integer multiple of the operand shape
+    :return: (row factor, column factor)
+    """
+    f0 = int(out_shape[0] / shape[0])
+    f1 = int(out_shape[1] / shape[1])
+    if f0 * shape[0] != out_shape[0] or f1 * shape[1] != out_shape[1]:
+        raise ValueError("Algebraic inputs must be integer multiples in resolution: {} vs {}".format(shape, out_shape))
+    return f0, f1
+
+
+def row_chunks(out_shape, operand_count, row_multiple=1, itemsize=4, budget=DEFAULT_CHUNK_BYTES):
+    """
+    split output rows into blocks that keep one block of every operand, temporaries and result within budget
+    :param out_shape: (rows, cols) of the output
+    :param operand_count: number of operands read per block, fractional for operands read at coarser resolution
+    :param row_multiple: blocks start on multiples of this, so coarser operands split on whole rows
+    :param itemsize: bytes per element
+    :param budget: bytes of working memory per block
+    :return: list of row slices
+    """
+    rows, cols = out_shape[:2]
+    row_bytes = max(1, cols * itemsize * (operand_count + 1) * TEMPORARY_FACTOR)
+    step = max(row_multiple, int(budget // row_bytes) // row_multiple * row_multiple)
+    return [slice(start, min(rows, start + step)) for start in range(0, rows, step)]
+
+
+def native_chunk(data, rows, factors):
+    """
+    read the block of an operand corresponding to output rows, at the operand's own resolution
+    :param data: operand array at its native resolution
+    :param rows: slice of output rows, starting on a multiple of the row factor
+    :param factors: (row factor, column factor) of output to operand resolution
+    :return: view of the operand rows covering the output rows
+    """
+    f0 = factors[0]
+    return data[rows.start // f0:-(-rows.stop // f0)]
+
+
+def operand_chunk(data, rows, factors):
+    """
+    read the block of an operand corresponding to output rows, expanded to output resolution
+    used when the code needs whole arrays; fused kernels take native_chunk blocks instead
+    :param data: operand array at its native resolution
+    :param rows: slice of output rows, starting on a multiple of the row factor
+    :param factors: (row factor, column factor) of output to operand resolution
+    :return: array covering the output rows
+    """
+    f0, f1 = factors
+    if f0 == 1 and f1 == 1:
+        return data[rows]
+    block = np.repeat(np.repeat(native_chunk(data, rows, factors), f0, axis=0), f1, axis=1)
+    return block[rows.start - (rows.start // f0) * f0:][:rows.stop - rows.start]
+
+
+def _factor_chain(factors):
+    """
+    :param factors: resolution factors along one axis
+    :return: sorted distinct factors starting at 1 if each divides the next, else None
+    """
+    chain = sorted(set(factors) | {1})
+    if all(hi % lo == 0 for lo, hi in zip(chain, chain[1:])):
+        return chain
+    return None
+
+
+def _axis_split(length, factor, chain):
+    """
+    digits an output axis of length is split into, as seen by an operand at factor
+    the axis index is a mixed-radix number: a leading block count, then one digit per step of the chain,
+    most significant first; digits finer than the operand's resolution have size 1 so they broadcast
+    """
+    radices = [hi // lo for lo, hi in zip(chain, chain[1:])]
+    finer = chain.index(factor)
+    return [length // chain[-1]] + list(reversed(radices[finer:])) + [1] * finer
+
+
+def broadcast_blocks(blocks, factors, shape):
+    """
+    view native-resolution operand blocks so that they broadcast against each other at output resolution
+    when the factors along each axis form a divisibility chain (e.g. 0.5km, 1km, 2km) this only reshapes,
+    otherwise coarser blocks are expanded with operand_chunk
+    :param blocks: operand blocks from native_chunk, aligned to the start of the output block
+    :param factors: (row factor, column factor) for each block
+    :param shape: shape of the output block
+    :return: (list of arrays, shape they broadcast to), the latter reshapes to the output block
+    """
+    row_chain = _factor_chain([f0 for f0, _ in factors])
+    col_chain = _factor_chain([f1 for _, f1 in factors])
+    if row_chain is None or col_chain is None:
+        rows = slice(0, shape[0])
+        return [operand_chunk(block, rows, f) for block, f in zip(blocks, factors)], tuple(shape)
+    views = [block.reshape(_axis_split(shape[0], f0, row_chain) + _axis_split(shape[1], f1, col_chain))
+             for block, (f0, f1) in zip(blocks, factors)]
+    full_shape = tuple(_axis_split(shape[0], 1, row_chain) + _axis_split(shape[1], 1, col_chain))
+    return views, full_shape
+
+
+def evaluate_chunks(code, result_name, operands, out_shape, budget=DEFAULT_CHUNK_BYTES, kernel=None):
+    """
+    evaluate algebraic code block by block over the output rows
+    :param code: code object from parse_operations
+    :param result_name: variable the code assigns its result to
+    :param operands: {name: array} of operands, each an integer-factor reduction of out_shape
+    :param out_shape: shape of the result
+    :param budget: bytes of working memory per block
+    :param kernel: optional FusedKernel from fuse_operations, used in place of executing the code
+    :return: generator of (row slice, result block) with masked values filled as NaN
+    """
+    factors = dict((name, resolution_factors(data.shape, out_shape)) for name, data in operands.items())
+    row_multiple = 1
+    for f0, _ in factors.values():
+        row_multiple = row_multiple * f0 // gcd(row_multiple, f0)
+    itemsize = max([np.dtype(data.dtype).itemsize for data in operands.values()] or [4])
+    if kernel is not None:
+        # coarser operands are read at native size, so they count for a fraction of a full-resolution block
+        operand_count = sum(1.0 / (f0 * f1) for f0, f1 in factors.values())
+    else:
+        operand_count = len(operands)
+    for rows in row_chunks(out_shape, operand_count, row_multiple, itemsize, budget):
+        shape = (rows.stop - rows.start,) + tuple(out_shape[1:])
+        result = None
+        if kernel is not None:
+            blocks = dict((name, native_chunk(data, rows, factors[name])) for name, data in operands.items())
+            try:
+                result = kernel(blocks, factors, shape)
+            except Exception:
+                LOG.warning("fused kernel failed for {}, falling back to array evaluation".format(kernel.source),
+                            exc_info=True)
+                kernel = None
+        if result is None:
+            namespace = dict((name, operand_chunk(data, rows, factors[name])) for name, data in operands.items())
+            # Run the code: code_object, no globals, block-sized locals
+            exec(code, None, namespace)
+            if result_name not in namespace:
+                raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
+            result = namespace[result_name]
+        if np.ma.isMaskedArray(result):
+            result = result.filled(np.nan) if np.issubdtype(result.dtype, np.floating) else result.filled()
+        result = np.broadcast_to(np.asarray(result), shape)
+        yield rows, result
+
+
+def valid_range(result, current=None):
+    """
+    fold a result block into a running (min, max) ignoring NaNs
+    :param result: result block
+    :param current: (min, max) so far or None
+    :return: (min, max) or current if the block has no valid values
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lo, hi = np.nanmin(result), np.nanmax(result)
+    if np.isnan(lo):
+        return current
+    if current is None:
+        return lo, hi
+    return min(current[0], lo), max(current[1], hi)
+
+
+class tests(unittest.TestCase):
+    def test_mixed_resolution(self):
+        code, result_name = parse_operations("result = a - b")
+        a = np.arange(64, dtype=np.float32).reshape(8, 8)
+        b = np.arange(16, dtype=np.float32).reshape(4, 4)
+        out = np.empty((8, 8), dtype=np.float32)
+        # a tiny budget forces many blocks
+        for rows, block in evaluate_chunks(code, result_name, {'a': a, 'b': b}, out.shape, budget=1):
+            out[rows] = block
+        expected = a - np.repeat(np.repeat(b, 2, axis=0), 2, axis=1)
+        self.assertTrue(np.array_equal(out, expected))
+
+    def test_fused_matches_array_path(self):
+        operations = "result = (C13 - C15) * (C11 - C13)"
+        code, result_name = parse_operations(operations)
+        operands = dict((name, np.random.rand(6, 6).astype(np.float32)) for name in ('C11', 'C13', 'C15'))
+        operands['C13'][2, 3] = np.nan
+        kernel = fuse_operations(operations, operands)
+        self.assertIsNotNone(kernel)
+        (_, fused), = evaluate_chunks(code, result_name, operands, (6, 6), kernel=kernel)
+        (_, plain), = evaluate_chunks(code, result_name, operands, (6, 6))
+        self.assertEqual(fused.dtype, plain.dtype)
+        self.assertTrue(np.isnan(fused[2, 3]))
+        self.assertTrue(np.allclose(fused, plain, equal_nan=True))
+        self.assertIsNone(fuse_operations("result = np.ma.masked_less(C13, 0)", operands))
+
+    def test_fused_mixed_resolution(self):
+        operations = "result = fine - coarse"
+        code, result_name = parse_operations(operations)
+        operands = {'fine': np.arange(64, dtype=np.float32).reshape(8, 8),
+                    'mid': np.arange(16, dtype=np.float32).reshape(4, 4),
+                    'coarse': np.arange(4, dtype=np.float32).reshape(2, 2)}
+        kernel = fuse_operations(operations, operands)
+        out = np.empty((8, 8), dtype=np.float32)
+        for rows, block in evaluate_chunks(code, result_name, operands, out.shape, budget=1, kernel=kernel):
+            out[rows] = block
+        expected = operands['fine'] - np.repeat(np.repeat(operands['coarse'], 4, axis=0), 4, axis=1)
+        self.assertTrue(np.array_equal(out, expected))
+
+    def test_result_key(self):
+        u1, u2 = UUID(int=1), UUID(int=2)
+        versions = {'a': (0, 'a.image'), 'b': (0, 'b.image')}
+        key = result_key("result = a - b", {'a': u1, 'b': u2}, versions)
+        renamed = result_key("out = x-b  # same thing", {'x': u1, 'b': u2}, {'x': (0, 'a.image'), 'b': (0, 'b.image')})
+        self.assertEqual(key, renamed)
+        self.assertNotEqual(key, result_key("result = b - a", {'a': u1, 'b': u2}, versions))
+        self.assertNotEqual(key, result_key("result = a - b", {'a': u1, 'b': u2}, {'a': (1, 'a.image'), 'b': (0, 'b.image')}))
+
+
+if __name__ == '__main__':
+    unittest.main()
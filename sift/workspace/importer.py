@@ -22,13 +22,14 @@ import gdal
 import osr
 import asyncio
 import numpy as np
-from pyproj import Proj
 from sqlalchemy.orm import Session
 
-from sift.common import PLATFORM, INFO, INSTRUMENT, KIND, INSTRUMENT_MAP, PLATFORM_MAP
+from sift.common import PLATFORM, INFO, INSTRUMENT, KIND, INSTRUMENT_MAP, PLATFORM_MAP, cached_proj
 from sift.workspace.goesr_pug import PugFile
 from sift.workspace.guidebook import ABI_AHI_Guidebook, Guidebook
 from .metadatabase import Resource, Product, Content
+from .navigation import write_navigation
+from .statistics import TileStatistics
 
 LOG = logging.getLogger(__name__)
 
@@ -182,6 +183,38 @@ class aImporter(ABC):
         self._S = database_session
         self._cwd = workspace_cwd
 
+    def _add_navigation(self, c: Content, stem):
+        """
+        write longitude/latitude navigation arrays for image content and reference them from the Content entry
+        navigation is an optimization for probes and masks, so failing to generate it only warns
+        Args:
+            c: Content entry with its projection and grid filled in
+            stem: file name prefix within the workspace, typically the product uuid
+        """
+        try:
+            c.x_path, c.y_path = write_navigation(self._cwd, stem, c.proj4, c.origin_x, c.origin_y,
+                                                  c.cell_width, c.cell_height, (c.rows, c.cols))
+            c.xyz_dtype = 'float32'
+        except Exception:
+            LOG.warning("unable to generate navigation for {}".format(stem), exc_info=True)
+
+    def _add_statistics(self, c: Content, stem, data, value_range=None):
+        """
+        write per-tile statistics for image content and reference them from the Content entry
+        like navigation, statistics are an optimization, so failing to generate them only warns
+        Args:
+            c: Content entry for the data
+            stem: file name prefix within the workspace, typically the product uuid
+            data: the content array, completely filled in
+            value_range: (min, max) for the histogram bins, typically the product's valid range; else scanned for
+        """
+        try:
+            stats_filename = '{}.stats.npz'.format(stem)
+            TileStatistics.from_data(data, value_range=value_range).save(os.path.join(self._cwd, stats_filename))
+            c.info[INFO.STATS_PATH] = stats_filename
+        except Exception:
+            LOG.warning("unable to generate statistics for {}".format(stem), exc_info=True)
+
     @classmethod
     def from_product(cls, prod: Product, workspace_cwd, database_session, **kwargs):
         # FIXME: deal with products that need more than one resource
@@ -438,7 +471,7 @@ class GeoTiffImporter(aSingleFileWithSingleProductImporter):
         d[INFO.SHAPE] = rows, cols = (band.YSize, band.XSize)
 
         # Fix PROJ4 string if it needs an "+over" parameter
-        p = Proj(d[INFO.PROJ])
+        p = cached_proj(d[INFO.PROJ])
         lon_l, lat_u = p(ox, oy, inverse=True)
         lon_r, lat_b = p(ox + cw * cols, oy + ch * rows, inverse=True)
         if "+over" not in d[INFO.PROJ] and lon_r < lon_l:
@@ -537,6 +570,7 @@ class GeoTiffImporter(aSingleFileWithSingleProductImporter):
             coverage_cols = 1,
             coverage_path = coverage_filename
         )
+        self._add_navigation(c, str(prod.uuid))
         # c.info.update(prod.info) would just make everything leak together so let's not do it
         self._S.add(c)
         prod.content.append(c)
@@ -566,6 +600,10 @@ class GeoTiffImporter(aSingleFileWithSingleProductImporter):
         # img_data = np.require(img_data, dtype=np.float32, requirements=['C'])  # FIXME: is this necessary/correct?
         # normally we would place a numpy.memmap in the workspace with the content of the geotiff raster band/s here
 
+        # now that the content is complete, summarize it for quick statistics queries
+        self._add_statistics(c, str(prod.uuid), img_data, prod.info.get(INFO.VALID_RANGE))
+        self._S.commit()
+
         # single stage import with all the data for this simple case
         zult = import_progress(uuid=prod.uuid,
                                stages=1,
@@ -780,6 +818,8 @@ class GoesRPUGImporter(aSingleFileWithSingleProductImporter):
             origin_x = origin_x,
             origin_y = origin_y,
         )
+        self._add_navigation(c, str(prod.uuid))
+        self._add_statistics(c, str(prod.uuid), img_data, prod.info.get(INFO.VALID_RANGE))
         # c.info.update(prod.info) would just make everything leak together so let's not do it
         self._S.add(c)
         prod.content.append(c)
@@ -1089,7 +1129,7 @@ class SatPyImporter(aImporter):
             antimeridian = 179.999
             if '+proj=latlong' not in proj4:
                 # the x coordinate for the antimeridian in this projection
-                antimeridian = Proj(proj4)(antimeridian, 0)[0]
+                antimeridian = cached_proj(proj4)(antimeridian, 0)[0]
             am_index = int(np.ceil((antimeridian - origin_x) / cell_width))
             if prod.info[INFO.KIND] == KIND.CONTOUR and 0 < am_index < shape[1]:
                 # if we have data from 0 to 360 longitude, we want -180 to 360
@@ -1128,6 +1168,8 @@ class SatPyImporter(aImporter):
                 origin_y=origin_y,
             )
             c.info[INFO.KIND] = KIND.IMAGE
+            self._add_navigation(c, str(prod.uuid))
+            self._add_statistics(c, str(prod.uuid), img_data, prod.info.get(INFO.VALID_RANGE))
             # c.info.update(prod.info) would just make everything leak together so let's not do it
             self._S.add(c)
             prod.content.append(c)
@@ -8,20 +8,17 @@ PURPOSE
 DataMatrix is products X timesteps matrix
 Each matrix cell has a state
 Some states have UUIDs and therefore data
-Search directories and create index of what data is where
+Rows are tracks (family::category), columns are observation times
+The matrix is an in-memory index of the metadatabase's products, kept current from workspace signals
 Used by Workspace to respond to adjacency queries / product matrix requests
 
 USAGE
 
-dm = DataAdjacencyMatrix('/data', recurse=True)
-# search through files
-for _ in dm.finditer():
-    pass
-ds = dm.ix['myproduct', 0]
-if ds.state!=state.CACHED:
-    for _ in ds.loaditer(my_workspace):
-        pass
-uuid = ds.uuid
+dam = DataAdjacencyMatrix(workspace.metadatabase)
+dam.sync()  # load every product; later calls can pass just the UUIDs that changed
+sibs, dex = dam.time_siblings(uuid)
+later = dam.next_frame(uuid)
+closest = dam.nearest_frame(dam.track_for_product(uuid), when)
 
 
 
@@ -40,11 +37,18 @@ __docformat__ = 'reStructuredText'
 
 import os, sys
 import logging, unittest, argparse
+import threading
+from bisect import bisect_left, insort
 from datetime import timedelta, datetime
-from collections import namedtuple
+from collections import namedtuple, defaultdict
+from itertools import chain
 from enum import Enum
+from uuid import UUID, uuid1
 from PyQt4.QtCore import QObject, pyqtSignal
 
+from sift.common import FCS_SEP, INFO, span
+from sift.workspace.metadatabase import Product, ProductKeyValue
+
 LOG = logging.getLogger(__name__)
 
 
@@ -69,17 +73,46 @@ row_info = namedtuple('row_info', ('product_name', 'timestep_count'))
 
 product_info = namedtuple('product_info', ('product_name', 'time', 'state', 'path', 'variable', 'slice'))
 
+SYNC_CHUNK = 500  # UUIDs per metadatabase query, below SQLite's limit on bound variables
+DEFAULT_TIME_EPSILON = timedelta(seconds=20)  # bands of one scan start within seconds of each other
+
+
+def _after(when: datetime) -> tuple:
+    """sort key just past every (time, ...) tuple at `when`, for bisecting time-ordered lists"""
+    return (when + timedelta.resolution,)
+
+
+def _located(fam, ctg, when, dur, sched=None):
+    """index entry for a product; products without a scheduled time are grouped with others by observation time"""
+    return fam, ctg, when, dur, sched or when
+
 
 class DataAdjacencyMatrix(QObject):
     """
     A product x time matrix of available data.
-    - directs the workspace to load or unload data
-    - transitions data on demand into layers
-    - manages default presentation on a per-product basis
-    - allows re-ordering of products, resulting in z-order scenegraph changes
+    - rows are tracks, each holding its frames as a list of (obs_time, uuid) sorted by time
+    - each category also holds (sched_time, family, uuid) for all its families, so channel siblings line up by scheduled time
+    - a reverse map gives the family, category and time span of every product
+    Sibling, next/previous and nearest-time queries bisect those lists instead of scanning all products,
+    so they stay logarithmic in the number of frames as the metadatabase grows.
+    The index follows the metadatabase through sync() and discard(), typically connected to
+    Workspace.didUpdateProductsMetadata; it is safe to query and update from any thread.
     """
-    def __init__(self, initial_search_paths=[]):
+    didChangeMatrix = pyqtSignal(set, set)  # UUIDs added or moved, UUIDs removed
+    didChangeTracks = pyqtSignal(set, set)  # track names gaining their first product, track names losing their last
+    didChangeShape = pyqtSignal(int, int)  # products, timesteps
+
+    def __init__(self, mdb=None, initial_search_paths=[]):
         super(DataAdjacencyMatrix, self).__init__()
+        self._mdb = mdb
+        self._lock = threading.RLock()
+        self._time_epsilon = DEFAULT_TIME_EPSILON
+        self._where = {}  # uuid: (family, category, obs_time, obs_duration, sched_time)
+        self._frames = {}  # track: [(obs_time, uuid), ...] in time order
+        self._channels = {}  # category: [(sched_time, family, uuid), ...] in time order
+        self._longest = defaultdict(timedelta)  # track: longest obs_duration seen, bounds overlap searches
+        self._rows = None  # track names in order, built on demand by _rebuild
+        self._columns = None  # [column_info, ...] in time order, built on demand by _rebuild
 
     def add_search_paths(self, *paths):
         pass
@@ -87,16 +120,235 @@ class DataAdjacencyMatrix(QObject):
     def remove_search_paths(self, *paths):
         pass
 
+    def sync(self, uuids=None):
+        """
+        update the index from the metadatabase
+        :param uuids: products that were added, changed or deleted; None or empty to reload everything
+        :return: (UUIDs added or moved, UUIDs removed)
+        """
+        if self._mdb is None:
+            return set(), set()
+        fields = (Product.uuid_str, Product.family, Product.category, Product.obs_time, Product.obs_duration,
+                  ProductKeyValue.value)
+        with self._mdb as S:
+            # scheduled time is a key-value, joined in where the product has one
+            query = S.query(*fields).outerjoin(ProductKeyValue, (ProductKeyValue.product_id == Product.id) &
+                                               (ProductKeyValue.key == INFO.SCHED_TIME))
+            if not uuids:
+                rows = query.all()
+            else:
+                uuids = list(uuids)
+                rows = []
+                for dex in range(0, len(uuids), SYNC_CHUNK):
+                    chunk = [str(u) for u in uuids[dex:dex + SYNC_CHUNK]]
+                    rows += query.filter(Product.uuid_str.in_(chunk)).all()
+        return self._merge(rows, uuids or None)
+
+    def discard(self, uuids):
+        """
+        drop products, e.g. once they are deleted from the metadatabase
+        :return: set of UUIDs actually removed
+        """
+        with self._lock:
+            had_tracks = set(self._frames.keys())
+            removed = set(u for u in uuids if self._remove(u))
+        self._changed(set(), removed, had_tracks)
+        return removed
+
+    def _merge(self, rows, uuids=None):
+        """
+        merge (uuid_str, family, category, obs_time, obs_duration[, sched_time]) rows into the index
+        :param uuids: UUIDs the rows were queried for, those without a row are removed; None if rows are every product
+        :return: (UUIDs added or moved, UUIDs removed)
+        """
+        found = dict((UUID(row[0]), _located(*row[1:])) for row in rows)
+        with self._lock:
+            had_tracks = set(self._frames.keys())
+            if uuids is None:
+                # rebuilding from scratch sorts each list once, rather than inserting one product at a time
+                added = set(u for u, where in found.items() if self._where.get(u) != where)
+                removed = set(self._where.keys()) - set(found.keys())
+                self._load(found)
+            else:
+                added = set(u for u, where in found.items() if self._insert(u, *where))
+                removed = set(u for u in uuids if u not in found and self._remove(u))
+        self._changed(added, removed, had_tracks)
+        return added, removed
+
+    def _load(self, found):
+        frames, channels, longest = defaultdict(list), defaultdict(list), defaultdict(timedelta)
+        for uuid, (fam, ctg, when, dur, sched) in found.items():
+            track = fam + FCS_SEP + ctg
+            frames[track].append((when, uuid))
+            channels[ctg].append((sched, fam, uuid))
+            longest[track] = max(longest[track], dur)
+        for seq in chain(frames.values(), channels.values()):
+            seq.sort()
+        self._where, self._frames, self._channels, self._longest = dict(found), dict(frames), dict(channels), longest
+        self._rows = self._columns = None
+
+    def _insert(self, uuid, fam, ctg, when, dur, sched):
+        """add or move one product, returning True if the index changed"""
+        if self._where.get(uuid) == (fam, ctg, when, dur, sched):
+            return False
+        self._remove(uuid)
+        track = fam + FCS_SEP + ctg
+        self._where[uuid] = (fam, ctg, when, dur, sched)
+        insort(self._frames.setdefault(track, []), (when, uuid))
+        insort(self._channels.setdefault(ctg, []), (sched, fam, uuid))
+        self._longest[track] = max(self._longest[track], dur)
+        self._rows = self._columns = None
+        return True
+
+    def _remove(self, uuid):
+        """drop one product, returning True if it was indexed"""
+        where = self._where.pop(uuid, None)
+        if where is None:
+            return False
+        fam, ctg, when, dur, sched = where
+        track = fam + FCS_SEP + ctg
+        # longest durations are left as they were; they only need to be an upper bound
+        for table, key, item in ((self._frames, track, (when, uuid)), (self._channels, ctg, (sched, fam, uuid))):
+            seq = table[key]
+            del seq[bisect_left(seq, item)]
+            if not seq:
+                del table[key]
+        self._rows = self._columns = None
+        return True
+
+    def _changed(self, added, removed, had_tracks):
+        if not added and not removed:
+            return
+        LOG.debug("matrix now has {} products after {} added and {} removed".format(
+            len(self._where), len(added), len(removed)))
+        self.didChangeMatrix.emit(added, removed)
+        with self._lock:
+            has_tracks = set(self._frames.keys())
+        if has_tracks != had_tracks:
+            self.didChangeTracks.emit(has_tracks - had_tracks, had_tracks - has_tracks)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, uuid):
+        return uuid in self._where
+
+    @property
+    def tracks(self):
+        """
+        :return: sorted list of the track names holding at least one product
+        """
+        with self._lock:
+            return sorted(self._frames.keys())
+
+    def track_for_product(self, uuid: UUID):
+        """
+        :return: family::category track name of a product, or None if it is not indexed
+        """
+        where = self._where.get(uuid)
+        return None if where is None else where[0] + FCS_SEP + where[1]
+
+    def span_for_product(self, uuid: UUID):
+        """
+        :return: observation span of a product, or None if it is not indexed
+        """
+        where = self._where.get(uuid)
+        return None if where is None else span(where[2], where[3])
+
+    def frames_in_track(self, track: str, during: span = None):
+        """
+        :param during: only frames overlapping this span, if given
+        :return: list of (obs_time, uuid) in time order
+        """
+        with self._lock:
+            seq = self._frames.get(track, [])
+            if during is None:
+                return list(seq)
+            # frames starting before during.s - longest duration cannot reach into the span
+            lo = bisect_left(seq, (during.s - self._longest[track],))
+            hi = bisect_left(seq, _after(during.e))
+            return [(when, uuid) for (when, uuid) in seq[lo:hi]
+                    if when + self._where[uuid][3] >= during.s]
+
+    def _track_index(self, uuid):
+        """(track's time-ordered frame list, position of uuid in it), or (None, None)"""
+        where = self._where.get(uuid)
+        if where is None:
+            return None, None
+        seq = self._frames[where[0] + FCS_SEP + where[1]]
+        return seq, bisect_left(seq, (where[2], uuid))
+
+    def time_siblings(self, uuid: UUID):
+        """
+        :return: list of uuids in the product's track in time order, index of the product in that list
+        """
+        with self._lock:
+            seq, dex = self._track_index(uuid)
+            if seq is None:
+                return [], 0
+            return [u for _, u in seq], dex
+
+    def _step(self, uuid, delta):
+        with self._lock:
+            seq, dex = self._track_index(uuid)
+            if seq is None or not (0 <= dex + delta < len(seq)):
+                return None
+            return seq[dex + delta][1]
+
+    def next_frame(self, uuid: UUID):
+        """
+        :return: uuid of the next frame in time within the product's track, or None if it is the last
+        """
+        return self._step(uuid, 1)
+
+    def previous_frame(self, uuid: UUID):
+        """
+        :return: uuid of the previous frame in time within the product's track, or None if it is the first
+        """
+        return self._step(uuid, -1)
+
+    def nearest_frame(self, track: str, when: datetime):
+        """
+        :return: uuid of the frame in a track starting nearest to `when`, earlier frame on a tie; None for an empty track
+        """
+        with self._lock:
+            seq = self._frames.get(track)
+            if not seq:
+                return None
+            dex = bisect_left(seq, (when,))
+            if dex == len(seq) or (dex > 0 and when - seq[dex - 1][0] <= seq[dex][0] - when):
+                dex -= 1
+            return seq[dex][1]
+
+    def channel_siblings(self, uuid: UUID):
+        """
+        products of the same category and scheduled time as this one, e.g. the other bands of a scan
+        bands match however far apart their observations start; products without a scheduled time match on obs_time
+        :return: list of uuids in family order, index of the product in that list
+        """
+        with self._lock:
+            where = self._where.get(uuid)
+            if where is None:
+                return [], 0
+            fam, ctg, when, dur, sched = where
+            seq = self._channels[ctg]
+            lo = bisect_left(seq, (sched,))
+            hi = bisect_left(seq, _after(sched))
+            sibs = sorted((f, u) for _, f, u in seq[lo:hi])
+            return [u for _, u in sibs], sibs.index((fam, uuid))
+
     @property
     def column_time_epsilon(self):
         """
         :return: timedelta that determines whether two or more columns are actually from the same time or not
         """
-        return timedelta(0)
+        return self._time_epsilon
 
     @column_time_epsilon.setter
-    def _(self, td):
-        self._time_epsilon = td
+    def column_time_epsilon(self, td):
+        with self._lock:
+            self._time_epsilon = td
+            self._columns = None
         self._rebuild()
 
     @property
@@ -104,36 +356,132 @@ class DataAdjacencyMatrix(QObject):
         """
         :return: tuple of (products, timesteps)
         """
-        return (0,0)
+        with self._lock:
+            self._rebuild(do_signal=False)
+            return len(self._rows), len(self._columns)
 
     def column_info(self, column):
         """
         :param column: 0..n-1 column to get summary information on
         :return: column_info namedtuple
         """
+        with self._lock:
+            self._rebuild(do_signal=False)
+            return self._columns[column]
 
     def row_info(self, row):
         """
-        :param column: 0..n-1 column to get summary information on
-        :return: column_info namedtuple
+        :param row: 0..n-1 row to get summary information on
+        :return: row_info namedtuple
         """
+        with self._lock:
+            self._rebuild(do_signal=False)
+            track = self._rows[row]
+            return row_info(track, len(self._frames[track]))
 
     def _rebuild(self, do_signal=True):
         """
         rebuild rows and columns after insertion, combination or deletion
+        columns merge observation times within column_time_epsilon of the first time in the column
         :param do_signal: whether or not to propagate a Qt refresh signal
         :return: True if dimensionality changed
         """
+        with self._lock:
+            if self._rows is not None and self._columns is not None:
+                return False
+            old_shape = (len(self._rows or ()), len(self._columns or ()))
+            self._rows = sorted(self._frames.keys())
+            columns = []
+            for when in sorted(where[2] for where in self._where.values()):
+                if columns and when - columns[-1][0] <= self._time_epsilon:
+                    columns[-1][1] += 1
+                else:
+                    columns.append([when, 1])
+            self._columns = [column_info(when, count) for when, count in columns]
+            new_shape = (len(self._rows), len(self._columns))
+        if new_shape == old_shape:
+            return False
+        if do_signal:
+            self.didChangeShape.emit(*new_shape)
+        return True
 
 
 class tests(unittest.TestCase):
     data_file = os.environ.get('TEST_DATA', os.path.expanduser("~/Data/test_files/thing.dat"))
 
     def setUp(self):
-        pass
-
-    def test_something(self):
-        pass
+        self.t0 = datetime(2017, 9, 1, 12)
+        self.step = timedelta(minutes=10)
+        self.dur = timedelta(minutes=5)
+        self.dam = DataAdjacencyMatrix()
+        self.uuids = {}  # (family, nth): uuid
+        rows = []
+        for fam in ('IMAGE:geo:refl:0.47um', 'IMAGE:geo:bt:11um'):
+            for nth in range(5):
+                uu = self.uuids[fam, nth] = uuid1()
+                rows.append((str(uu), fam, 'GOES-16:ABI:CONUS', self.t0 + nth * self.step, self.dur))
+        self.dam._merge(rows)
+
+    def test_time_steps(self):
+        fam = 'IMAGE:geo:bt:11um'
+        sibs, dex = self.dam.time_siblings(self.uuids[fam, 2])
+        self.assertEqual(sibs, [self.uuids[fam, n] for n in range(5)])
+        self.assertEqual(dex, 2)
+        self.assertEqual(self.dam.next_frame(self.uuids[fam, 2]), self.uuids[fam, 3])
+        self.assertEqual(self.dam.previous_frame(self.uuids[fam, 0]), None)
+        track = self.dam.track_for_product(self.uuids[fam, 0])
+        self.assertEqual(self.dam.nearest_frame(track, self.t0 + timedelta(minutes=24)), self.uuids[fam, 2])
+        self.assertEqual(self.dam.nearest_frame(track, self.t0 + timedelta(minutes=25)), self.uuids[fam, 2])
+        self.assertEqual(self.dam.nearest_frame(track, self.t0 + timedelta(days=1)), self.uuids[fam, 4])
+
+    def test_channels_and_overlap(self):
+        sibs, dex = self.dam.channel_siblings(self.uuids['IMAGE:geo:refl:0.47um', 1])
+        self.assertEqual(sibs, [self.uuids['IMAGE:geo:bt:11um', 1], self.uuids['IMAGE:geo:refl:0.47um', 1]])
+        self.assertEqual(dex, 1)
+        track = self.dam.track_for_product(self.uuids['IMAGE:geo:refl:0.47um', 0])
+        during = span(self.t0 + timedelta(minutes=14), timedelta(minutes=10))
+        self.assertEqual([u for _, u in self.dam.frames_in_track(track, during)],
+                         [self.uuids['IMAGE:geo:refl:0.47um', n] for n in (1, 2)])
+        self.assertEqual(self.dam.shape, (2, 5))
+
+    def test_incremental(self):
+        gone = self.uuids['IMAGE:geo:bt:11um', 2]
+        moved = self.uuids['IMAGE:geo:bt:11um', 0]
+        added, removed = self.dam._merge([(str(moved), 'IMAGE:geo:bt:11um', 'GOES-16:ABI:CONUS',
+                                           self.t0 + 9 * self.step, self.dur)], [gone, moved])
+        self.assertEqual((added, removed), ({moved}, {gone}))
+        sibs, dex = self.dam.time_siblings(moved)
+        self.assertEqual(dex, 3)
+        self.assertEqual(len(sibs), 4)
+        self.assertNotIn(gone, self.dam)
+        self.assertEqual(self.dam.discard([moved, gone]), {moved})
+        self.assertEqual(len(self.dam), 8)
+
+    def test_track_changes(self):
+        changes = []
+        self.dam.didChangeTracks.connect(lambda gained, lost: changes.append((gained, lost)))
+        refl = [self.uuids['IMAGE:geo:refl:0.47um', n] for n in range(5)]
+        self.dam.discard(refl[:4])
+        self.assertEqual(changes, [])
+        self.dam.discard(refl[4:])
+        self.assertEqual(changes, [(set(), {'IMAGE:geo:refl:0.47um' + FCS_SEP + 'GOES-16:ABI:CONUS'})])
+        new = uuid1()
+        self.dam._merge([(str(new), 'IMAGE:geo:bt:11um', 'GOES-16:ABI:MESO1', self.t0, self.dur)], [new])
+        self.assertEqual(changes[-1], ({'IMAGE:geo:bt:11um' + FCS_SEP + 'GOES-16:ABI:MESO1'}, set()))
+        self.assertEqual(len(self.dam.tracks), 2)
+
+    def test_channels_by_scheduled_time(self):
+        # bands of one scan share a scheduled time even when their observations start minutes apart
+        sched = self.t0 + 20 * self.step
+        band1, band2, later = uuid1(), uuid1(), uuid1()
+        self.dam._merge([
+            (str(band1), 'IMAGE:geo:refl:0.47um', 'GOES-16:ABI:FLDK', sched, self.dur, sched),
+            (str(band2), 'IMAGE:geo:bt:11um', 'GOES-16:ABI:FLDK', sched + timedelta(seconds=45), self.dur, sched),
+            (str(later), 'IMAGE:geo:bt:11um', 'GOES-16:ABI:FLDK', sched + timedelta(seconds=50), self.dur,
+             sched + self.step),
+        ], [band1, band2, later])
+        self.assertEqual(self.dam.channel_siblings(band1), ([band2, band1], 1))
+        self.assertEqual(self.dam.channel_siblings(later), ([later], 0))
 
 
 def _debug(type, value, tb):
@@ -93,6 +93,7 @@ Base = declarative_base()
 # resources can have multiple products in them
 # products may require multiple resourcse (e.g. separate GEO; tiled imagery)
 PRODUCTS_FROM_RESOURCES_TABLE_NAME = 'product_resource_assoc_v1'
+SQLITE_TIMEOUT = 60.0  # seconds a connection waits for another thread's write transaction before 'database is locked'
 ProductsFromResources = Table(PRODUCTS_FROM_RESOURCES_TABLE_NAME, Base.metadata,
                               Column('product_id', Integer, ForeignKey('products_v1.id')),
                               Column('resource_id', Integer, ForeignKey('resources_v1.id')))
@@ -720,6 +721,9 @@ class Metadatabase(object):
     def connect(self, uri, create_tables=False, **kwargs):
         assert(self.engine is None)
         assert(self.connection is None)
+        if uri.startswith('sqlite'):
+            # importers on several threads commit concurrently; wait out each other's short write transactions
+            kwargs.setdefault('connect_args', {}).setdefault('timeout', SQLITE_TIMEOUT)
         self.engine = create_engine(uri, **kwargs)
         LOG.info('attaching database at {}'.format(uri))
         if create_tables or not self._all_tables_present():
@@ -853,6 +857,64 @@ class tests(unittest.TestCase):
         self.assertEqual(q.info['key'], p.info['key'])
         # self.assertEqual(q.obs_time, nextwhen)
 
+    def _contend(self, path, hold):
+        """commit a product from one thread while another holds its write transaction open for `hold` seconds
+        :return: exceptions raised by the waiting writer, number of products stored
+        """
+        import threading, time
+        from uuid import uuid1
+        mdb = Metadatabase('sqlite:///' + path, create_tables=True)
+        self.addCleanup(mdb.engine.dispose)
+        locked = threading.Event()
+        errors = []
+
+        def _product(name):
+            when = datetime.utcnow()
+            return Product(uuid_str=str(uuid1()), atime=when, name=name, obs_time=when,
+                           obs_duration=timedelta(minutes=5), family=u'IMAGE:geo:bt:11um',
+                           category=u'TEST:GOES-16:ABI:CONUS', serial=str(uuid1()))
+
+        def _hold():
+            with mdb as s:
+                s.add(_product('held'))
+                s.flush()  # the insert takes sqlite's write lock until commit
+                locked.set()
+                time.sleep(hold)  # like a content import in progress
+                s.commit()
+
+        def _write():
+            locked.wait()
+            try:
+                with mdb as s:
+                    s.add(_product('waiting'))
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=_hold), threading.Thread(target=_write)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with mdb as s:
+            return errors, s.query(Product).count()
+
+    def test_concurrent_writers(self):
+        # importer threads each commit their own products into one database file
+        import shutil, tempfile
+        from unittest.mock import patch
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        # the waiting writer rides out the other's transaction on SQLITE_TIMEOUT
+        errors, count = self._contend(os.path.join(tmp, 'waits.db'), 0.5)
+        self.assertEqual(errors, [])
+        self.assertEqual(count, 2)
+        # and without it the same contention is an error, so the wait above is the connection's timeout at work
+        with patch(__name__ + '.SQLITE_TIMEOUT', 0.01):
+            errors, count = self._contend(os.path.join(tmp, 'fails.db'), 0.5)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('locked', str(errors[0]))
+        self.assertEqual(count, 1)
+
 def _debug(type, value, tb):
     "enable with sys.excepthook = debug"
     if not sys.stdin.isatty():
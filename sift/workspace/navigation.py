@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+navigation.py
+~~~~~~~~~~~~~
+
+PURPOSE
+Longitude and latitude navigation arrays for workspace content.
+
+Importers write lon/lat for a grid of sample points into the workspace next to the content,
+referenced by Content.x_path (longitude) and Content.y_path (latitude).
+Large images are sampled at reduced resolution: samples are spaced evenly from the first to the last
+row and column, so the spacing follows from the two shapes and needs no extra bookkeeping.
+Lookups interpolate bilinearly between samples, unwrapping longitude across the antimeridian.
+Probes and masks then index arrays instead of running projection math per pixel.
+
+REFERENCES
+
+
+REQUIRES
+numpy
+pyproj
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+__author__ = 'rayg'
+__docformat__ = 'reStructuredText'
+
+import logging
+import os
+import unittest
+
+import numpy as np
+
+from sift.common import cached_proj
+
+LOG = logging.getLogger(__name__)
+
+NAV_MAX_SAMPLES = 1024  # samples per axis in navigation arrays; smaller images are navigated at full resolution
+NAV_CHUNK_ROWS = 128  # sample rows projected at a time while writing navigation
+
+
+def navigation_shape(shape, max_samples=NAV_MAX_SAMPLES):
+    """
+    :param shape: (rows, cols) of the content
+    :param max_samples: most samples along either axis
+    :return: (rows, cols) of the navigation arrays
+    """
+    return tuple(min(n, max_samples) for n in shape[:2])
+
+
+def _sample_positions(count, samples):
+    """
+    :return: fractional content indices of samples spread evenly from the first to the last index
+    """
+    if samples <= 1:
+        return np.zeros((samples,), dtype=np.float64)
+    return np.arange(samples, dtype=np.float64) * ((count - 1) / (samples - 1))
+
+
+def write_navigation(directory, stem, proj4, origin_x, origin_y, cell_width, cell_height, shape,
+                     max_samples=NAV_MAX_SAMPLES):
+    """
+    project content cell centers to longitude and latitude and store them as .npy arrays
+    :param directory: workspace cache directory
+    :param stem: file name prefix, typically the product uuid
+    :param proj4: projection of the content
+    :param origin_x: x of the center of the first cell
+    :param origin_y: y of the center of the first cell
+    :param cell_width: x step per column
+    :param cell_height: y step per row
+    :param shape: (rows, cols) of the content
+    :param max_samples: most samples along either axis
+    :return: (longitude filename, latitude filename) relative to directory
+    """
+    rows, cols = shape[:2]
+    nav_rows, nav_cols = navigation_shape(shape, max_samples)
+    lon_name, lat_name = '{}.lon.npy'.format(stem), '{}.lat.npy'.format(stem)
+    lon = np.lib.format.open_memmap(os.path.join(directory, lon_name), mode='w+', dtype=np.float32,
+                                    shape=(nav_rows, nav_cols))
+    lat = np.lib.format.open_memmap(os.path.join(directory, lat_name), mode='w+', dtype=np.float32,
+                                    shape=(nav_rows, nav_cols))
+    latlong = '+proj=latlong' in proj4 or '+proj=longlat' in proj4
+    p = None if latlong else cached_proj(proj4)
+    x = origin_x + _sample_positions(cols, nav_cols) * cell_width
+    row_positions = _sample_positions(rows, nav_rows)
+    for start in range(0, nav_rows, NAV_CHUNK_ROWS):
+        block = slice(start, min(nav_rows, start + NAV_CHUNK_ROWS))
+        xx, yy = np.meshgrid(x, origin_y + row_positions[block] * cell_height)
+        if p is not None:
+            xx, yy = p(xx, yy, inverse=True)
+            xx, yy = np.asarray(xx), np.asarray(yy)
+        # off-earth samples come back as inf or 1e30 depending on the proj version
+        bad = ~np.isfinite(xx) | ~np.isfinite(yy) | (np.abs(xx) > 1e10) | (np.abs(yy) > 1e10)
+        lon[block] = np.where(bad, np.nan, xx)
+        lat[block] = np.where(bad, np.nan, yy)
+    lon.flush()
+    lat.flush()
+    return lon_name, lat_name
+
+
+def navigate(lon_nav, lat_nav, shape, rows, cols):
+    """
+    longitude and latitude of content cells, interpolated from navigation arrays
+    :param lon_nav: longitude navigation array
+    :param lat_nav: latitude navigation array
+    :param shape: (rows, cols) of the content
+    :param rows: content row indices
+    :param cols: content column indices, same shape as rows
+    :return: (longitude, latitude) arrays shaped like rows
+    """
+    nav_rows, nav_cols = lon_nav.shape
+    if (nav_rows, nav_cols) == tuple(shape[:2]):
+        return lon_nav[rows, cols], lat_nav[rows, cols]
+    # fractional position in the navigation sample grid
+    fr = np.asarray(rows, dtype=np.float64) * ((nav_rows - 1) / max(1, shape[0] - 1))
+    fc = np.asarray(cols, dtype=np.float64) * ((nav_cols - 1) / max(1, shape[1] - 1))
+    r0 = np.clip(np.floor(fr).astype(np.int64), 0, max(0, nav_rows - 2))
+    c0 = np.clip(np.floor(fc).astype(np.int64), 0, max(0, nav_cols - 2))
+    r1, c1 = np.minimum(r0 + 1, nav_rows - 1), np.minimum(c0 + 1, nav_cols - 1)
+    wr, wc = fr - r0, fc - c0
+
+    def _bilinear(nav, unwrap=False):
+        corners = [nav[r0, c0], nav[r0, c1], nav[r1, c0], nav[r1, c1]]
+        if unwrap:
+            # keep the four corners on one side of the antimeridian before blending
+            ref = corners[0]
+            corners = [np.where(v - ref > 180., v - 360., np.where(v - ref < -180., v + 360., v)) for v in corners]
+        top = corners[0] * (1 - wc) + corners[1] * wc
+        bottom = corners[2] * (1 - wc) + corners[3] * wc
+        return top * (1 - wr) + bottom * wr
+
+    lon = _bilinear(lon_nav, unwrap=True)
+    lon = np.where(lon > 180., lon - 360., np.where(lon < -180., lon + 360., lon))
+    return lon, _bilinear(lat_nav)
+
+
+class tests(unittest.TestCase):
+    def test_navigate_latlong(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            lon_name, lat_name = write_navigation(directory, 'test', '+proj=latlong', 170., 10., 1., -1., (20, 30),
+                                                  max_samples=5)
+            lon_nav = np.load(os.path.join(directory, lon_name))
+            lat_nav = np.load(os.path.join(directory, lat_name))
+            self.assertEqual(lon_nav.shape, (5, 5))
+            lon, lat = navigate(lon_nav, lat_nav, (20, 30), np.array([0, 19, 7]), np.array([0, 29, 12]))
+            self.assertTrue(np.allclose(lat, [10., -9., 3.]))
+            # column 12 is 182 degrees, which wraps
+            self.assertTrue(np.allclose(lon, [170., -161., -178.]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+resample.py
+~~~~~~~~~~~
+
+PURPOSE
+Reprojection of workspace content onto another layer's grid through cached lookup tables.
+
+A lookup table (LUT) records, for every cell of a target area, where its center falls in a source area.
+Building it costs a pair of projection transforms per cell; applying it is a gather.
+LUTs depend only on the (source area, target area) pair, not on the data,
+so they are written once into the workspace cache and reused for every time step of the same products.
+Both building and applying work in blocks of target rows, so neither holds a full-size temporary.
+
+REFERENCES
+
+
+REQUIRES
+numpy
+pyproj
+pyresample (for the AreaDefinitions passed in)
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+__author__ = 'rayg'
+__docformat__ = 'reStructuredText'
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sift.common import cached_proj
+
+LOG = logging.getLogger(__name__)
+
+LUT_CHUNK_ROWS = 256  # target rows transformed per block while building a LUT
+METHODS = ('nearest', 'bilinear')
+
+
+def area_key(area):
+    """
+    :param area: pyresample AreaDefinition
+    :return: hex digest identifying the projection, extent and shape of the area
+    """
+    proj_str = getattr(area, 'proj_str', None) or area.proj4_string
+    ident = repr((proj_str, tuple(float(x) for x in area.area_extent), tuple(area.shape)))
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+
+def grid_area(proj, origin_x, origin_y, cell_width, cell_height, shape, y_slice=None, x_slice=None):
+    """
+    pyresample AreaDefinition for a SIFT grid, or a sliced window of it
+    SIFT origins are the center of the upper-left cell, and cell height is negative for north-up grids
+    :param proj: PROJ.4 string of the grid
+    :param shape: (rows, columns) of the whole grid
+    :param y_slice: row slice with step 1, None for all rows
+    :param x_slice: column slice with step 1, None for all columns
+    :return: AreaDefinition with a lower-left to upper-right extent and positive pixel sizes
+    """
+    from pyresample.geometry import AreaDefinition
+    from pyresample.utils import proj4_str_to_dict
+    y_slice = y_slice or slice(None)
+    x_slice = x_slice or slice(None)
+    if y_slice.step not in [1, None] or x_slice.step not in [1, None]:
+        raise ValueError("Slice steps other than 1 are not supported")
+    rows, cols = shape
+    y_start, y_stop, _ = y_slice.indices(rows)
+    x_start, x_stop, _ = x_slice.indices(cols)
+    width, height = abs(cell_width), abs(cell_height)
+    left = origin_x - width / 2. + x_start * width
+    top = origin_y + height / 2. - y_start * height
+    num_rows, num_cols = y_stop - y_start, x_stop - x_start
+    return AreaDefinition('layer area', 'layer area', 'layer area', proj4_str_to_dict(proj), num_cols, num_rows,
+                          (left, top - num_rows * height, left + num_cols * width, top))
+
+
+def _cell_centers(area, rows):
+    """
+    :param area: pyresample AreaDefinition
+    :param rows: slice of area rows
+    :return: x, y projection coordinate arrays of the cell centers in those rows
+    """
+    ll_x, _, _, ur_y = area.area_extent
+    cols = area.shape[1]
+    x = ll_x + (np.arange(cols) + 0.5) * area.pixel_size_x
+    y = ur_y - (np.arange(rows.start, rows.stop) + 0.5) * area.pixel_size_y
+    return np.meshgrid(x, y)
+
+
+def source_positions(source_area, target_area, rows):
+    """
+    fractional (row, column) in the source area of each target cell center in a block of target rows
+    cells outside the source projection's domain come back as NaN
+    :param source_area: AreaDefinition of the data
+    :param target_area: AreaDefinition of the grid to resample to
+    :param rows: slice of target rows
+    :return: row, column float64 arrays
+    """
+    src = cached_proj(getattr(source_area, 'proj_str', None) or source_area.proj4_string)
+    dst = cached_proj(getattr(target_area, 'proj_str', None) or target_area.proj4_string)
+    x, y = _cell_centers(target_area, rows)
+    lon, lat = dst(x, y, inverse=True)
+    sx, sy = src(lon, lat)
+    sx, sy = np.asarray(sx, dtype=np.float64), np.asarray(sy, dtype=np.float64)
+    # off-earth points come back as inf or 1e30 depending on the proj version
+    bad = ~np.isfinite(sx) | ~np.isfinite(sy) | (np.abs(sx) >= 1e30) | (np.abs(sy) >= 1e30)
+    ll_x, _, _, ur_y = source_area.area_extent
+    col = (sx - ll_x) / source_area.pixel_size_x - 0.5
+    row = (ur_y - sy) / source_area.pixel_size_y - 0.5
+    col[bad] = np.nan
+    row[bad] = np.nan
+    return row, col
+
+
+def nearest_lut(row, col, source_shape):
+    """
+    :return: flat source index of the nearest cell, -1 where the target cell is outside the source
+    """
+    src_rows, src_cols = source_shape
+    with np.errstate(invalid='ignore'):
+        r = np.floor(row + 0.5)
+        c = np.floor(col + 0.5)
+        bad = ~((r >= 0) & (r < src_rows) & (c >= 0) & (c < src_cols))
+    index = np.where(bad, 0, r * src_cols + c).astype(np.int64)
+    index[bad] = -1
+    return index
+
+
+def bilinear_lut(row, col, source_shape):
+    """
+    :return: (flat source index of the upper-left of the four neighbors or -1, (rows, cols, 2) float32 row/column weights)
+    """
+    src_rows, src_cols = source_shape
+    with np.errstate(invalid='ignore'):
+        bad = ~((row >= -0.5) & (row <= src_rows - 0.5) & (col >= -0.5) & (col <= src_cols - 0.5))
+    row = np.where(bad, 0, np.clip(row, 0, max(0, src_rows - 1)))
+    col = np.where(bad, 0, np.clip(col, 0, max(0, src_cols - 1)))
+    # upper-left neighbor, kept one cell in from the last row/column so all four neighbors exist
+    r0 = np.minimum(np.floor(row), max(0, src_rows - 2))
+    c0 = np.minimum(np.floor(col), max(0, src_cols - 2))
+    index = (r0 * src_cols + c0).astype(np.int64)
+    index[bad] = -1
+    weights = np.empty(row.shape + (2,), dtype=np.float32)
+    weights[..., 0] = row - r0
+    weights[..., 1] = col - c0
+    return index, weights
+
+
+class ResampledArray(object):
+    """
+    read-only array-like presenting source data on a target grid through a lookup table
+    row slices are gathered on demand, so a reprojected operand never exists at full size
+    """
+    shape = None  # target (rows, cols)
+    dtype = None  # float, so cells outside the source can be NaN
+    ndim = 2
+
+    def __init__(self, data, method, index, weights=None):
+        self._flat = np.asarray(data).reshape(-1)
+        self._source_cols = data.shape[1]
+        self._method = method
+        self._index = index
+        self._weights = weights
+        self.shape = tuple(index.shape)
+        self.dtype = np.dtype(data.dtype) if np.issubdtype(data.dtype, np.floating) else np.dtype(np.float32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def __getitem__(self, rows):
+        if not isinstance(rows, slice):
+            raise TypeError("resampled content only supports row slices")
+        index = np.asarray(self._index[rows])
+        bad = index < 0
+        index = np.where(bad, 0, index)
+        if self._method == 'nearest':
+            out = self._flat[index].astype(self.dtype)
+        else:
+            weights = np.asarray(self._weights[rows])
+            wy, wx = weights[..., 0], weights[..., 1]
+            cols = self._source_cols
+            top = self._flat[index] * (1 - wx) + self._flat[index + 1] * wx
+            bottom = self._flat[index + cols] * (1 - wx) + self._flat[index + cols + 1] * wx
+            out = (top * (1 - wy) + bottom * wy).astype(self.dtype)
+        out[bad] = np.nan
+        return out
+
+
+class Resampler(object):
+    """
+    build, store and apply lookup tables for resampling between areas
+    tables live as .npy files in a directory of the workspace cache and are memory-mapped on use
+    """
+    directory = None  # where lookup tables are stored
+    _luts = None  # (source key, target key, method) -> (index, weights or None)
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._luts = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _paths(self, source_area, target_area, method):
+        stem = os.path.join(self.directory, '{}_{}_{}'.format(area_key(source_area), area_key(target_area), method))
+        return stem + '.index.npy', stem + '.weights.npy'
+
+    def lut(self, source_area, target_area, method='nearest'):
+        """
+        :param source_area: AreaDefinition of the data
+        :param target_area: AreaDefinition of the grid to resample to
+        :param method: 'nearest' or 'bilinear'
+        :return: (index, weights) memory-mapped lookup table, weights being None for nearest
+        """
+        if method not in METHODS:
+            raise ValueError("unknown resampling method {}".format(method))
+        key = (area_key(source_area), area_key(target_area), method)
+        lut = self._luts.get(key)
+        if lut is not None:
+            return lut
+        index_path, weights_path = self._paths(source_area, target_area, method)
+        if not os.path.exists(index_path) or (method == 'bilinear' and not os.path.exists(weights_path)):
+            self._build(source_area, target_area, method, index_path, weights_path)
+        index = np.load(index_path, mmap_mode='r')
+        weights = np.load(weights_path, mmap_mode='r') if method == 'bilinear' else None
+        self._luts[key] = lut = (index, weights)
+        return lut
+
+    def _build(self, source_area, target_area, method, index_path, weights_path):
+        LOG.info("building {} resampling table for {} to {}".format(method, area_key(source_area), area_key(target_area)))
+        rows = target_area.shape[0]
+        source_shape = tuple(source_area.shape)
+        # write to temporary names so an interrupted build never looks complete
+        index_tmp, weights_tmp = index_path + '.part', weights_path + '.part'
+        index = np.lib.format.open_memmap(index_tmp, mode='w+', dtype=np.int64, shape=tuple(target_area.shape))
+        weights = None
+        if method == 'bilinear':
+            weights = np.lib.format.open_memmap(weights_tmp, mode='w+', dtype=np.float32,
+                                                shape=tuple(target_area.shape) + (2,))
+        for start in range(0, rows, LUT_CHUNK_ROWS):
+            block = slice(start, min(rows, start + LUT_CHUNK_ROWS))
+            row, col = source_positions(source_area, target_area, block)
+            if method == 'nearest':
+                index[block] = nearest_lut(row, col, source_shape)
+            else:
+                index[block], weights[block] = bilinear_lut(row, col, source_shape)
+        index.flush()
+        del index
+        if weights is not None:
+            weights.flush()
+            del weights
+            os.replace(weights_tmp, weights_path)
+        os.replace(index_tmp, index_path)
+
+    def resample(self, data, source_area, target_area, method='nearest'):
+        """
+        :param data: 2D content array on source_area
+        :param source_area: AreaDefinition of the data
+        :param target_area: AreaDefinition of the grid to resample to
+        :param method: 'nearest' or 'bilinear'
+        :return: ResampledArray on target_area
+        """
+        index, weights = self.lut(source_area, target_area, method)
+        return ResampledArray(data, method, index, weights)
+
+
+class tests(unittest.TestCase):
+    def test_luts(self):
+        # a 2x2 source sampled at 4x4 target cell centers in the same index space
+        row, col = np.meshgrid(np.arange(4) / 2. - 0.25, np.arange(4) / 2. - 0.25, indexing='ij')
+        index = nearest_lut(row, col, (2, 2))
+        self.assertEqual(index[0, 0], 0)
+        self.assertEqual(index[3, 3], 3)
+        index, weights = bilinear_lut(row, col, (2, 2))
+        data = np.array([[0., 1.], [2., 3.]], dtype=np.float32)
+        out = ResampledArray(data, 'bilinear', index, weights)[0:4]
+        # a quarter of the way from cell (0, 0) toward (1, 1) on both axes
+        self.assertAlmostEqual(float(out[1, 1]), 0.75)
+        self.assertTrue(np.all(np.isfinite(out)))
+        self.assertTrue(np.all(np.isnan(ResampledArray(data, 'nearest', np.full((2, 2), -1), None)[0:2])))
+
+    def test_grids(self):
+        # a north-up grid of 10km cells whose values are their row numbers
+        eqc, merc = '+proj=eqc +datum=WGS84', '+proj=merc +datum=WGS84'
+        src = grid_area(eqc, 0., 500000., 10000., -10000., (100, 100))
+        data = np.repeat(np.arange(100, dtype=np.float32)[:, np.newaxis], 100, axis=1)
+        self.assertEqual(tuple(src.area_extent), (-5000., -495000., 995000., 505000.))
+        tmp = tempfile.mkdtemp()
+        try:
+            resampler = Resampler(tmp)
+            np.testing.assert_array_equal(resampler.resample(data, src, src)[:], data)
+            # upper-left cell center 5 cells south and 5 cells east of the source's
+            shifted = grid_area(eqc, 50000., 450000., 10000., -10000., (20, 20))
+            self.assertEqual(area_key(shifted),
+                             area_key(grid_area(eqc, 0., 500000., 10000., -10000., (100, 100),
+                                                slice(5, 25), slice(5, 25))))
+            for method in METHODS:
+                out = resampler.resample(data, src, shifted, method)[:]
+                np.testing.assert_allclose(out[:, 0], np.arange(5, 25))
+            # mercator rows still run southward and land on the source row holding their latitude
+            target = grid_area(merc, 100000., 400000., 10000., -10000., (30, 30))
+            out = resampler.resample(data, src, target)[:]
+            self.assertTrue(np.all(np.diff(out[:, 0]) >= 0))
+            self.assertGreater(out[-1, 0] - out[0, 0], 25)
+            lon, lat = cached_proj(merc)(100000., 300000., inverse=True)
+            _, y = cached_proj(eqc)(lon, lat)
+            self.assertEqual(float(out[10, 0]), np.floor((505000. - y) / 10000.))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
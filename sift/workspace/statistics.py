@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+statistics.py
+~~~~~~~~~~~~~
+
+PURPOSE
+Streaming summary statistics and histograms over content too large to hold at once.
+
+Accumulators take data a chunk at a time and can be read at any point,
+so a display can show early results while the rest of the data streams in.
+Histograms keep a fixed number of bins; when a chunk falls outside the current range,
+the range doubles by merging neighboring bins, so earlier chunks never need to be revisited.
+
+TileStatistics is written by importers next to the content: min, max, count, sum, sum of squares
+and a coarse histogram for every tile, plus coarser levels made by merging 2x2 tiles.
+Region summaries, histograms and percentiles then come from a few hundred tiles instead of the full array,
+at the precision of whole tiles and histogram bins.
+
+REFERENCES
+
+
+REQUIRES
+numpy
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+__author__ = 'rayg'
+__docformat__ = 'reStructuredText'
+
+import logging
+import unittest
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_BINS = 100
+STATS_TILE_SHAPE = (256, 256)  # content cells summarized by each level 0 tile
+STATS_BINS = 64  # coarse histogram bins per tile
+STATS_QUERY_TILES = 1024  # queries use the finest level covering the region in at most this many tiles
+
+
+class SummaryStatistics(object):
+    """
+    count, sum, sum of squares, minimum and maximum of the finite values seen so far
+    """
+    count = 0
+    total = 0.
+    total_sq = 0.
+    minimum = np.nan
+    maximum = np.nan
+
+    def add(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        data = data[np.isfinite(data)]
+        if not data.size:
+            return
+        lo, hi = float(data.min()), float(data.max())
+        self.minimum = lo if not self.count else min(self.minimum, lo)
+        self.maximum = hi if not self.count else max(self.maximum, hi)
+        self.count += data.size
+        self.total += float(data.sum())
+        self.total_sq += float(np.dot(data, data))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        if not self.count:
+            return np.nan
+        mean = self.mean
+        return float(np.sqrt(max(0., self.total_sq / self.count - mean * mean)))
+
+
+class StreamingHistogram(object):
+    """
+    N-dimensional histogram with a fixed bin count per axis and a range that grows to fit the data
+    values are given as one array per axis; cells where any axis is not finite are skipped
+    """
+    counts = None  # bins-shaped int64 array
+    ranges = None  # list of [lo, hi] per axis, None until the first data arrives
+
+    def __init__(self, bins=DEFAULT_BINS, ndim=1, ranges=None):
+        """
+        :param bins: bins per axis; kept even so neighbors can always be merged in pairs
+        :param ndim: number of axes
+        :param ranges: optional initial [(lo, hi), ...] per axis, e.g. from a coarse pass over the same data
+        """
+        bins = bins + (bins % 2)
+        self.counts = np.zeros((bins,) * ndim, dtype=np.int64)
+        self.ranges = None if ranges is None else [[float(lo), float(hi)] for lo, hi in ranges]
+
+    @property
+    def edges(self):
+        """
+        :return: list of bin edge arrays per axis
+        """
+        return [np.linspace(lo, hi, n + 1) for (lo, hi), n in zip(self.ranges, self.counts.shape)]
+
+    def _grow(self, axis, upward):
+        # merge neighboring bins in pairs so the same bin count spans twice the range
+        counts = np.moveaxis(self.counts, axis, 0)
+        n = counts.shape[0]
+        merged = counts[0::2] + counts[1::2]
+        grown = np.zeros_like(counts)
+        lo, hi = self.ranges[axis]
+        if upward:
+            grown[:n // 2] = merged
+            self.ranges[axis] = [lo, hi + (hi - lo)]
+        else:
+            grown[n // 2:] = merged
+            self.ranges[axis] = [lo - (hi - lo), hi]
+        self.counts = np.moveaxis(grown, 0, axis)
+
+    def add(self, *values):
+        """
+        :param values: one array of values per axis, all the same shape
+        """
+        values = [np.asarray(v, dtype=np.float64).ravel() for v in values]
+        good = np.ones(values[0].shape, dtype=np.bool_)
+        for v in values:
+            good &= np.isfinite(v)
+        values = [v[good] for v in values]
+        if not values[0].size:
+            return
+        if self.ranges is None:
+            self.ranges = [[float(v.min()), float(v.max())] for v in values]
+        for axis, v in enumerate(values):
+            lo, hi = self.ranges[axis]
+            if hi <= lo:
+                # degenerate range from constant data; give it some width to grow from
+                self.ranges[axis] = [lo, lo + max(abs(lo) * 1e-6, 1e-12)]
+            vmin, vmax = float(v.min()), float(v.max())
+            while vmin < self.ranges[axis][0]:
+                self._grow(axis, upward=False)
+            while vmax > self.ranges[axis][1]:
+                self._grow(axis, upward=True)
+        if len(values) == 1:
+            counts, _ = np.histogram(values[0], bins=self.counts.shape[0], range=self.ranges[0])
+        else:
+            counts, _ = np.histogramdd(np.column_stack(values), bins=self.counts.shape, range=self.ranges)
+        self.counts += counts.astype(np.int64)
+
+
+class TileStatistics(object):
+    """
+    per-tile statistics of a 2D content array, at level 0 one tile per tile_shape block of content,
+    and at level n one tile per 2**n x 2**n level 0 tiles
+    every level is a dict of arrays indexed [tile row, tile column]:
+    min, max (NaN for tiles without valid data), count, sum, sumsq, and hist[..., bin] over the shared edges
+    """
+    FIELDS = ('min', 'max', 'count', 'sum', 'sumsq', 'hist')
+    tile_shape = None
+    shape = None  # (rows, cols) of the content
+    edges = None  # histogram bin edges shared by all tiles; values outside land in the end bins
+    levels = None  # list of dicts of arrays, finest first
+
+    def __init__(self, tile_shape, shape, edges, levels):
+        self.tile_shape = tuple(tile_shape)
+        self.shape = tuple(shape)
+        self.edges = edges
+        self.levels = levels
+
+    @classmethod
+    def from_data(cls, data, tile_shape=STATS_TILE_SHAPE, bins=STATS_BINS, value_range=None):
+        """
+        :param data: 2D content array, typically a memmap; read one band of tile rows at a time
+        :param tile_shape: (rows, cols) of level 0 tiles
+        :param bins: histogram bins per tile
+        :param value_range: (lo, hi) for the histogram bins, e.g. the product's valid range;
+                            found with an extra pass over the data if not given
+        """
+        rows, cols = data.shape[:2]
+        th, tw = tile_shape
+        ty, tx = (rows + th - 1) // th, (cols + tw - 1) // tw
+        if value_range is None:
+            lo, hi = np.inf, -np.inf
+            for r in range(0, rows, th):
+                block = np.asarray(data[r:r + th], dtype=np.float64)
+                block = block[np.isfinite(block)]
+                if block.size:
+                    lo, hi = min(lo, block.min()), max(hi, block.max())
+            value_range = (lo, hi) if lo <= hi else (0., 1.)
+        lo, hi = float(value_range[0]), float(value_range[1])
+        if hi <= lo:
+            hi = lo + max(abs(lo) * 1e-6, 1e-12)
+        edges = np.linspace(lo, hi, bins + 1)
+        level = dict(min=np.full((ty, tx), np.nan), max=np.full((ty, tx), np.nan),
+                     count=np.zeros((ty, tx), dtype=np.int64), sum=np.zeros((ty, tx)), sumsq=np.zeros((ty, tx)),
+                     hist=np.zeros((ty, tx, bins), dtype=np.int64))
+        for iy in range(ty):
+            band = np.asarray(data[iy * th:(iy + 1) * th], dtype=np.float64)
+            for ix in range(tx):
+                tile = band[:, ix * tw:(ix + 1) * tw]
+                tile = tile[np.isfinite(tile)]
+                if not tile.size:
+                    continue
+                level['min'][iy, ix], level['max'][iy, ix] = tile.min(), tile.max()
+                level['count'][iy, ix] = tile.size
+                level['sum'][iy, ix] = tile.sum()
+                level['sumsq'][iy, ix] = np.dot(tile, tile)
+                level['hist'][iy, ix], _ = np.histogram(np.clip(tile, lo, hi), bins=edges)
+        levels = [level]
+        while level['count'].shape[0] > 1 or level['count'].shape[1] > 1:
+            level = cls._merge(level)
+            levels.append(level)
+        return cls(tile_shape, (rows, cols), edges, levels)
+
+    @staticmethod
+    def _merge(level):
+        # combine 2x2 tiles, padding odd edges with empty tiles
+        ty, tx = level['count'].shape
+        py, px = ty % 2, tx % 2
+        merged = {}
+        for name, arr in level.items():
+            pad = [(0, py), (0, px)] + [(0, 0)] * (arr.ndim - 2)
+            fill = np.nan if name in ('min', 'max') else 0
+            arr = np.pad(arr, pad, mode='constant', constant_values=fill)
+            quads = [arr[0::2, 0::2], arr[0::2, 1::2], arr[1::2, 0::2], arr[1::2, 1::2]]
+            if name in ('min', 'max'):
+                fn = np.fmin if name == 'min' else np.fmax
+                merged[name] = fn(fn(quads[0], quads[1]), fn(quads[2], quads[3]))
+            else:
+                merged[name] = quads[0] + quads[1] + quads[2] + quads[3]
+        return merged
+
+    def save(self, path):
+        arrays = dict(tile_shape=np.array(self.tile_shape), shape=np.array(self.shape), edges=self.edges)
+        for n, level in enumerate(self.levels):
+            for name in self.FIELDS:
+                arrays['{}{}'.format(name, n)] = level[name]
+        with open(path, 'wb') as fp:
+            np.savez(fp, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            levels = []
+            while 'count{}'.format(len(levels)) in npz:
+                n = len(levels)
+                levels.append(dict((name, npz['{}{}'.format(name, n)]) for name in cls.FIELDS))
+            return cls(npz['tile_shape'], npz['shape'], npz['edges'], levels)
+
+    def _tiles(self, rows=None, cols=None):
+        """
+        :param rows: slice of content rows, None for all
+        :param cols: slice of content columns, None for all
+        :return: dict of arrays for the tiles touching the region, from the finest level with few enough tiles
+        """
+        rows = slice(*(rows or slice(None)).indices(self.shape[0]))
+        cols = slice(*(cols or slice(None)).indices(self.shape[1]))
+        for n, level in enumerate(self.levels):
+            th, tw = self.tile_shape[0] << n, self.tile_shape[1] << n
+            r0, r1 = rows.start // th, max(rows.start // th + 1, (rows.stop + th - 1) // th)
+            c0, c1 = cols.start // tw, max(cols.start // tw + 1, (cols.stop + tw - 1) // tw)
+            if (r1 - r0) * (c1 - c0) <= STATS_QUERY_TILES or n == len(self.levels) - 1:
+                return dict((name, arr[r0:r1, c0:c1]) for name, arr in level.items())
+
+    def summary(self, rows=None, cols=None):
+        """
+        :return: SummaryStatistics of the tiles touching the region
+        """
+        tiles = self._tiles(rows, cols)
+        stats = SummaryStatistics()
+        stats.count = int(tiles['count'].sum())
+        if stats.count:
+            stats.total = float(tiles['sum'].sum())
+            stats.total_sq = float(tiles['sumsq'].sum())
+            stats.minimum = float(np.nanmin(tiles['min']))
+            stats.maximum = float(np.nanmax(tiles['max']))
+        return stats
+
+    def valid_fraction(self, rows=None, cols=None):
+        """
+        :return: fraction of content cells with finite values, over the whole content if no region is given
+        """
+        if rows is None and cols is None:
+            return float(self.levels[-1]['count'].sum()) / max(1, self.shape[0] * self.shape[1])
+        rows = slice(*(rows or slice(None)).indices(self.shape[0]))
+        cols = slice(*(cols or slice(None)).indices(self.shape[1]))
+        cells = max(1, (rows.stop - rows.start) * (cols.stop - cols.start))
+        return min(1., float(self._tiles(rows, cols)['count'].sum()) / cells)
+
+    def histogram(self, rows=None, cols=None):
+        """
+        :return: (counts, edges) of the tiles touching the region
+        """
+        return self._tiles(rows, cols)['hist'].sum(axis=(0, 1)), self.edges
+
+    def percentiles(self, q, rows=None, cols=None):
+        """
+        :param q: sequence of percentiles 0..100
+        :return: values interpolated within the histogram bins, NaN if there is no valid data
+        """
+        counts, edges = self.histogram(rows, cols)
+        total = counts.sum()
+        if not total:
+            return [np.nan for _ in q]
+        cumulative = np.concatenate([[0], np.cumsum(counts)]) / float(total)
+        return [float(np.interp(p / 100., cumulative, edges)) for p in q]
+
+
+class tests(unittest.TestCase):
+    def test_streaming_matches_whole(self):
+        data = np.random.randn(10000)
+        stats, hist = SummaryStatistics(), StreamingHistogram(bins=10, ranges=[(-0.5, 0.5)])
+        for chunk in np.array_split(data, 7):
+            stats.add(chunk)
+            hist.add(chunk)
+        self.assertEqual(stats.count, data.size)
+        self.assertAlmostEqual(stats.mean, data.mean())
+        self.assertAlmostEqual(stats.std, data.std())
+        self.assertEqual(hist.counts.sum(), data.size)
+        lo, hi = hist.ranges[0]
+        self.assertTrue(lo <= data.min() and data.max() <= hi)
+        expected, _ = np.histogram(data, bins=10, range=(lo, hi))
+        self.assertTrue(np.array_equal(hist.counts, expected))
+
+    def test_2d(self):
+        x, y = np.random.rand(500), np.random.rand(500) * 10.
+        x[3] = np.nan
+        hist = StreamingHistogram(bins=8, ndim=2)
+        hist.add(x[:100], y[:100])
+        hist.add(x[100:], y[100:])
+        self.assertEqual(hist.counts.sum(), 499)
+
+
+    def test_tile_statistics(self):
+        import os
+        import tempfile
+        data = np.random.rand(100, 70).astype(np.float32)
+        data[:10, :10] = np.nan
+        stats = TileStatistics.from_data(data, tile_shape=(16, 16), bins=20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.stats.npz')
+            stats.save(path)
+            stats = TileStatistics.load(path)
+        whole = stats.summary()
+        self.assertEqual(whole.count, np.isfinite(data).sum())
+        self.assertAlmostEqual(whole.mean, float(np.nanmean(data)), places=5)
+        self.assertAlmostEqual(whole.maximum, float(np.nanmax(data)), places=6)
+        self.assertAlmostEqual(stats.valid_fraction(), (7000. - 100.) / 7000.)
+        # a region on tile boundaries is exact
+        region = stats.summary(slice(16, 48), slice(32, 64))
+        self.assertAlmostEqual(region.mean, float(data[16:48, 32:64].mean()), places=5)
+        lo, hi = stats.percentiles([0, 100])
+        self.assertAlmostEqual(lo, whole.minimum, places=5)
+        self.assertAlmostEqual(hi, whole.maximum, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
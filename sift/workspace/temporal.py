@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+temporal.py
+~~~~~~~~~~~
+
+PURPOSE
+Per-pixel reductions over a time series of products on the same grid.
+
+The output is split into tiles which are reduced independently on a thread pool.
+Each tile streams through the time series one product at a time, keeping only running accumulators,
+so memory depends on the tile size and worker count rather than the length of the series.
+Mean and standard deviation use Welford's update, which stays accurate for long series.
+
+REFERENCES
+https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Welford's_online_algorithm
+
+REQUIRES
+numpy
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+__author__ = 'rayg'
+__docformat__ = 'reStructuredText'
+
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TILE_SHAPE = (512, 512)
+DEFAULT_WORKERS = 4
+
+# reduction name -> numpy expression over the stacked series, recorded with the product as provenance
+REDUCTIONS = {
+    'mean': 'np.nanmean(np.array([{}]), axis=0)',
+    'max': 'np.nanmax(np.array([{}]), axis=0)',
+    'min': 'np.nanmin(np.array([{}]), axis=0)',
+    'count': 'np.isfinite(np.array([{}])).sum(axis=0).astype(np.float32)',
+    'std': 'np.nanstd(np.array([{}]), axis=0)',
+}
+
+
+def reduction_code(reduction, names):
+    """
+    :param reduction: key of REDUCTIONS
+    :param names: operand variable names in time order
+    :return: algebraic layer code which recalculates the reduction in one piece
+    """
+    return 'result = ' + REDUCTIONS[reduction].format(', '.join(names))
+
+
+def tile_slices(shape, tile_shape=DEFAULT_TILE_SHAPE):
+    """
+    :param shape: (rows, cols) of the output
+    :param tile_shape: (rows, cols) of each tile
+    :return: list of (row slice, column slice)
+    """
+    rows, cols = shape[:2]
+    tr, tc = tile_shape
+    return [(slice(r, min(rows, r + tr)), slice(c, min(cols, c + tc)))
+            for r in range(0, rows, tr) for c in range(0, cols, tc)]
+
+
+def reduce_tile(series, tile, reduction):
+    """
+    :param series: sequence of 2D arrays in time order, all the same shape
+    :param tile: (row slice, column slice) to reduce
+    :param reduction: key of REDUCTIONS
+    :return: float32 result for the tile, NaN where no product has a valid value (0 for count)
+    """
+    shape = tuple(s.stop - s.start for s in tile)
+    count = np.zeros(shape, dtype=np.int32)
+    if reduction in ('mean', 'std'):
+        mean = np.zeros(shape, dtype=np.float64)
+        m2 = np.zeros(shape, dtype=np.float64)
+    elif reduction == 'min':
+        acc = np.full(shape, np.inf, dtype=np.float64)
+    elif reduction == 'max':
+        acc = np.full(shape, -np.inf, dtype=np.float64)
+    for data in series:
+        block = np.asarray(data[tile], dtype=np.float64)
+        valid = np.isfinite(block)
+        count += valid
+        if reduction in ('mean', 'std'):
+            block = np.where(valid, block, 0.)
+            delta = np.where(valid, block - mean, 0.)
+            mean += delta / np.maximum(count, 1)
+            m2 += delta * np.where(valid, block - mean, 0.)
+        elif reduction == 'min':
+            np.fmin(acc, block, out=acc)
+        elif reduction == 'max':
+            np.fmax(acc, block, out=acc)
+    if reduction == 'count':
+        return count.astype(np.float32)
+    if reduction == 'mean':
+        result = mean
+    elif reduction == 'std':
+        result = np.sqrt(m2 / np.maximum(count, 1))
+    else:
+        result = acc
+    return np.where(count > 0, result, np.nan).astype(np.float32)
+
+
+def iter_reduce_tiles(series, reduction, shape, tile_shape=DEFAULT_TILE_SHAPE, workers=DEFAULT_WORKERS):
+    """
+    reduce every tile of the output on a thread pool
+    only a couple of tiles per worker are queued at a time, so closing the generator early abandons the rest
+    :param series: sequence of 2D arrays in time order, all of shape
+    :param reduction: key of REDUCTIONS
+    :param shape: (rows, cols) of the arrays
+    :param tile_shape: (rows, cols) of each tile
+    :param workers: threads reducing tiles concurrently
+    :return: generator of (tile, result block, fraction of tiles done) in completion order
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError("unknown temporal reduction {}".format(reduction))
+    tiles = tile_slices(shape, tile_shape)
+    pending = iter(tiles)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+    done = 0
+    try:
+        while True:
+            while len(futures) < workers * 2:
+                tile = next(pending, None)
+                if tile is None:
+                    break
+                futures[pool.submit(reduce_tile, series, tile, reduction)] = tile
+            if not futures:
+                break
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done += 1
+                yield futures.pop(future), future.result(), float(done) / len(tiles)
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+class tests(unittest.TestCase):
+    def test_reductions(self):
+        series = [np.random.rand(5, 7).astype(np.float32) for _ in range(4)]
+        series[1][2, 3] = np.nan
+        for reduction in REDUCTIONS:
+            out = np.empty((5, 7), dtype=np.float32)
+            for tile, block, _ in iter_reduce_tiles(series, reduction, (5, 7), tile_shape=(2, 3), workers=2):
+                out[tile] = block
+            namespace = dict(('t{}'.format(idx), data) for idx, data in enumerate(series))
+            exec(reduction_code(reduction, sorted(namespace.keys())), {'np': np}, namespace)
+            self.assertTrue(np.allclose(out, namespace['result'], atol=1e-5), reduction)
+
+    def test_close_early(self):
+        # closing the generator leaves the remaining tiles unreduced
+        class Counted(object):
+            reads = 0
+
+            def __getitem__(self, tile):
+                Counted.reads += 1
+                return np.ones(tuple(s.stop - s.start for s in tile), dtype=np.float32)
+
+        zult = iter_reduce_tiles([Counted()], 'mean', (64, 64), tile_shape=(1, 1), workers=2)
+        next(zult)
+        zult.close()
+        self.assertLessEqual(Counted.reads, 2 * 2 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
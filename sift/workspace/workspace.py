@@ -49,6 +49,9 @@ import sys
 import unittest
 import time
 import enum
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from uuid import UUID, uuid1 as uuidgen
 from typing import Mapping, Set, List, Iterable, Generator, Tuple, Dict
@@ -57,15 +60,20 @@ from collections import Mapping as ReadOnlyMapping, defaultdict, OrderedDict
 import numba as nb
 import numpy as np
 from PyQt4.QtCore import QObject, pyqtSignal
-from pyproj import Proj
 from rasterio import Affine
 from shapely.geometry.polygon import LinearRing
 from sqlalchemy.orm.exc import NoResultFound
 
-from sift.common import INFO, KIND, flags, STATE
+from sift.common import INFO, KIND, flags, STATE, cached_proj
 from sift.queue import TaskQueue, TASK_PROGRESS, TASK_DOING
-from sift.model.shapes import content_within_shape
-from .metadatabase import Metadatabase, Content, Product, Resource
+from sift.model.shapes import iter_content_within_shape, rasterize_shape_mask, shape_stride
+from .metadatabase import Metadatabase, Content, Product, ProductKeyValue, Resource
+from .algebraic import parse_operations, fuse_operations, evaluate_chunks, valid_range, result_key, resolution_factors
+from .resample import Resampler, grid_area
+from .temporal import REDUCTIONS, iter_reduce_tiles, reduction_code
+from .navigation import navigate
+from .statistics import SummaryStatistics, TileStatistics
+from .matrix import DataAdjacencyMatrix, SYNC_CHUNK
 from .importer import aImporter, GeoTiffImporter, GoesRPUGImporter, SatPyImporter, generate_guidebook_metadata
 
 LOG = logging.getLogger(__name__)
@@ -75,6 +83,19 @@ MIN_WORKSPACE_SIZE = 8
 
 IMPORT_CLASSES = [GeoTiffImporter, GoesRPUGImporter]
 
+AUTO_CLIM_PERCENTILES = (2., 98.)  # default stretch for auto_clims
+REGION_OVERVIEW_CELLS = 256 * 256  # cells sampled by the coarse pass over a polygon
+REGION_CHUNK_ROWS = 256  # content rows gathered at a time inside a polygon
+GRID_CACHE_SIZE = 256  # products whose grid metadata and affine are kept for probing
+SERIES_WORKERS = 4  # threads probing frames of a time series
+IMPORT_WORKERS = 4  # threads importing content of independent products
+MASK_CACHE_SIZE = 32  # polygon masks kept for reuse across products on the same grid
+MASK_CACHE_BYTES = 64 * 1024 * 1024  # and at most this much memory in bitmasks
+THUMBNAIL_ROWS = 64  # most rows of overview content returned for a thumbnail
+
+# metadata describing the grid a product is on
+GRID_KEYS = (INFO.PROJ, INFO.ORIGIN_X, INFO.ORIGIN_Y, INFO.CELL_WIDTH, INFO.CELL_HEIGHT, INFO.SHAPE)
+
 
 # first instance is main singleton instance; don't preclude the possibility of importing from another workspace later on
 TheWorkspace = None
@@ -132,6 +153,8 @@ class ActiveContent(QObject):
     _mask = None
     _coverage = None
     _sparsity = None
+    _stats_path = None  # per-tile statistics sidecar, loaded on first use
+    _stats = None
 
     def __init__(self, workspace_cwd: str, C: Content):
         super(ActiveContent, self).__init__()
@@ -181,6 +204,28 @@ class ActiveContent(QObject):
         path = os.path.join(wsd, c.path)
         return os.access(path, os.R_OK) and (os.stat(path).st_size > 0)
 
+    @property
+    def navigation(self):
+        """
+        Returns: (longitude, latitude) navigation arrays, or None if the content wasn't imported with navigation
+        """
+        if self._x is None or self._y is None:
+            return None
+        return self._x, self._y
+
+    @property
+    def statistics(self):
+        """
+        Returns: TileStatistics of the content, or None if the content wasn't imported with statistics
+        """
+        if self._stats is None and self._stats_path is not None:
+            try:
+                self._stats = TileStatistics.load(self._stats_path)
+            except (OSError, ValueError, KeyError):
+                LOG.warning("unable to load statistics from {}".format(self._stats_path), exc_info=True)
+                self._stats_path = None
+        return self._stats
+
     @property
     def data(self):
         """
@@ -220,10 +265,20 @@ class ActiveContent(QObject):
                 return None
             return np.memmap(full_path, *args, **kwargs)
 
+        def nav(path):
+            # navigation arrays are .npy files, possibly at reduced resolution, see navigation.py
+            full_path = os.path.join(self._wsd, path)
+            if not os.access(full_path, os.R_OK):
+                LOG.warning("unable to find {}".format(full_path))
+                return None
+            return np.load(full_path, mmap_mode='r')
+
         self._data = mm(c.path, dtype=c.dtype or np.float32, mode=mode, shape=shape)  # potentially very very large
-        self._y = mm(c.y_path, dtype=c.dtype or np.float32, mode=mode, shape=shape) if c.y_path else None
-        self._x = mm(c.x_path, dtype=c.dtype or np.float32, mode=mode, shape=shape) if c.x_path else None
-        self._z = mm(c.z_path, dtype=c.dtype or np.float32, mode=mode, shape=shape) if c.z_path else None
+        self._y = nav(c.y_path) if c.y_path else None
+        self._x = nav(c.x_path) if c.x_path else None
+        self._z = nav(c.z_path) if c.z_path else None
+        stats_path = c.info.get(INFO.STATS_PATH)
+        self._stats_path = os.path.join(self._wsd, stats_path) if stats_path else None
 
         _, cshape = self._rcls(c.coverage_cols, c.coverage_cols, c.coverage_levels)
         self._coverage = mm(c.coverage_path, dtype=np.int8, mode=mode, shape=cshape) if c.coverage_path else np.array([1])
@@ -233,6 +288,21 @@ class ActiveContent(QObject):
         self._update_mask()
 
 
+class CoordinateMask(tuple):
+    """
+    (latitude, longitude) arrays of the cells a polygon selects, as returned by Workspace.get_coordinate_mask_polygon
+    also remembers the grid and cell indices they came from, so layers on a related grid can index directly
+    """
+    grid = None  # info of the product the mask was made on
+    index = None  # (rows, cols) index arrays into that product
+
+    def __new__(cls, lat, lon, grid=None, index=None):
+        self = super(CoordinateMask, cls).__new__(cls, (lat, lon))
+        self.grid = grid
+        self.index = index
+        return self
+
+
 class Workspace(QObject):
     """
     Workspace is a singleton object which works with Datasets shall:
@@ -255,6 +325,7 @@ class Workspace(QObject):
     # _importers = None  # list of importers to consult when asked to start an import
     _available: Mapping[int, ActiveContent] = None  # dictionary of {Content.id : ActiveContent object}
     _inventory: Metadatabase = None  # metadatabase instance, sqlalchemy
+    matrix: DataAdjacencyMatrix = None  # in-memory track x time index of the metadatabase products
     _inventory_path = None  # filename to store and load inventory information (simple cache)
     _tempdir = None  # TemporaryDirectory, if it's needed (i.e. a directory name was not given)
     _max_size_gb = None  # maximum size in gigabytes of flat files we cache in the workspace
@@ -275,25 +346,49 @@ class Workspace(QObject):
     def set_product_state_flag(self, uuid: UUID, flag):
         """primarily used by Importers to signal work in progress
         """
-        state = self._state[uuid]
-        state.add(flag)
-        self.didChangeProductState.emit(uuid, state)
+        self._state[uuid].add(flag)
+        self._product_state_changed(uuid)
 
     def clear_product_state_flag(self, uuid: UUID, flag):
-        state = self._state[uuid]
-        state.remove(flag)
-        self.didChangeProductState.emit(uuid, state)
+        self._state[uuid].remove(flag)
+        self._product_state_changed(uuid)
+
+    def _product_state_changed(self, uuid: UUID):
+        """push the merged state of a product to listeners, so they need not query it again
+        """
+        self.didChangeProductState.emit(uuid, self.product_state(uuid))
 
     def product_state(self, uuid: UUID) -> flags:
-        state = flags(self._state[uuid])
-        # add any derived information
-        if uuid in self._available:
-            state.add(STATE.ATTACHED)
+        return self.product_states([uuid])[uuid]
+
+    def product_states(self, uuids: Iterable[UUID] = None) -> Dict[UUID, flags]:
+        """state flags for many products at once, from a single pass over products joined to their content
+        :param uuids: products of interest, default every product in the metadatabase
+        :return: {uuid: flags}
+        """
+        que_fields = (Product.uuid_str, Content.id)
         with self._inventory as s:
-            ncontent = s.query(Content).filter_by(uuid=uuid).count()
-        if ncontent > 0:
-            state.add(STATE.CACHED)
-        return state
+            if uuids is None:
+                rows = s.query(*que_fields).outerjoin(Product.content).all()
+                states = {}
+            else:
+                uuids = list(uuids)
+                states = dict((uuid, flags(self._state.get(uuid, ()))) for uuid in uuids)
+                rows = []
+                for dex in range(0, len(uuids), SYNC_CHUNK):
+                    chunk = [str(u) for u in uuids[dex:dex + SYNC_CHUNK]]
+                    rows += s.query(*que_fields).outerjoin(Product.content).filter(Product.uuid_str.in_(chunk)).all()
+        for uuid_str, content_id in rows:
+            uuid = UUID(uuid_str)
+            state = states.get(uuid)
+            if state is None:
+                state = states[uuid] = flags(self._state.get(uuid, ()))
+            # add any derived information
+            if content_id is not None:
+                state.add(STATE.CACHED)
+                if content_id in self._available:
+                    state.add(STATE.ATTACHED)
+        return states
 
     @property
     def _S(self):
@@ -356,7 +451,15 @@ class Workspace(QObject):
 
         self._available = {}
         self._importers = [x for x in IMPORT_CLASSES]
+        self._resampler = None  # created on first use, see resampler
+        self._grids = {}  # uuid -> (info, Affine), see _layer_grid
+        self._masks = {}  # (polygon hash, grid, stride) -> ShapeMask, see polygon_mask
+        self._cache_lock = threading.RLock()  # guards _grids, _masks and _computing across probe threads
+        self._computing = {}  # (cache id, key) -> Future of a value being computed, see _compute_once
         self._state = defaultdict(flags)
+        self.matrix = DataAdjacencyMatrix(self._inventory)
+        self.didUpdateProductsMetadata.connect(self.matrix.sync)
+        self.matrix.sync()
         global TheWorkspace  # singleton
         if TheWorkspace is None:
             TheWorkspace = self
@@ -484,7 +587,8 @@ class Workspace(QObject):
 
     def _remove_content_files_from_workspace(self, c: Content ):
         total = 0
-        for filename in [c.path, c.coverage_path, c.sparsity_path]:
+        for filename in [c.path, c.coverage_path, c.sparsity_path, c.x_path, c.y_path, c.z_path,
+                         c.info.get(INFO.STATS_PATH)]:
             if not filename:
                 continue
             pn = os.path.join(self.cache_dir, filename)
@@ -502,6 +606,7 @@ class Workspace(QObject):
         self._available[c.id] = zult = ActiveContent(self.cache_dir, c)
         c.touch()
         c.product.touch()
+        self._product_state_changed(c.product.uuid)
         return zult
 
     def _cached_arrays_for_content(self, c:Content):
@@ -517,8 +622,9 @@ class Workspace(QObject):
     def _deactivate_content_for_product(self, p:Product):
         if p is None:
             return
-        for c in p.content:
-            self._available.pop(c.id, None)
+        detached = [self._available.pop(c.id, None) for c in p.content]
+        if any(ac is not None for ac in detached):
+            self._product_state_changed(p.uuid)
 
 
     #
@@ -758,6 +864,12 @@ class Workspace(QObject):
                     s.delete(con)
                 if also_products:
                     s.delete(prod)
+                    with self._cache_lock:
+                        self._grids.pop(uuid, None)
+            if not also_products:
+                self._product_state_changed(uuid)
+        if also_products:
+            self.matrix.discard(uuids)
         return total
 
     def _clean_cache(self):
@@ -889,13 +1001,17 @@ class Workspace(QObject):
                     importers.append(hauler)
                     num_products += hauler.num_products
 
+            merged = []
             for hauler in importers:
                 for prod in hauler.merge_products():
                     assert(prod is not None)
                     # merge the product into our database session, since it may belong to import_session
                     zult = frozendict(prod.info)  # self._S.merge(prod)
+                    merged.append(zult[INFO.UUID])
                     # LOG.debug('yielding product metadata for {}'.format(zult.get(INFO.DISPLAY_NAME, '?? unknown name ??')))
                     yield num_products, zult
+        # now that the products are committed
+        self.matrix.sync(merged)
 
     def import_product_content(self, uuid=None, prod=None, allow_cache=True, **importer_kwargs):
         with self._inventory as S:
@@ -903,16 +1019,16 @@ class Workspace(QObject):
             if prod is None and uuid is not None:
                 prod = self._product_with_uuid(S, uuid)
 
-            self.set_product_state_flag(prod.uuid, STATE.ARRIVING)
             default_prod_kind = prod.info[INFO.KIND]
 
             if len(prod.content):
                 LOG.info('product already has content available, using that rather than re-importing')
-                ovc = self._product_overview_content(S, uuid=uuid, kind=default_prod_kind)
+                ovc = self._product_overview_content(S, prod=prod, kind=default_prod_kind)
                 assert (ovc is not None)
                 arrays = self._cached_arrays_for_content(ovc)
                 return arrays.data
 
+            self.set_product_state_flag(prod.uuid, STATE.ARRIVING)
             truck = aImporter.from_product(prod, workspace_cwd=self.cache_dir, database_session=S, **importer_kwargs)
             metadata = prod.info
             name = metadata[INFO.SHORT_NAME]
@@ -939,6 +1055,46 @@ class Workspace(QObject):
         ac = self._overview_content_for_uuid(uuid, kind=default_prod_kind)
         return ac.data
 
+    def _import_product_group(self, uuids, **importer_kwargs):
+        """import content for products sharing resources one after another on this thread's metadatabase session"""
+        with self._inventory:
+            for uuid in uuids:
+                self.import_product_content(uuid, **importer_kwargs)
+        return uuids
+
+    def iter_import_product_contents(self, uuids, workers=IMPORT_WORKERS, **importer_kwargs):
+        """
+        import content for many products on a thread pool
+        products read from the same resources are imported in turn by one worker, so no two workers read one file;
+        importers still commit each Content as they create it, so workers wait on each other's writes to the metadatabase
+        closing the generator cancels products not yet started
+        :param uuids: products to import; those with content already are only attached
+        :param workers: threads importing concurrently
+        :return: generator of (uuid, fraction done) in completion order
+        """
+        uuids = list(uuids)
+        if not uuids:
+            return
+        groups = OrderedDict()
+        with self._inventory as s:
+            for dex in range(0, len(uuids), SYNC_CHUNK):
+                chunk = [str(u) for u in uuids[dex:dex + SYNC_CHUNK]]
+                for prod in s.query(Product).filter(Product.uuid_str.in_(chunk)).all():
+                    key = frozenset(r.id for r in prod.resource) or prod.uuid
+                    groups.setdefault(key, []).append(prod.uuid)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(self._import_product_group, group, **importer_kwargs) for group in groups.values()]
+        done = 0
+        try:
+            for future in as_completed(futures):
+                for uuid in future.result():
+                    done += 1
+                    yield uuid, float(done) / len(uuids)
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
     def create_composite(self, symbols:dict, relation:dict):
         """
         create a layer composite in the workspace
@@ -973,7 +1129,7 @@ class Workspace(QObject):
             zult.append(suffix)
         return ':'.join(zult)
 
-    def _get_composite_metadata(self, info, md_list, composite_array):
+    def _get_composite_metadata(self, info, md_list, composite_array, uuid=None):
         """Combine composite dependency metadata in a logical way.
 
         Args:
@@ -981,6 +1137,7 @@ class Workspace(QObject):
             md_list: list of metadata dictionaries for each input
             composite_array: array representing the final data values of the
                              composite for valid min/max calculations
+            uuid: UUID to give the composite, generated if not provided
 
         Returns: dict of overall metadata (same as `info`)
 
@@ -988,7 +1145,7 @@ class Workspace(QObject):
         if not all(x[INFO.PROJ] == md_list[0][INFO.PROJ] for x in md_list[1:]):
             raise ValueError("Algebraic inputs must all be the same projection")
 
-        uuid = uuidgen()
+        uuid = uuid or uuidgen()
         info[INFO.UUID] = uuid
         for k in (INFO.PLATFORM, INFO.INSTRUMENT, INFO.SCENE):
             if md_list[0].get(k) is None:
@@ -1001,7 +1158,7 @@ class Workspace(QObject):
         info.setdefault(INFO.UNITS, '1')
 
         max_meta = max(md_list, key=lambda x: x[INFO.SHAPE])
-        for k in (INFO.PROJ, INFO.ORIGIN_X, INFO.ORIGIN_Y, INFO.CELL_WIDTH, INFO.CELL_HEIGHT, INFO.SHAPE):
+        for k in GRID_KEYS:
             info[k] = max_meta[k]
 
         info[INFO.VALID_RANGE] = (np.nanmin(composite_array), np.nanmax(composite_array))
@@ -1024,16 +1181,40 @@ class Workspace(QObject):
         return info
 
     def create_algebraic_composite(self, operations, namespace, info=None):
-        if not info:
-            info = {}
+        """
+        calculate an algebraic layer and add it to the workspace as a new product
+        :param operations: python statements, the last of which assigns the result
+        :param namespace: {variable: uuid, } operands of the calculation
+        :param info: initial metadata for the new product
+        :return: uuid, info, data: uuid of the new product, its official read-only metadata, and cached content ndarray
+        """
+        status = {}
+        for status in self.iter_algebraic_composite(operations, namespace, info):
+            pass
+        return status['result']
 
-        import ast
-        try:
-            ops_ast = ast.parse(operations, mode='exec')
-            ops = compile(ast.parse(operations, mode='exec'), '<string>', 'exec')
-            result_name = ops_ast.body[-1].targets[0].id
-        except SyntaxError:
-            raise ValueError("Invalid syntax or operations in algebraic layer")
+    def iter_algebraic_composite(self, operations, namespace, info=None):
+        """
+        calculate an algebraic layer block by block, streaming the result into workspace content
+        so that peak memory is bounded by the chunk budget rather than the image size
+        :param operations: python statements, the last of which assigns the result
+        :param namespace: {variable: uuid, } operands of the calculation
+        :param info: initial metadata for the new product
+        :return: generator of progress dictionaries; the last one carries 'result': (uuid, info, data)
+        """
+        info = dict(info or {})
+
+        ops, result_name = parse_operations(operations)
+
+        # same expression over the same content versions: reuse the product we already calculated
+        versions = {n: self._content_version(u) for n, u in namespace.items() if isinstance(u, UUID)}
+        key = result_key(operations, namespace, versions, info)
+        cached = self._cached_algebraic_product(key)
+        if cached is not None:
+            LOG.info("reusing calculated product {} for algebraic layer".format(cached[0]))
+            yield {TASK_DOING: 'Calculating algebraic layer', TASK_PROGRESS: 1.0, 'result': cached}
+            return
+        info[INFO.ALGEBRAIC_KEY] = key
 
         dep_metadata = {n: self.get_metadata(u) for n, u in namespace.items() if isinstance(u, UUID)}
 
@@ -1048,37 +1229,162 @@ class Workspace(QObject):
             LOG.error("witness sample: {}".format(repr(dep_metadata[badboys[0]])))
             raise
         valids_namespace = {n: valid_combos[idx] for idx, n in enumerate(names)}
-        content = {n: self.get_content(m[INFO.UUID]) for n, m in dep_metadata.items()}
-
-        # Get all content in the same shape
-        max_shape = max(x[INFO.SHAPE] for x in dep_metadata.values())
-        for k, v in content.items():
-            if v.shape != max_shape:
-                f0 = int(max_shape[0] / v.shape[0])
-                f1 = int(max_shape[1] / v.shape[1])
-                v = np.ma.repeat(np.ma.repeat(v, f0, axis=0), f1, axis=1)
-                content[k] = v
-
         # Run the code: code_object, no globals, copy of locals
         exec(ops, None, valids_namespace)
         if result_name not in valids_namespace:
             raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
 
-        exec(ops, None, content)
-        if result_name not in content:
-            raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
-        info = self._get_composite_metadata(info, list(dep_metadata.values()), valids_namespace[result_name])
-        # update the shape
+        # operands stay memory-mapped at their native resolution, blocks are expanded as they're read
+        content = {n: self.get_content(m[INFO.UUID]) for n, m in dep_metadata.items()}
+        # operands on another grid are gathered onto the finest grid through a cached lookup table
+        target = max(dep_metadata.values(), key=lambda x: x[INFO.SHAPE])
+        for n, md in list(dep_metadata.items()):
+            if not self._shares_grid(md, target):
+                LOG.info("resampling {} onto the grid of {}".format(md[INFO.DISPLAY_NAME], target[INFO.DISPLAY_NAME]))
+                content[n] = self.get_resampled_content(md[INFO.UUID], target[INFO.UUID])
+                md = dict(md)
+                md.update((k, target[k]) for k in GRID_KEYS)
+                dep_metadata[n] = md
+        max_shape = max(x[INFO.SHAPE] for x in dep_metadata.values())
+        kernel = fuse_operations(operations, content)
+
+        uuid = uuidgen()
+        ws_filename = '{}.image'.format(str(uuid))
+        ws_path = os.path.join(self.cache_dir, ws_filename)
+        fp, mm = None, None
+        try:
+            for rows, block in evaluate_chunks(ops, result_name, content, max_shape, kernel=kernel):
+                if mm is None:
+                    # the first block tells us what the expression produces
+                    fp = open(ws_path, 'wb+')
+                    mm = np.memmap(fp, dtype=block.dtype, shape=tuple(max_shape), mode='w+')
+                mm[rows] = block
+                yield {TASK_DOING: 'Calculating algebraic layer', TASK_PROGRESS: float(rows.stop) / float(max_shape[0])}
+            mm.flush()
+            dtype = mm.dtype
+        except BaseException:
+            # includes the generator being closed early: don't leave a partial content file behind
+            mm = None
+            if fp is not None:
+                fp.close()
+                os.remove(ws_path)
+            raise
+        mm = None
+        fp.close()
+
+        info = self._get_composite_metadata(info, list(dep_metadata.values()), valids_namespace[result_name], uuid=uuid)
         # NOTE: This doesn't work if the code changes the shape of the array
         # Need to update geolocation information too
-        # info[INFO.SHAPE] = content[result_name].shape
+        info = generate_guidebook_metadata(info)
+
+        result = self._add_product_content(info, ws_filename, tuple(max_shape), dtype,
+                                           namespace=namespace, codeblock=operations)
+        yield {TASK_DOING: 'Calculating algebraic layer', TASK_PROGRESS: 1.0, 'result': result}
 
+    def create_temporal_reduction(self, uuids, reduction, info=None):
+        """
+        reduce a time series of products per pixel and add the result to the workspace as a new product
+        :param uuids: products on the same grid, typically the time siblings of one layer
+        :param reduction: one of 'mean', 'max', 'min', 'count', 'std'
+        :param info: initial metadata for the new product
+        :return: uuid, info, data: uuid of the new product, its official read-only metadata, and cached content ndarray
+        """
+        status = {}
+        for status in self.iter_temporal_reduction(uuids, reduction, info):
+            pass
+        return status['result']
+
+    def iter_temporal_reduction(self, uuids, reduction, info=None):
+        """
+        reduce a time series of products tile by tile on a thread pool, streaming the result into workspace content
+        the inputs and the reduction are recorded as the product's namespace and code, like an algebraic layer
+        :param uuids: products on the same grid, typically the time siblings of one layer
+        :param reduction: one of 'mean', 'max', 'min', 'count', 'std'
+        :param info: initial metadata for the new product
+        :return: generator of progress dictionaries; the last one carries 'result': (uuid, info, data)
+        """
+        if reduction not in REDUCTIONS:
+            raise ValueError("Unknown temporal reduction '{}'".format(reduction))
+        if not uuids:
+            raise ValueError("Temporal reduction needs at least one product")
+        info = dict(info or {})
+        md_list = sorted((self.get_metadata(u) for u in uuids), key=lambda x: x[INFO.OBS_TIME])
+        first = md_list[0]
+        if not all(x[INFO.SHAPE] == first[INFO.SHAPE] and self._shares_grid(x, first) for x in md_list[1:]):
+            raise ValueError("Temporal reduction inputs must all be on the same grid")
+        names = ['t{:03d}'.format(idx) for idx in range(len(md_list))]
+        namespace = dict(zip(names, (x[INFO.UUID] for x in md_list)))
+        series = [self.get_content(x[INFO.UUID]) for x in md_list]
+        shape = tuple(first[INFO.SHAPE])
+
+        uuid = uuidgen()
+        ws_filename = '{}.image'.format(str(uuid))
+        ws_path = os.path.join(self.cache_dir, ws_filename)
+        data_range = None
+        doing = 'Calculating {} of {} products'.format(reduction, len(md_list))
+        fp = open(ws_path, 'wb+')
+        try:
+            mm = np.memmap(fp, dtype=np.float32, shape=shape, mode='w+')
+            for tile, block, done in iter_reduce_tiles(series, reduction, shape):
+                mm[tile] = block
+                data_range = valid_range(block, data_range)
+                yield {TASK_DOING: doing, TASK_PROGRESS: done}
+            mm.flush()
+        except BaseException:
+            # includes the generator being closed early: don't leave a partial content file behind
+            mm = None
+            fp.close()
+            os.remove(ws_path)
+            raise
+        mm = None
+        fp.close()
+
+        if data_range is None:
+            data_range = (np.nan, np.nan)
+        info.setdefault(INFO.SHORT_NAME, '{} {}'.format(first.get(INFO.SHORT_NAME, ''), reduction).strip())
+        if reduction != 'count' and INFO.UNITS in first:
+            info.setdefault(INFO.UNITS, first[INFO.UNITS])
+        info = self._get_composite_metadata(info, md_list, data_range, uuid=uuid)
+        # the product spans the series, so its serial is the ISO8601 interval of the inputs
+        info[INFO.SERIAL] = '{}/{}'.format(first[INFO.SERIAL], md_list[-1][INFO.SERIAL])
+        info[INFO.PATHNAME] = '<temporal {}: {} : {} : {}>'.format(
+            reduction, info[INFO.DATASET_NAME], info[INFO.SCHED_TIME], str(uuid))
         info = generate_guidebook_metadata(info)
 
-        uuid, info, data = self._create_product_from_array(info, content[result_name],
-                                                           namespace=namespace,
-                                                           codeblock=operations)
-        return uuid, info, data
+        result = self._add_product_content(info, ws_filename, shape, np.float32,
+                                           namespace=namespace, codeblock=reduction_code(reduction, names))
+        yield {TASK_DOING: doing, TASK_PROGRESS: 1.0, 'result': result}
+
+    def _content_version(self, uuid):
+        """
+        :param uuid: product whose content an algebraic layer would read
+        :return: (lod, path, mtime) of the content get_content returns, or None if it has none
+        """
+        with self._inventory as s:
+            content = self._product_content(s, uuid)
+            if content is None:
+                return None
+            return content.lod, content.path, content.mtime
+
+    def _cached_algebraic_product(self, key):
+        """
+        find a previously calculated product with the same algebraic result key
+        :param key: result_key of the expression, operands and their content versions
+        :return: (uuid, info, data) as from create_algebraic_composite, or None if not cached
+        """
+        with self._inventory as s:
+            uuid = None
+            # keys and values are stored pickled, so the comparison happens on their pickles in SQL
+            matches = s.query(Product).join(ProductKeyValue, ProductKeyValue.product_id == Product.id).filter(
+                ProductKeyValue.key == INFO.ALGEBRAIC_KEY, ProductKeyValue.value == key).all()
+            for prod in matches:
+                if prod.content:
+                    prod.touch()
+                    uuid = prod.uuid
+                    break
+        if uuid is None:
+            return None
+        return uuid, self.get_info(uuid), self._overview_content_for_uuid(uuid)
 
     def _create_product_from_array(self, info, data, namespace=None, codeblock=None):
         """
@@ -1096,6 +1402,28 @@ class Workspace(QObject):
         """
         if INFO.UUID not in info:
             raise ValueError('currently require an INFO.UUID be included in product')
+        ws_filename = '{}.image'.format(str(info[INFO.UUID]))
+        ws_path = os.path.join(self.cache_dir, ws_filename)
+        with open(ws_path, 'wb+') as fp:
+            mm = np.memmap(fp, dtype=data.dtype, shape=data.shape, mode='w+')
+            mm[:] = data[:]
+        return self._add_product_content(info, ws_filename, data.shape, data.dtype,
+                                         namespace=namespace, codeblock=codeblock)
+
+    def _add_product_content(self, info, ws_filename, shape, dtype, namespace=None, codeblock=None):
+        """
+        add Product and Content entries to the metadatabase for a flat file already written into the workspace
+        Args:
+            info: mapping of key-value metadata for new product, including INFO.UUID
+            ws_filename: name of the content file within the workspace cache directory
+            shape: shape of the content array
+            dtype: dtype of the content array
+            namespace: {variable: uuid, } for calculation of this data
+            codeblock: text, code to run to recalculate this data within namespace
+
+        Returns:
+            uuid, info, data: uuid of the new product, its official read-only metadata, and cached content ndarray
+        """
         parms = dict(info)
         now = datetime.utcnow()
         parms.update(dict(
@@ -1104,21 +1432,14 @@ class Workspace(QObject):
         ))
         P = Product.from_info(parms, symbols=namespace, codeblock=codeblock)
         uuid = P.uuid
-        # FUTURE: add expression and namespace information, which would require additional parameters
-        ws_filename = '{}.image'.format(str(uuid))
-        ws_path = os.path.join(self.cache_dir, ws_filename)
-        with open(ws_path, 'wb+') as fp:
-            mm = np.memmap(fp, dtype=data.dtype, shape=data.shape, mode='w+')
-            mm[:] = data[:]
-
         parms.update(dict(
             lod=Content.LOD_OVERVIEW,
             path=ws_filename,
-            dtype=str(data.dtype),
+            dtype=str(np.dtype(dtype)),
             proj4=info[INFO.PROJ],
             resolution=min(info[INFO.CELL_WIDTH], info[INFO.CELL_HEIGHT])
         ))
-        rcls = dict(zip(('rows', 'cols', 'levels'), data.shape))
+        rcls = dict(zip(('rows', 'cols', 'levels'), shape))
         parms.update(rcls)
         LOG.debug("about to create Content with this: {}".format(repr(parms)))
 
@@ -1130,6 +1451,7 @@ class Workspace(QObject):
         with self._inventory as S:
             S.add(P)
             S.add(C)
+        self.matrix.sync([uuid])
 
         # FIXME: Do I have to flush the session so the Product gets added for sure?
 
@@ -1157,6 +1479,8 @@ class Workspace(QObject):
             name = 'dataset'
         uuid = dsi if isinstance(dsi, UUID) else dsi[INFO.UUID]
         zult = False
+        with self._cache_lock:
+            self._grids.pop(uuid, None)
 
         if self._queue is not None:
             self._queue.add(str(uuid), self._bgnd_remove(uuid), 'Purge dataset')
@@ -1165,11 +1489,12 @@ class Workspace(QObject):
                 pass
         return True
 
-    def get_content(self, dsi_or_uuid, lod=None, kind=KIND.IMAGE):
+    def get_content(self, dsi_or_uuid, lod=None, kind=KIND.IMAGE, attach=True):
         """
         By default, get the best-available (closest to native) np.ndarray-compatible view of the full dataset
         :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
         :param lod: desired level of detail to focus  (0 for overview)
+        :param attach: False to read content that isn't attached in place, leaving the product's state alone
         :return:
         """
         if dsi_or_uuid is None:
@@ -1183,23 +1508,112 @@ class Workspace(QObject):
         # prod = self._product_with_uuid(dsi_or_uuid)
         # prod.touch()  TODO this causes a locking exception when run in a secondary thread. Keeping background operations lightweight makes sense however, so just review this
         with self._inventory as s:
-            content = s.query(Content).filter((Product.uuid_str==str(uuid)) & (Content.product_id==Product.id)).order_by(Content.lod.desc()).all()
-            content = [x for x in content if x.info.get(INFO.KIND, KIND.IMAGE) == kind]
-            if len(content) != 1:
-                LOG.warning("More than one matching Content object for '{}'".format(dsi_or_uuid))
-            if not len(content) or not content[0]:
+            content = self._product_content(s, uuid, kind)
+            if content is None:
                 raise AssertionError('no content in workspace for {}, must re-import'.format(uuid))
-            content = content[0]
             # content.touch()
             # self._S.commit()  # flush any pending updates to workspace db file
 
             # FIXME: find the content for the requested LOD, then return its ActiveContent - or attach one
             # for now, just work with assumption of one product one content
+            if not attach:
+                data = self._content_data_in_place(content)
+                if data is None:
+                    raise AssertionError('content for {} is not in the workspace cache'.format(uuid))
+                return data
             active_content = self._cached_arrays_for_content(content)
             return active_content.data
 
+    def _product_content(self, session, uuid, kind=KIND.IMAGE):
+        """
+        the content get_content reads for a product: the highest level of detail of the given kind
+        :return: Content, or None if the product has none
+        """
+        content = session.query(Content).filter((Product.uuid_str==str(uuid)) & (Content.product_id==Product.id)).order_by(Content.lod.desc()).all()
+        content = [x for x in content if x.info.get(INFO.KIND, KIND.IMAGE) == kind]
+        if len(content) > 1:
+            LOG.warning("More than one matching Content object for '{}'".format(uuid))
+        return content[0] if content else None
+
+    def _content_data_in_place(self, c: Content):
+        """
+        content array without attaching it: the attached data if it is, else a read-only memmap of its cache file
+        :return: array, or None if the content's files aren't in the workspace cache
+        """
+        active = self._available.get(c.id)
+        if active is not None:
+            return active.data
+        if not ActiveContent.can_attach(self.cache_dir, c):
+            return None
+        _, shape = ActiveContent._rcls(c.rows, c.cols, c.levels)
+        return np.memmap(os.path.join(self.cache_dir, c.path), dtype=c.dtype or np.float32, mode='r', shape=shape)
+
+    def _layer_grid(self, dsi_or_uuid):
+        """
+        product metadata and affine, cached by uuid since a product never changes grids
+        saves a metadatabase query and Affine construction on every probe
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :return: (info, Affine) or (None, None) if the product is unknown
+        """
+        if isinstance(dsi_or_uuid, str):
+            uuid = UUID(dsi_or_uuid)
+        elif not isinstance(dsi_or_uuid, UUID):
+            uuid = dsi_or_uuid[INFO.UUID]
+        else:
+            uuid = dsi_or_uuid
+
+        def _grid():
+            info = self.get_info(uuid)
+            if info is None:
+                return None
+            return info, Affine(info[INFO.CELL_WIDTH], 0.0, info[INFO.ORIGIN_X],
+                                0.0, info[INFO.CELL_HEIGHT], info[INFO.ORIGIN_Y])
+
+        def _make_room(grid):
+            while len(self._grids) >= GRID_CACHE_SIZE:
+                # dicts keep insertion order, so this drops the oldest entry
+                self._grids.pop(next(iter(self._grids)), None)
+
+        grid = self._compute_once(self._grids, uuid, _grid, _make_room)
+        return grid if grid is not None else (None, None)
+
+    def _compute_once(self, cache, key, compute, make_room):
+        """
+        look up `key` in one of the probe caches, computing a missing value only once however many threads ask for it
+        :param cache: dictionary guarded by _cache_lock
+        :param key: key into the cache
+        :param compute: callable returning the value, or None for nothing to cache; called without the lock held
+        :param make_room: callable(value) evicting entries so value fits; called with the lock held
+        :return: cached or computed value
+        """
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                return value
+            computing = self._computing.get((id(cache), key))
+            mine = computing is None
+            if mine:
+                computing = self._computing[(id(cache), key)] = Future()
+        if not mine:
+            # another thread is already computing it
+            return computing.result()
+        try:
+            value = compute()
+        except BaseException as err:
+            with self._cache_lock:
+                del self._computing[(id(cache), key)]
+            computing.set_exception(err)
+            raise
+        with self._cache_lock:
+            if value is not None:
+                make_room(value)
+                cache[key] = value
+            del self._computing[(id(cache), key)]
+        computing.set_result(value)
+        return value
+
     def _create_position_to_index_transform(self, dsi_or_uuid):
-        info = self.get_info(dsi_or_uuid)
+        info, _ = self._layer_grid(dsi_or_uuid)
         origin_x = info[INFO.ORIGIN_X]
         origin_y = info[INFO.ORIGIN_Y]
         cell_width = info[INFO.CELL_WIDTH]
@@ -1211,56 +1625,121 @@ class Workspace(QObject):
         return _transform
 
     def _create_layer_affine(self, dsi_or_uuid):
-        info = self.get_info(dsi_or_uuid)
-        affine = Affine(
-            info[INFO.CELL_WIDTH],
-            0.0,
-            info[INFO.ORIGIN_X],
-            0.0,
-            info[INFO.CELL_HEIGHT],
-            info[INFO.ORIGIN_Y],
-        )
+        _, affine = self._layer_grid(dsi_or_uuid)
         return affine
 
     def _position_to_index(self, dsi_or_uuid, xy_pos):
-        info = self.get_info(dsi_or_uuid)
+        info, _ = self._layer_grid(dsi_or_uuid)
         if info is None:
             return None, None
         # Assume `xy_pos` is lon/lat value
         if '+proj=latlong' in info[INFO.PROJ]:
             x, y = xy_pos[:2]
         else:
-            x, y = Proj(info[INFO.PROJ])(*xy_pos)
+            x, y = cached_proj(info[INFO.PROJ])(*xy_pos)
         col = (x - info[INFO.ORIGIN_X]) / info[INFO.CELL_WIDTH]
         row = (y - info[INFO.ORIGIN_Y]) / info[INFO.CELL_HEIGHT]
         return np.int64(np.round(row)), np.int64(np.round(col))
 
     def layer_proj(self, dsi_or_uuid):
         """Project lon/lat probe points to image X/Y"""
-        info = self.get_info(dsi_or_uuid)
-        return Proj(info[INFO.PROJ])
+        info, _ = self._layer_grid(dsi_or_uuid)
+        return cached_proj(info[INFO.PROJ])
 
     def _project_points(self, p, points):
         points = np.array(points)
         points[:, 0], points[:, 1] = p(points[:, 0], points[:, 1])
         return points
 
-    def get_content_point(self, dsi_or_uuid, xy_pos):
+    def get_content_statistics(self, dsi_or_uuid):
+        """
+        per-tile statistics written at import, for summaries, histograms and percentiles without reading content
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :return: TileStatistics, or None if the product's content has none
+        """
+        uuid = dsi_or_uuid if isinstance(dsi_or_uuid, UUID) else dsi_or_uuid[INFO.UUID]
+        with self._inventory as s:
+            nac = self._product_native_content(s, uuid=uuid)
+            if nac is None:
+                return None
+            return self._cached_arrays_for_content(nac).statistics
+
+    def get_content_thumbnail(self, dsi_or_uuid, max_rows=THUMBNAIL_ROWS):
+        """
+        small strided copy of a product's overview content, e.g. for timeline frame thumbnails
+        content not already attached is read in place rather than attached, leaving the product's state alone
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :param max_rows: most rows to return, columns are strided alike
+        :return: 2D np.ndarray, or None if the product has no image content in the workspace
+        """
+        uuid = dsi_or_uuid if isinstance(dsi_or_uuid, UUID) else dsi_or_uuid[INFO.UUID]
+        with self._inventory as s:
+            ovc = self._product_overview_content(s, uuid=uuid)
+            if ovc is None:
+                return None
+            data = self._content_data_in_place(ovc)
+        if data is None or data.ndim != 2:
+            return None
+        stride = max(1, int(np.ceil(data.shape[0] / max_rows)))
+        return np.array(data[::stride, ::stride])
+
+    def auto_clims(self, dsi_or_uuid, rows=None, cols=None, percentiles=AUTO_CLIM_PERCENTILES):
+        """
+        color limits stretching a region of a product between two percentiles of its values
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :param rows: slice of content rows, None for all
+        :param cols: slice of content columns, None for all
+        :param percentiles: (low, high) percentiles 0..100
+        :return: (min, max) in the content's units, or None if there are no statistics or no valid data
+        """
+        stats = self.get_content_statistics(dsi_or_uuid)
+        if stats is None:
+            return None
+        lo, hi = stats.percentiles(percentiles, rows, cols)
+        if not (np.isfinite(lo) and np.isfinite(hi)) or hi <= lo:
+            return None
+        return lo, hi
+
+    def get_content_index(self, dsi_or_uuid, xy_pos):
+        """
+        native content cell under a lon/lat position, from cached grid metadata without reading any data
+        :return: (row, col), or (None, None) if the product is unknown
+        """
+        return self._position_to_index(dsi_or_uuid, xy_pos)
+
+    def get_content_slices(self, dsi_or_uuid, left, bottom, right, top):
+        """
+        native content rows and columns within a box of projection coordinates, e.g. the part of a layer in view
+        :return: (row slice, column slice), or (None, None) if the product is unknown or the box misses its content
+        """
+        info, _ = self._layer_grid(dsi_or_uuid)
+        if info is None:
+            return None, None
+        num_rows, num_cols = info[INFO.SHAPE][:2]
+
+        def _span(lo, hi, origin, cell, count):
+            # cell centers sit at origin + index * cell, so a cell reaches half a cell either side of its index
+            lo, hi = sorted(((lo - origin) / cell, (hi - origin) / cell))
+            return slice(max(0, int(np.floor(lo + 0.5))), min(count, int(np.floor(hi + 0.5)) + 1))
+
+        rows = _span(bottom, top, info[INFO.ORIGIN_Y], info[INFO.CELL_HEIGHT], num_rows)
+        cols = _span(left, right, info[INFO.ORIGIN_X], info[INFO.CELL_WIDTH], num_cols)
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            return None, None
+        return rows, cols
+
+    def get_content_point(self, dsi_or_uuid, xy_pos, attach=True):
         row, col = self._position_to_index(dsi_or_uuid, xy_pos)
         if row is None or col is None:
             return None
-        data = self.get_content(dsi_or_uuid)
+        data = self.get_content(dsi_or_uuid, attach=attach)
         if not ((0 <= col < data.shape[1]) and (0 <= row < data.shape[0])):
             raise ValueError("X/Y position is outside of image with UUID: %s", dsi_or_uuid)
         return data[row, col]
 
     def get_content_polygon(self, dsi_or_uuid, points):
         data = self.get_content(dsi_or_uuid)
-        trans = self._create_layer_affine(dsi_or_uuid)
-        p = self.layer_proj(dsi_or_uuid)
-        points = self._project_points(p, points)
-        _, data = content_within_shape(data, trans, LinearRing(points))
-        return data
+        return data[self.polygon_mask(dsi_or_uuid, points).index()]
 
     def highest_resolution_uuid(self, *uuids):
         return min([self.get_info(uuid) for uuid in uuids], key=lambda i: i[INFO.CELL_WIDTH])[INFO.UUID]
@@ -1268,19 +1747,141 @@ class Workspace(QObject):
     def lowest_resolution_uuid(self, *uuids):
         return max([self.get_info(uuid) for uuid in uuids], key=lambda i: i[INFO.CELL_WIDTH])[INFO.UUID]
 
+    def _navigation_for_uuid(self, uuid):
+        """
+        :return: (longitude, latitude) navigation arrays of the product's native content, or None
+        """
+        with self._inventory as s:
+            nac = self._product_native_content(s, uuid=uuid)
+            if nac is None:
+                return None
+            return self._cached_arrays_for_content(nac).navigation
+
     def get_coordinate_mask_polygon(self, dsi_or_uuid, points):
         data = self.get_content(dsi_or_uuid)
-        trans = self._create_layer_affine(dsi_or_uuid)
-        p = self.layer_proj(dsi_or_uuid)
-        points = self._project_points(p, points)
-        index_mask, data = content_within_shape(data, trans, LinearRing(points))
-        coords_mask = (index_mask[0] * trans.e + trans.f, index_mask[1] * trans.a + trans.c)
+        info, trans = self._layer_grid(dsi_or_uuid)
+        index_mask = self.polygon_mask(dsi_or_uuid, points).index()
+        return self._coordinate_mask(info, trans, self.layer_proj(dsi_or_uuid), index_mask), data[index_mask]
+
+    def polygon_mask(self, dsi_or_uuid, points, stride=1):
+        """
+        cells of a product inside a polygon, rasterized once per grid and reused by every product on that grid
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :param points: polygon vertices as lon/lat
+        :param stride: level of detail, sampling every stride'th row and column
+        :return: ShapeMask
+        """
+        info, trans = self._layer_grid(dsi_or_uuid)
+        points = np.asarray(points, dtype=np.float64)
+        key = (hashlib.sha1(points.tobytes()).hexdigest(),
+               tuple(tuple(info[k]) if k == INFO.SHAPE else info[k] for k in GRID_KEYS),
+               stride)
+
+        def _mask():
+            projected = self._project_points(self.layer_proj(dsi_or_uuid), points)
+            return rasterize_shape_mask(trans, LinearRing(projected), info[INFO.SHAPE][:2], stride=stride)
+
+        def _make_room(mask):
+            while self._masks and (len(self._masks) >= MASK_CACHE_SIZE or
+                                   sum(m.nbytes for m in self._masks.values()) + mask.nbytes > MASK_CACHE_BYTES):
+                # dicts keep insertion order, so this drops the oldest mask
+                self._masks.pop(next(iter(self._masks)), None)
+
+        return self._compute_once(self._masks, key, _mask, _make_room)
+
+    def _coordinate_mask(self, info, trans, p, index_mask):
+        nav = self._navigation_for_uuid(info[INFO.UUID])
+        if nav is not None:
+            lon, lat = navigate(nav[0], nav[1], info[INFO.SHAPE], index_mask[0], index_mask[1])
+        else:
+            coords_mask = (index_mask[0] * trans.e + trans.f, index_mask[1] * trans.a + trans.c)
+            lon, lat = p(coords_mask[1], coords_mask[0], inverse=True)
         # coords_mask is (Y, X) corresponding to (rows, cols) like numpy
-        coords_mask = p(coords_mask[1], coords_mask[0], inverse=True)[::-1]
-        return coords_mask, data
+        return CoordinateMask(lat, lon, grid=info, index=index_mask)
+
+    def polygon_stride(self, dsi_or_uuid, points, max_cells=REGION_OVERVIEW_CELLS):
+        """
+        :return: stride over the product's content which samples a polygon's bounding box in at most max_cells
+        """
+        _, trans = self._layer_grid(dsi_or_uuid)
+        points = self._project_points(self.layer_proj(dsi_or_uuid), points)
+        return shape_stride(trans, LinearRing(points), max_cells)
+
+    def iter_content_polygon(self, dsi_or_uuid, points, stride=1, chunk_rows=REGION_CHUNK_ROWS, attach=True):
+        """
+        content inside a polygon, a block of rows at a time so the selection is never in memory all at once
+        :param dsi_or_uuid: existing datasetinfo dictionary, or its UUID
+        :param points: polygon vertices as lon/lat
+        :param stride: sample every stride'th cell, for a quick coarse pass
+        :param chunk_rows: (strided) rows per block
+        :param attach: False to read content that isn't attached in place, see get_content
+        :return: generator of (index mask, content values, fraction done)
+        """
+        data = self.get_content(dsi_or_uuid, attach=attach)
+        mask = self.polygon_mask(dsi_or_uuid, points, stride=stride)
+        yield from iter_content_within_shape(data, mask, chunk_rows=chunk_rows)
+
+    def iter_coordinate_mask_polygon(self, dsi_or_uuid, points, stride=1, chunk_rows=REGION_CHUNK_ROWS):
+        """
+        like get_coordinate_mask_polygon, a block of rows at a time
+        :return: generator of (CoordinateMask, content values, fraction done)
+        """
+        info, trans = self._layer_grid(dsi_or_uuid)
+        p = self.layer_proj(dsi_or_uuid)
+        for index_mask, data, done in self.iter_content_polygon(dsi_or_uuid, points, stride, chunk_rows):
+            yield self._coordinate_mask(info, trans, p, index_mask), data, done
+
+    def _probe_value(self, uuid, xy_pos=None, points=None):
+        """
+        value of a point, or mean of a polygon, in one product; None if the product has no content there
+        only the probed cells are read, and polygon masks are shared by products on the same grid
+        content is read without attaching it, so probing a series doesn't change every frame's state
+        """
+        try:
+            if points is None:
+                value = self.get_content_point(uuid, xy_pos, attach=False)
+                return None if value is None or not np.isfinite(value) else float(value)
+            stats = SummaryStatistics()
+            for _, data, _ in self.iter_content_polygon(uuid, points, attach=False):
+                stats.add(data)
+            return stats.mean if stats.count else None
+        except (ValueError, AssertionError):
+            LOG.debug("nothing to probe in {}".format(uuid), exc_info=True)
+            return None
+
+    def iter_probe_series(self, uuids, xy_pos=None, points=None, workers=SERIES_WORKERS):
+        """
+        sample a point, or average a polygon, in each of a series of products on a thread pool
+        products whose content is not in the workspace report None rather than being imported
+        closing the generator cancels products not yet started
+        :param uuids: products to probe
+        :param xy_pos: lon/lat of the point, if not probing a polygon
+        :param points: polygon vertices as lon/lat
+        :param workers: threads probing products concurrently
+        :return: generator of (uuid, value or None, fraction done) in completion order
+        """
+        uuids = list(uuids)
+        if not uuids:
+            return
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = dict((pool.submit(self._probe_value, uuid, xy_pos, points), uuid) for uuid in uuids)
+        try:
+            for done, future in enumerate(as_completed(futures)):
+                yield futures[future], future.result(), float(done + 1) / len(uuids)
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
 
     def get_content_coordinate_mask(self, uuid, coords_mask):
         data = self.get_content(uuid)
+        grid = getattr(coords_mask, 'grid', None)
+        if grid is not None:
+            info, _ = self._layer_grid(uuid)
+            if self._shares_grid(info, grid):
+                # same grid or a coarser subgrid of where the mask came from: index directly, no projection
+                f0, f1 = resolution_factors(info[INFO.SHAPE], grid[INFO.SHAPE])
+                return data[(coords_mask.index[0] // f0, coords_mask.index[1] // f1)]
         trans = self._create_layer_affine(uuid)
         p = self.layer_proj(uuid)
         # coords_mask is (Y, X) like a numpy array
@@ -1291,37 +1892,54 @@ class Workspace(QObject):
         )
         return data[index_mask]
 
+    @property
+    def resampler(self):
+        """
+        :return: Resampler keeping its lookup tables in the workspace cache
+        """
+        if self._resampler is None:
+            self._resampler = Resampler(os.path.join(self.cache_dir, 'resample'))
+        return self._resampler
+
+    def get_resampled_content(self, uuid, target_uuid, method='nearest'):
+        """
+        present a product's content on the grid of another product
+        the lookup table for the pair of areas is built once and reused for every product on the same grids
+        :param uuid: product to resample
+        :param target_uuid: product whose grid to resample onto
+        :param method: 'nearest' or 'bilinear'
+        :return: ResampledArray, an array-like gathering rows on demand
+        """
+        return self.resampler.resample(self.get_content(uuid), self.get_pyresample_area(uuid),
+                                       self.get_pyresample_area(target_uuid), method=method)
+
+    @staticmethod
+    def _shares_grid(info, target):
+        """
+        :param info: metadata of an operand
+        :param target: metadata of the grid to compute on
+        :return: True if the operand covers the same extent in the same projection at an integer factor of resolution
+        """
+        if info[INFO.PROJ] != target[INFO.PROJ]:
+            return False
+        try:
+            resolution_factors(info[INFO.SHAPE], target[INFO.SHAPE])
+        except ValueError:
+            return False
+        # compare the outer edges of the grids to within half a target cell
+        tolerance_x, tolerance_y = abs(target[INFO.CELL_WIDTH]) / 2., abs(target[INFO.CELL_HEIGHT]) / 2.
+        left = info[INFO.ORIGIN_X] - info[INFO.CELL_WIDTH] / 2.
+        top = info[INFO.ORIGIN_Y] - info[INFO.CELL_HEIGHT] / 2.
+        target_left = target[INFO.ORIGIN_X] - target[INFO.CELL_WIDTH] / 2.
+        target_top = target[INFO.ORIGIN_Y] - target[INFO.CELL_HEIGHT] / 2.
+        return abs(left - target_left) <= tolerance_x and abs(top - target_top) <= tolerance_y
+
     def get_pyresample_area(self, uuid, y_slice=None, x_slice=None):
         """Create a pyresample compatible AreaDefinition for this layer."""
-        # WARNING: Untested!
-        from pyresample.geometry import AreaDefinition
-        from pyresample.utils import proj4_str_to_dict
         info = self.get_info(uuid)
-        if y_slice is None:
-            y_slice = slice(None, None, None)
-        if x_slice is None:
-            x_slice = slice(None, None, None)
-        if y_slice.step not in [1, None] or x_slice.step not in [1, None]:
-            raise ValueError("Slice steps other than 1 are not supported")
-        rows, cols = info[INFO.SHAPE]
-        x_start = x_slice.start or 0
-        y_start = y_slice.start or 0
-        num_cols = (x_slice.stop or cols) - x_start
-        num_rows = (y_slice.stop or rows) - y_start
-        half_x = info[INFO.CELL_WIDTH] / 2.
-        half_y = info[INFO.CELL_HEIGHT] / 2.
-        min_x = info[INFO.ORIGIN_X] - half_x + x_start * info[INFO.CELL_WIDTH]
-        max_y = info[INFO.ORIGIN_Y] + half_y - y_start * info[INFO.CELL_HEIGHT]
-        min_y = max_y - num_rows * info[INFO.CELL_HEIGHT]
-        max_x = min_x + num_cols * info[INFO.CELL_WIDTH]
-        return AreaDefinition(
-            'layer area',
-            'layer area',
-            'layer area',
-            proj4_str_to_dict(info[INFO.PROJ]),
-            cols, rows,
-            (min_x, min_y, max_x, max_y),
-        )
+        return grid_area(info[INFO.PROJ], info[INFO.ORIGIN_X], info[INFO.ORIGIN_Y],
+                         info[INFO.CELL_WIDTH], info[INFO.CELL_HEIGHT], info[INFO.SHAPE],
+                         y_slice=y_slice, x_slice=x_slice)
 
     def __getitem__(self, datasetinfo_or_uuid):
         """
@@ -1332,6 +1950,114 @@ class Workspace(QObject):
         pass
 
 
+class tests(unittest.TestCase):
+    def setUp(self):
+        import shutil, tempfile
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        self.ws = Workspace(tmp)
+        self.addCleanup(self.ws._inventory.engine.dispose)
+
+    def _create_product(self, data):
+        info = {
+            INFO.UUID: uuidgen(), INFO.KIND: KIND.IMAGE, INFO.SHORT_NAME: 'test', INFO.DATASET_NAME: 'test',
+            INFO.FAMILY: 'IMAGE:test:test', INFO.CATEGORY: 'test:test:test:test', INFO.SERIAL: '20170101T000000',
+            INFO.OBS_TIME: datetime(2017, 1, 1), INFO.OBS_DURATION: timedelta(minutes=5),
+            INFO.PROJ: '+proj=eqc +datum=WGS84', INFO.ORIGIN_X: 0., INFO.ORIGIN_Y: 0.,
+            INFO.CELL_WIDTH: 1000., INFO.CELL_HEIGHT: -1000., INFO.SHAPE: data.shape,
+        }
+        uuid, _, _ = self.ws._create_product_from_array(info, data)
+        return uuid
+
+    def test_content_statistics(self):
+        # statistics an importer writes beside content are what the workspace reads back for auto-contrast
+        ws = self.ws
+        data = np.repeat(np.arange(512, dtype=np.float32)[:, np.newaxis], 512, axis=1)  # value is row number
+        uuid = self._create_product(data)
+        self.assertIsNone(ws.get_content_statistics(uuid))
+        self.assertIsNone(ws.auto_clims(uuid))
+        with ws._inventory as s:
+            prod = ws._product_with_uuid(s, uuid)
+            c = ws._product_native_content(s, prod=prod)
+            GeoTiffImporter(None, workspace_cwd=ws.cache_dir, database_session=s)._add_statistics(
+                c, str(uuid), data, (0., 512.))
+            # statistics are found when content is attached
+            ws._deactivate_content_for_product(prod)
+        stats = ws.get_content_statistics(uuid)
+        self.assertEqual(stats.summary().count, data.size)
+        self.assertAlmostEqual(stats.summary().mean, 255.5, places=3)
+        self.assertEqual((stats.summary().minimum, stats.summary().maximum), (0., 511.))
+        # 64 bins of 8 rows each hold equal counts, so percentiles fall on a straight line from 0 to 512
+        lo, hi = ws.auto_clims(uuid)
+        self.assertAlmostEqual(lo, 0.02 * 512., places=6)
+        self.assertAlmostEqual(hi, 0.98 * 512., places=6)
+
+        # a view box over the south-western quarter of the image, as when zoomed in on it
+        rows, cols = ws.get_content_slices(uuid, -500., -511400., 255400., -255500.)
+        self.assertEqual((rows, cols), (slice(256, 512), slice(0, 256)))
+        self.assertAlmostEqual(stats.summary(rows, cols).mean, 383.5, places=6)
+        # only the upper 32 bins hold values there
+        lo, hi = ws.auto_clims(uuid, rows=rows, cols=cols)
+        self.assertAlmostEqual(lo, 256. + 0.02 * 256., places=6)
+        self.assertAlmostEqual(hi, 256. + 0.98 * 256., places=6)
+        # a view box clear of the image has nothing to stretch for
+        self.assertEqual(ws.get_content_slices(uuid, 600000., 0., 700000., 100000.), (None, None))
+
+    def test_content_version(self):
+        # an algebraic result is cached against the version of the same content get_content reads
+        ws = self.ws
+        uuid = self._create_product(np.zeros((8, 8), dtype=np.float32))
+        detail = np.ones((16, 16), dtype=np.float32)
+        filename = '{}.lod1.image'.format(uuid)
+        np.memmap(os.path.join(ws.cache_dir, filename), dtype=np.float32, mode='w+', shape=detail.shape)[:] = detail
+        with ws._inventory as s:
+            prod = ws._product_with_uuid(s, uuid)
+            prod.content.append(Content(lod=1, path=filename, rows=16, cols=16, dtype='float32', atime=datetime.utcnow(),
+                                        mtime=datetime.utcnow(), proj4=prod.content[0].proj4, cell_width=500.,
+                                        cell_height=-500., origin_x=0., origin_y=0.))
+        lod, path, _ = ws._content_version(uuid)
+        self.assertEqual((lod, path), (1, filename))
+        self.assertEqual(ws.get_content(uuid, attach=False).shape, detail.shape)
+
+    def test_polygon_mask(self):
+        # a polygon rasterizes once per grid, stride and outline, however many threads probe with it
+        from unittest.mock import patch
+        ws = self.ws
+        uuid = self._create_product(np.zeros((512, 512), dtype=np.float32))
+        p = cached_proj('+proj=eqc +datum=WGS84')
+        # a box of 100 by 100 km, whose edges fall between cell centers
+        points = [p(x, y, inverse=True) for x, y in ((100000., -200000.), (200000., -200000.),
+                                                     (200000., -300000.), (100000., -300000.))]
+        module = sys.modules[Workspace.__module__]
+
+        def _slow_rasterize(*args, **kwargs):
+            time.sleep(0.2)  # so the other threads ask while it's being computed
+            return rasterize_shape_mask(*args, **kwargs)
+
+        with patch.object(module, 'rasterize_shape_mask', side_effect=_slow_rasterize) as raster:
+            masks = []
+            threads = [threading.Thread(target=lambda: masks.append(ws.polygon_mask(uuid, points))) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(raster.call_count, 1)
+            self.assertEqual(len(masks), 4)
+            self.assertTrue(all(m is masks[0] for m in masks))
+            rows, cols = masks[0].index()
+            self.assertEqual(len(rows), 100 * 100)
+            self.assertEqual((rows.min(), rows.max(), cols.min(), cols.max()), (200, 299, 100, 199))
+            # the cache is hit on the next probe
+            self.assertIs(ws.polygon_mask(uuid, points), masks[0])
+            self.assertEqual(raster.call_count, 1)
+            # a coarser pass is its own mask, of every other row and column
+            coarse = ws.polygon_mask(uuid, points, stride=2)
+            self.assertEqual(raster.call_count, 2)
+            rows, cols = coarse.index()
+            self.assertEqual(len(rows), 50 * 50)
+            self.assertEqual((rows.min(), rows.max(), cols.min(), cols.max()), (200, 298, 100, 198))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="PURPOSE",